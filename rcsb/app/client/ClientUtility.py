@@ -12,9 +12,15 @@ __author__ = "John Westbrook"
 __email__ = "john.westbrook@rcsb.org"
 __license__ = "Apache 2.0"
 
+import functools
 import io
 import os
+import re
 import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from copy import deepcopy
 import math
 import json
@@ -27,6 +33,10 @@ from rcsb.app.file.ConfigProvider import ConfigProvider
 from rcsb.app.file.Definitions import Definitions
 from rcsb.app.file.PathProvider import PathProvider
 from rcsb.app.file.UploadUtility import UploadUtility
+from rcsb.app.file.CodecProvider import CodecProvider
+from rcsb.app.file.DeltaProvider import DeltaProvider
+from rcsb.app.file.BundleProvider import BundleProvider
+from rcsb.app.file.ChunkSizeProvider import ChunkSizeProvider
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -36,26 +46,37 @@ class ClientUtility(object):
     """
     functions
 
-    get-file-object, upload, get-upload-parameters, upload-chunk, download
+    get-file-object, upload, upload-file, upload-delta, upload-bundle, get-upload-parameters, upload-chunk, download
     get-hash-digest, get-file-path-local, get-file-path-remote, dir-exists, list-dir
     copy-file, copy-dir, move-file, compress-dir, compress-dir-path, decompress-dir
     latest version, next version,
     file-size, file-exists
 
     """
+
+    # throughput (bytes per second) and round trip time (seconds) measured by uploads of this process, sent with upload parameters
+    __transfer = {"throughput": None, "rtt": None}
+    __transferLock = threading.Lock()
+
     def __init__(self):
         self.cP = ConfigProvider()
         self.cP.getConfig()
         self.baseUrl = self.cP.get("SERVER_HOST_AND_PORT")
         self.chunkSize = self.cP.get("CHUNK_SIZE")
+        self.chunkConcurrency = self.cP.get("CHUNK_CONCURRENCY")
         self.compressionType = self.cP.get("COMPRESSION_TYPE")
+        self.adaptiveCompression = self.cP.get("ADAPTIVE_COMPRESSION")
+        self.compressionDictionary = self.cP.get("COMPRESSION_DICTIONARY")
         self.hashType = self.cP.get("HASH_TYPE")
+        # chunks are sent as raw request bodies (PUT), or as multipart forms (POST) if False
+        self.rawChunks = True
         subject = self.cP.get("JWT_SUBJECT")
         self.headerD = {
             "Authorization": "Bearer " + JWTAuthToken().createToken({}, subject)
         }
         self.dP = Definitions()
         self.fileFormatExtensionD = self.dP.fileFormatExtD
+        self.fileFormatCompressionD = self.dP.fileFormatCompressionD
         self.contentTypeInfoD = self.dP.contentTypeD
         self.repoTypeList = self.dP.repoTypeList
         self.milestoneList = self.dP.milestoneList
@@ -315,6 +336,7 @@ class ClientUtility(object):
         allowOverwrite=False,
         resumable=False,
         extractChunk=True,
+        extractStream=False,
     ) -> dict:
         # validate input
         if not os.path.exists(sourceFilePath):
@@ -331,10 +353,38 @@ class ClientUtility(object):
         expectedChunks = 1
         if self.chunkSize < fileSize:
             expectedChunks = math.ceil(fileSize / self.chunkSize)
+        # a file of one chunk is sent with its parameters in one request
+        # unless preset dictionaries are wanted, which are negotiated with upload parameters
+        # identical content is then linked by the server rather than stored again, but is still sent
+        if (
+            expectedChunks == 1
+            and not resumable
+            and not decompress
+            and not extractStream
+            and not self.compressionDictionary
+        ):
+            response = self.uploadFile(
+                sourceFilePath,
+                repositoryType,
+                depId,
+                contentType,
+                milestone,
+                partNumber,
+                contentFormat,
+                version,
+                allowOverwrite,
+                extractChunk is not False,
+                fullTestHash,
+            )
+            if response is not None:
+                return response
         # get upload parameters
         saveFilePath = None
         chunkIndex = 0
         uploadId = None
+        bitmap = 0
+        compressionType = None
+        dictionaryId = None
         parameters = {
             "repositoryType": repositoryType,
             "depId": depId,
@@ -345,19 +395,35 @@ class ClientUtility(object):
             "version": version,
             "allowOverwrite": allowOverwrite,
             "resumable": resumable,
+            "compressionTypes": ",".join(self.getCompressionTypes()),
+            "compressionDictionary": self.compressionDictionary,
+            # disk space reserved on the server for the upload
+            "fileSize": fileSize,
         }
-        url = os.path.join(self.baseUrl, "getUploadParameters")
-        response = requests.get(
-            url, params=parameters, headers=self.headerD, timeout=None
-        )
+        # identical content already on the server is not sent (hash refers to the stored file unless decompressed)
+        if not decompress:
+            parameters["hashType"] = self.hashType
+            parameters["hashDigest"] = fullTestHash
+        response = self.requestUploadParameters(parameters)
+        chunkSize = int(self.chunkSize)
+        chunkConcurrency = self.chunkConcurrency
 
         if response.status_code == 200:
             logger.info("upload parameters - response %d", response.status_code)
             result = json.loads(response.text)
+            if result and result.get("satisfied"):
+                logger.info("identical content already stored as %s", result["filePath"])
+                return {"status_code": response.status_code, "bytesSaved": fileSize}
             if result:
                 saveFilePath = result["filePath"]
                 chunkIndex = int(result["chunkIndex"])
                 uploadId = result["uploadId"]
+                bitmap = int(result.get("chunkBitmap") or "0", 16)
+                compressionType = result.get("compressionType")
+                dictionaryId = result.get("compressionDictionary")
+                # recommended for the file, or the chunk size of a resumed session
+                chunkSize = int(result.get("chunkSize") or chunkSize)
+                chunkConcurrency = int(result.get("chunkConcurrency") or chunkConcurrency)
                 if chunkIndex > 0:
                     logger.info("detected upload with chunk index %s", chunkIndex)
         if not saveFilePath:
@@ -370,11 +436,31 @@ class ClientUtility(object):
         # if file is already compressed, do not compress each chunk
         if decompress:
             extractChunk = False
+            extractStream = False
+        # without the preset dictionary, zlib compresses chunks on their own
+        if dictionaryId and not self.getCompressionDictionary(dictionaryId):
+            dictionaryId = None
+        # no compression type in common with the server, send chunks as they are
+        if (extractChunk or extractChunk is None or extractStream) and not compressionType:
+            logger.warning("no compression type in common with server, chunks not compressed")
+            extractChunk = False
+            extractStream = False
+        # compress the whole file as one stream (hash is of the original), the server decompresses it as the chunks arrive
+        streamFilePath = None
+        sourceFileSize = fileSize
+        if extractStream:
+            extractChunk = False
+            streamFilePath = UploadUtility(self.cP).compressFile(
+                sourceFilePath, None, compressionType
+            )
+            sourceFilePath = streamFilePath
+            fileSize = os.path.getsize(sourceFilePath)
+        expectedChunks = max(1, math.ceil(fileSize / chunkSize))
 
         # chunk file and upload
         mD = {
             # chunk parameters
-            "chunkSize": self.chunkSize,
+            "chunkSize": chunkSize,
             "chunkIndex": chunkIndex,
             "expectedChunks": expectedChunks,
             # upload file parameters
@@ -389,50 +475,521 @@ class ClientUtility(object):
             "allowOverwrite": allowOverwrite,
             "resumable": resumable,
             "extractChunk": extractChunk,
+            "extractStream": extractStream,
+            "compressionType": compressionType,
+            "compressionDictionary": dictionaryId,
         }
-        offset = chunkIndex * self.chunkSize
+        if extractChunk is None:
+            extractChunk = True
+            mD["extractChunk"] = True
+        # skip chunks that the server already has (resumed upload)
+        chunkIndices = [
+            index
+            for index in range(chunkIndex, expectedChunks)
+            if not bitmap & (1 << index)
+        ]
+        url = os.path.join(self.baseUrl, "upload")
+        failed = threading.Event()
+        # store, fast, or strong by content format, sampled per chunk
+        policy = self.fileFormatCompressionD.get(contentFormat, "auto")
+        sentBytes = []
 
-        with open(sourceFilePath, "rb") as of:
-            of.seek(offset)
-            url = os.path.join(self.baseUrl, "upload")
-            for _ in range(chunkIndex, mD["expectedChunks"]):
-                offset = int(mD["chunkIndex"]) * int(self.chunkSize)
-                packetSize = min(int(fileSize) - offset, int(self.chunkSize))
+        def uploadOne(index):
+            # chunks are written at their own offset on the server, so may be sent in any order
+            if failed.is_set():
+                return None
+            offset = index * chunkSize
+            packetSize = min(int(fileSize) - offset, chunkSize)
+            with open(sourceFilePath, "rb") as of:
+                of.seek(offset)
                 chunk = of.read(packetSize)
-                if extractChunk is None or extractChunk is True:
-                    extractChunk = True
-                    chunk = UploadUtility(self.cP).compressChunk(
-                        chunk, self.compressionType
+            chunkHashDigest = self.getChunkHashDigest(chunk)
+            chunkCompressionType = compressionType
+            if extractChunk and self.adaptiveCompression:
+                chunkCompressionType, chunk = UploadUtility(self.cP).compressChunkAdaptive(
+                    chunk, compressionType, policy, dictionaryId=dictionaryId
+                )
+                if chunk is None:
+                    logger.error("error - could not compress chunks")
+                    failed.set()
+                    return None
+            elif extractChunk:
+                chunk = UploadUtility(self.cP).compressChunk(
+                    chunk, compressionType, dictionaryId
+                )
+                if not chunk:
+                    logger.error("error - could not compress chunks")
+                    failed.set()
+                    return None
+            logger.debug(
+                "packet size %s chunk %s expected %s",
+                packetSize,
+                index,
+                expectedChunks,
+            )
+            data = deepcopy(mD)
+            data["chunkIndex"] = index
+            data["chunkHashDigest"] = chunkHashDigest
+            data["compressionType"] = chunkCompressionType
+            sentBytes.append(len(chunk))
+            response = self.postChunk(url, data, chunk, raw=self.rawChunks)
+            if response.status_code != 200:
+                logger.error(
+                    "Status code %r with text %r ...terminating",
+                    response.status_code,
+                    response.text,
+                )
+                failed.set()
+            return response.status_code
+
+        statusCode = self.sendChunks(
+            uploadOne, chunkIndices, chunkSize, int(fileSize), chunkConcurrency
+        )
+        if streamFilePath and os.path.exists(streamFilePath):
+            os.unlink(streamFilePath)
+        if statusCode is None:
+            return None
+        # bytes not sent, of the chunks sent in this call
+        if extractStream:
+            bytesSaved = sourceFileSize - fileSize if chunkIndices else 0
+        else:
+            bytesSaved = sum(
+                min(int(fileSize) - index * chunkSize, chunkSize)
+                for index in chunkIndices
+            ) - sum(sentBytes)
+        logger.info("compression saved %d bytes", bytesSaved)
+        return {"status_code": statusCode, "bytesSaved": bytesSaved}
+
+    # file of one chunk in one request, without upload parameters
+
+    def uploadFile(
+        self,
+        sourceFilePath,
+        repositoryType,
+        depId,
+        contentType,
+        milestone,
+        partNumber,
+        contentFormat,
+        version,
+        allowOverwrite=False,
+        compress=True,
+        fullTestHash=None,
+    ) -> typing.Optional[dict]:
+        # returns None if the server does not have the compression type, so that the file may be sent with upload parameters
+        if not fullTestHash:
+            fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=self.hashType)
+        with open(sourceFilePath, "rb") as r:
+            data = r.read()
+        fileSize = len(data)
+        compressionType = None
+        if compress and self.compressionType in CodecProvider.getNames(streamable=True):
+            if self.adaptiveCompression:
+                policy = self.fileFormatCompressionD.get(contentFormat, "auto")
+                compressionType, data = UploadUtility(self.cP).compressChunkAdaptive(
+                    data, self.compressionType, policy
+                )
+            else:
+                compressionType = self.compressionType
+                data = UploadUtility(self.cP).compressChunk(data, compressionType)
+        mD = {
+            # file parameters
+            "repositoryType": repositoryType,
+            "depId": depId,
+            "contentType": contentType,
+            "milestone": milestone,
+            "partNumber": partNumber,
+            "contentFormat": contentFormat,
+            "version": version,
+            # upload file parameters
+            "hashType": self.hashType,
+            "hashDigest": fullTestHash,
+            "fileSize": fileSize,
+            "allowOverwrite": allowOverwrite,
+            "compressionType": compressionType,
+        }
+        url = os.path.join(self.baseUrl, "uploadFile")
+        response = requests.post(
+            url, data=mD, files={"file": data}, headers=self.headerD, timeout=None
+        )
+        if response.status_code == 400 and "unknown compression type" in response.text:
+            logger.info("server does not have compression type %s", compressionType)
+            return None
+        if response.status_code != 200:
+            logger.error(
+                "Status code %r with text %r ...terminating",
+                response.status_code,
+                response.text,
+            )
+        return {"status_code": response.status_code, "bytesSaved": fileSize - len(data)}
+
+    # next version of a file, sent as a delta against the latest version
+
+    def uploadDelta(
+        self,
+        sourceFilePath,
+        repositoryType,
+        depId,
+        contentType,
+        milestone,
+        partNumber,
+        contentFormat,
+        allowOverwrite=False,
+        resumable=False,
+        maxLiteralRatio=0.5,
+        maxRolledBlocks=64,
+    ) -> dict:
+        # without a previous version, or if the files differ too much, the whole file is uploaded
+        if not os.path.exists(sourceFilePath):
+            logger.error("File does not exist: %r", sourceFilePath)
+            return None
+        fullUpload = functools.partial(
+            self.upload,
+            sourceFilePath,
+            repositoryType,
+            depId,
+            contentType,
+            milestone,
+            partNumber,
+            contentFormat,
+            "next",
+            allowOverwrite=allowOverwrite,
+            resumable=resumable,
+        )
+        parameters = {
+            "repositoryType": repositoryType,
+            "depId": depId,
+            "contentType": contentType,
+            "milestone": milestone,
+            "partNumber": partNumber,
+            "contentFormat": contentFormat,
+        }
+        url = os.path.join(self.baseUrl, "deltaSignatures")
+        response = requests.get(url, params=parameters, headers=self.headerD, timeout=None)
+        if response.status_code != 200:
+            logger.info("no previous version for a delta (%d), uploading whole file", response.status_code)
+            return fullUpload()
+        signatureD = json.loads(response.text)
+        fileSize = os.path.getsize(sourceFilePath)
+        fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=self.hashType)
+        fd, deltaFilePath = tempfile.mkstemp(suffix=".delta")
+        os.close(fd)
+        try:
+            deltaSize = DeltaProvider.makeDelta(
+                sourceFilePath, signatureD, deltaFilePath, maxLiteralRatio, maxRolledBlocks
+            )
+            if deltaSize is None:
+                logger.info("file differs too much from the previous version, uploading whole file")
+                return fullUpload()
+            result = self.getUploadParameters(
+                repositoryType,
+                depId,
+                contentType,
+                milestone,
+                partNumber,
+                contentFormat,
+                "next",
+                allowOverwrite,
+                resumable,
+                fileSize,
+                self.hashType,
+                fullTestHash,
+            )
+            if result["status_code"] != 200 or not result["uploadId"]:
+                return {"status_code": result["status_code"]}
+            if result["satisfied"]:
+                return {"status_code": result["status_code"], "bytesSaved": fileSize}
+            chunkSize = int(result["chunkSize"] or self.chunkSize)
+            expectedChunks = max(1, math.ceil(deltaSize / chunkSize))
+            mD = {
+                # chunk parameters
+                "chunkSize": chunkSize,
+                "chunkIndex": 0,
+                "expectedChunks": expectedChunks,
+                # upload file parameters
+                "uploadId": result["uploadId"],
+                "hashType": self.hashType,
+                "hashDigest": fullTestHash,
+                # save file parameters
+                "filePath": result["filePath"],
+                "fileSize": fileSize,
+                "baseFilePath": signatureD["filePath"],
+                "blockSize": signatureD["blockSize"],
+                "allowOverwrite": allowOverwrite,
+                "resumable": resumable,
+            }
+            url = os.path.join(self.baseUrl, "uploadDelta")
+            failed = threading.Event()
+
+            def uploadOne(index):
+                # delta chunks are written at their own offset on the server, so may be sent in any order
+                if failed.is_set():
+                    return None
+                with open(deltaFilePath, "rb") as of:
+                    of.seek(index * chunkSize)
+                    chunk = of.read(chunkSize)
+                data = deepcopy(mD)
+                data["chunkIndex"] = index
+                response = self.postChunk(url, data, chunk)
+                if response.status_code != 200:
+                    logger.error(
+                        "Status code %r with text %r ...terminating",
+                        response.status_code,
+                        response.text,
                     )
-                    if not chunk:
-                        logger.error("error - could not compress chunks")
-                        return None
-                logger.debug(
-                    "packet size %s chunk %s expected %s",
-                    packetSize,
-                    mD["chunkIndex"],
-                    expectedChunks,
+                    failed.set()
+                return response.status_code
+
+            statusCode = 200
+            with ThreadPoolExecutor(max_workers=self.chunkConcurrency) as executor:
+                for status in executor.map(uploadOne, range(expectedChunks)):
+                    if status is None and statusCode == 200:
+                        statusCode = None
+                    elif status is not None and status != 200 and statusCode == 200:
+                        statusCode = status
+            if statusCode is None:
+                return None
+            logger.info("delta saved %d bytes", fileSize - deltaSize)
+            return {"status_code": statusCode, "bytesSaved": fileSize - deltaSize}
+        finally:
+            if os.path.exists(deltaFilePath):
+                os.unlink(deltaFilePath)
+
+    # many files of one deposition in one request
+
+    def uploadBundle(self, repositoryType, depId, files, allowOverwrite=False) -> dict:
+        # files - dicts of sourceFilePath, contentType, milestone, partNumber, contentFormat, and version (default next)
+        sourceFilePaths = []
+        manifest = []
+        for d in files:
+            if not os.path.exists(d["sourceFilePath"]):
+                logger.error("File does not exist: %r", d["sourceFilePath"])
+                return None
+            sourceFilePaths.append(d["sourceFilePath"])
+            manifest.append(
+                {
+                    "contentType": d["contentType"],
+                    "milestone": d.get("milestone") or "",
+                    "partNumber": d["partNumber"],
+                    "contentFormat": d["contentFormat"],
+                    "version": d.get("version") or "next",
+                    "fileSize": os.path.getsize(d["sourceFilePath"]),
+                    "hashDigest": IoUtility().getHashDigest(
+                        d["sourceFilePath"], hashType=self.hashType
+                    ),
+                }
+            )
+        # the tar is written into a pipe as the request body is sent
+        readFd, writeFd = os.pipe()
+
+        def write():
+            try:
+                with os.fdopen(writeFd, "wb") as w:
+                    BundleProvider.writeBundle(w, sourceFilePaths, manifest)
+            except BrokenPipeError:
+                # request ended early
+                pass
+
+        def body(r):
+            while block := r.read(1048576):
+                yield block
+
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        parameters = {
+            "repositoryType": repositoryType,
+            "depId": depId,
+            "hashType": self.hashType,
+            "allowOverwrite": allowOverwrite,
+        }
+        url = os.path.join(self.baseUrl, "uploadBundle")
+        try:
+            with os.fdopen(readFd, "rb") as r:
+                response = requests.post(
+                    url, params=parameters, data=body(r), headers=self.headerD, timeout=None
                 )
+        finally:
+            writer.join()
+        if response.status_code != 200:
+            logger.error("error in bundle upload %d %s", response.status_code, response.text)
+            return {"status_code": response.status_code, "files": None}
+        return {"status_code": response.status_code, "files": response.json()["files"]}
+
+    def getCompressionTypes(self) -> typing.List[str]:
+        # compression types offered to the server for chunks and streams, configured type first
+        names = CodecProvider.getNames(streamable=True)
+        if self.compressionType in names:
+            names.remove(self.compressionType)
+            names.insert(0, self.compressionType)
+        return names
+
+    def getCompressionDictionary(self, dictionaryId: str) -> typing.Optional[bytes]:
+        # preset dictionary named by upload parameters, fetched from the server once per process
+        zdict = CodecProvider.getDictionary(dictionaryId)
+        if zdict:
+            return zdict
+        url = os.path.join(self.baseUrl, "compressionDictionary")
+        response = requests.get(
+            url, params={"dictionaryId": dictionaryId}, headers=self.headerD, timeout=None
+        )
+        if response.status_code != 200:
+            logger.warning("error %d - no compression dictionary %s", response.status_code, dictionaryId)
+            return None
+        CodecProvider.addDictionary(dictionaryId, response.content)
+        return response.content
 
+    def getChunkHashDigest(self, chunk: bytes, hashType: typing.Optional[str] = None):
+        # digest of the uncompressed chunk, as the server will store it
+        hashObj = IoUtility.getHashObject(hashType if hashType else self.hashType)
+        if not hashObj:
+            return None
+        hashObj.update(chunk)
+        return hashObj.hexdigest()
+
+    def postChunk(
+        self, url: str, data: dict, chunk: bytes, retries: int = 3, raw: bool = False
+    ):
+        # resend a chunk that was corrupted in transit (the server keeps the session)
+        for _ in range(retries):
+            if raw:
+                # PUT <url>/<upload id>/<chunk index>, the chunk is the body and its parameters are headers
+                response = requests.put(
+                    "%s/%s/%d" % (url, data["uploadId"], data["chunkIndex"]),
+                    data=chunk,
+                    headers=self.getChunkHeaders(data),
+                    timeout=None,
+                )
+            else:
                 response = requests.post(
                     url,
-                    data=deepcopy(mD),
+                    data=data,
                     headers=self.headerD,
                     files={"chunk": chunk},
                     stream=True,
                     timeout=None,
                 )
+            if response.status_code != 400 or "chunk hash comparison failed" not in response.text:
+                break
+            logger.warning("chunk %s failed hash comparison, retrying", data.get("chunkIndex"))
+        if response.status_code == 202:
+            # last chunk of an upload finalized in the background
+            response = self.waitFinalize(response)
+        return response
 
-                if response.status_code != 200:
-                    logger.error(
-                        "Status code %r with text %r ...terminating",
-                        response.status_code,
-                        response.text,
+    def waitFinalize(self, response: requests.Response, waitSeconds: int = 30) -> requests.Response:
+        # long poll the status of the job until it ends, then return its response in place of the last chunk's
+        url = os.path.join(self.baseUrl, "uploadStatus", response.json()["jobId"])
+        while response.status_code == 202:
+            logger.info("waiting for finalization %s", response.json().get("phase"))
+            response = requests.get(url, params={"wait": waitSeconds}, headers=self.headerD, timeout=None)
+        return response
+
+    def sendChunks(
+        self,
+        sendChunk: typing.Callable[[int], typing.Optional[int]],
+        chunkIndices: typing.List[int],
+        chunkSize: int,
+        fileSize: int,
+        concurrency: typing.Optional[int] = None,
+        callback: typing.Optional[typing.Callable[[int, typing.Optional[int]], None]] = None,
+    ) -> typing.Optional[int]:
+        """
+
+        Args:
+            sendChunk: sends the chunk of an index, returns its status code (None if the chunk could not be made)
+            chunkIndices: chunks to send, in order
+            chunkSize: chunk size of the upload session
+            fileSize: size of the file that is chunked
+            concurrency: chunks sent at once to begin with (from upload parameters)
+            callback: called with the index and status code of each chunk as it completes
+
+        Returns:
+            200, or the first other status code (None if a chunk could not be made)
+
+        chunk 0 preallocates the file on the server, so it is sent before the others
+        the chunk size is fixed by the session, the number of chunks in flight follows the throughput measured as chunks complete
+        """
+        provider = ChunkSizeProvider(self.cP)
+        concurrency = concurrency if concurrency else self.chunkConcurrency
+        batches = [chunkIndices]
+        if len(chunkIndices) > 1 and chunkIndices[0] == 0:
+            batches = [chunkIndices[:1], chunkIndices[1:]]
+        statusCode = 200
+        sent = 0
+        throughput = None
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=provider.maxConcurrency) as executor:
+            for batch in batches:
+                waiting = list(reversed(batch))
+                pending = {}
+                while pending or (waiting and statusCode == 200):
+                    while waiting and statusCode == 200 and len(pending) < concurrency:
+                        index = waiting.pop()
+                        pending[executor.submit(sendChunk, index)] = index
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        status = future.result()
+                        if status is None and statusCode == 200:
+                            statusCode = None
+                        elif status is not None and status != 200 and statusCode == 200:
+                            statusCode = status
+                        sent += max(min(fileSize - index * chunkSize, chunkSize), 0)
+                        if callback:
+                            callback(index, status)
+                    # file bytes per second, of all chunks in flight
+                    throughput = sent / max(time.time() - started, 0.001)
+                    concurrency = provider.getConcurrency(
+                        chunkSize,
+                        fileSize - sent,
+                        throughput,
+                        self.getTransfer()["rtt"],
                     )
-                    break
-                mD["chunkIndex"] += 1
+        if statusCode == 200 and throughput:
+            self.setTransfer(throughput=throughput)
+        return statusCode
 
-        return {"status_code": response.status_code}
+    def getTransfer(self) -> dict:
+        with ClientUtility.__transferLock:
+            return dict(ClientUtility.__transfer)
+
+    def setTransfer(
+        self, throughput: typing.Optional[float] = None, rtt: typing.Optional[float] = None
+    ):
+        # moving averages, the round trip time leans to its minimum (a slow response may be server work rather than the network)
+        with ClientUtility.__transferLock:
+            transfer = ClientUtility.__transfer
+            if throughput:
+                previous = transfer["throughput"]
+                transfer["throughput"] = throughput if not previous else (previous + throughput) / 2
+            if rtt:
+                previous = transfer["rtt"]
+                transfer["rtt"] = rtt if not previous else min(rtt, (previous + rtt) / 2)
+
+    def requestUploadParameters(self, parameters: dict) -> requests.Response:
+        # the measured link is sent with the request, whose round trip time is measured in turn
+        parameters = dict(parameters)
+        for key, val in self.getTransfer().items():
+            if val:
+                parameters[key] = val
+        url = os.path.join(self.baseUrl, "getUploadParameters")
+        started = time.time()
+        response = requests.get(
+            url, params=parameters, headers=self.headerD, timeout=None
+        )
+        if response.status_code == 200:
+            self.setTransfer(rtt=time.time() - started)
+        return response
+
+    def getChunkHeaders(self, data: dict) -> dict:
+        # chunk parameters as headers of a raw chunk request, chunkHashDigest -> X-Chunk-Hash-Digest
+        headerD = dict(self.headerD)
+        for key, val in data.items():
+            if key in ("uploadId", "chunkIndex") or val is None:
+                continue
+            name = "X-" + re.sub(r"(?<!^)(?=[A-Z])", "-", key).title()
+            headerD[name] = str(val).lower() if isinstance(val, bool) else str(val)
+        return headerD
 
     # if file parameter is one chunk
 
@@ -447,10 +1004,19 @@ class ClientUtility(object):
         version,
         allowOverwrite,
         resumable,
+        fileSize=None,
+        hashType=None,
+        hashDigest=None,
     ) -> dict:
         saveFilePath = None
         chunkIndex = 0
         uploadId = None
+        chunkBitmap = "0"
+        compressionType = None
+        dictionaryId = None
+        satisfied = False
+        chunkSize = None
+        chunkConcurrency = None
         parameters = {
             "repositoryType": repositoryType,
             "depId": depId,
@@ -461,11 +1027,13 @@ class ClientUtility(object):
             "version": version,
             "allowOverwrite": allowOverwrite,
             "resumable": resumable,
+            "compressionTypes": ",".join(self.getCompressionTypes()),
+            "compressionDictionary": self.compressionDictionary,
+            "fileSize": fileSize,
+            "hashType": hashType,
+            "hashDigest": hashDigest,
         }
-        url = os.path.join(self.baseUrl, "getUploadParameters")
-        response = requests.get(
-            url, params=parameters, headers=self.headerD, timeout=None
-        )
+        response = self.requestUploadParameters(parameters)
         if response.status_code == 200:
             logger.info("upload parameters - response %d", response.status_code)
             result = json.loads(response.text)
@@ -473,6 +1041,12 @@ class ClientUtility(object):
                 saveFilePath = result["filePath"]
                 chunkIndex = int(result["chunkIndex"])
                 uploadId = result["uploadId"]
+                chunkBitmap = result.get("chunkBitmap") or "0"
+                compressionType = result.get("compressionType")
+                dictionaryId = result.get("compressionDictionary")
+                satisfied = bool(result.get("satisfied"))
+                chunkSize = result.get("chunkSize")
+                chunkConcurrency = result.get("chunkConcurrency")
                 if chunkIndex > 0:
                     logger.info("detected upload with chunk index %s", chunkIndex)
         if not saveFilePath:
@@ -482,6 +1056,12 @@ class ClientUtility(object):
                 "filePath": None,
                 "chunkIndex": None,
                 "uploadId": None,
+                "chunkBitmap": None,
+                "compressionType": None,
+                "compressionDictionary": None,
+                "satisfied": False,
+                "chunkSize": None,
+                "chunkConcurrency": None,
             }
         if not uploadId:
             logger.error("Error %d - no upload id was formed", response.status_code)
@@ -490,12 +1070,24 @@ class ClientUtility(object):
                 "filePath": None,
                 "chunkIndex": None,
                 "uploadId": None,
+                "chunkBitmap": None,
+                "compressionType": None,
+                "compressionDictionary": None,
+                "satisfied": False,
+                "chunkSize": None,
+                "chunkConcurrency": None,
             }
         return {
             "status_code": response.status_code,
             "filePath": saveFilePath,
             "chunkIndex": chunkIndex,
             "uploadId": uploadId,
+            "chunkBitmap": chunkBitmap,
+            "compressionType": compressionType,
+            "compressionDictionary": dictionaryId,
+            "satisfied": satisfied,
+            "chunkSize": chunkSize,
+            "chunkConcurrency": chunkConcurrency,
         }
 
     def uploadChunk(
@@ -517,6 +1109,10 @@ class ClientUtility(object):
         allowOverwrite: bool = False,
         resumable: bool = False,
         extractChunk: bool = False,
+        extractStream: bool = False,
+        compressionType: typing.Optional[str] = None,
+        contentFormat: typing.Optional[str] = None,
+        compressionDictionary: typing.Optional[str] = None,
     ) -> int:
         # validate input
         if not os.path.exists(sourceFilePath):
@@ -525,6 +1121,10 @@ class ClientUtility(object):
         fileExtension = (
             fileExtension if fileExtension else os.path.splitext(sourceFilePath)[-1]
         )
+        # as negotiated with upload parameters
+        compressionType = compressionType if compressionType else self.compressionType
+        if compressionDictionary and not self.getCompressionDictionary(compressionDictionary):
+            compressionDictionary = None
         offset = chunkIndex * chunkSize
         statusCode = 200
         with open(sourceFilePath, "rb") as of:
@@ -532,18 +1132,31 @@ class ClientUtility(object):
             url = os.path.join(self.baseUrl, "upload")
             packetSize = min(
                 fileSize - offset,
-                int(self.chunkSize),
+                int(chunkSize),
             )
             chunk = of.read(packetSize)
-            if not decompress:
+            chunkHashDigest = self.getChunkHashDigest(chunk, hashType)
+            if not decompress and not extractStream:
                 if extractChunk is None or extractChunk is True:
                     extractChunk = True
-                    chunk = UploadUtility(self.cP).compressChunk(
-                        chunk, self.compressionType
-                    )
-                    if not chunk:
-                        logger.error("error compressing chunk")
-                        return None
+                    if self.adaptiveCompression:
+                        # store, fast, or strong by content format, sampled per chunk
+                        compressionType, chunk = UploadUtility(self.cP).compressChunkAdaptive(
+                            chunk,
+                            compressionType,
+                            self.fileFormatCompressionD.get(contentFormat, "auto"),
+                            dictionaryId=compressionDictionary,
+                        )
+                        if chunk is None:
+                            logger.error("error compressing chunk")
+                            return None
+                    else:
+                        chunk = UploadUtility(self.cP).compressChunk(
+                            chunk, compressionType, compressionDictionary
+                        )
+                        if not chunk:
+                            logger.error("error compressing chunk")
+                            return None
             logger.debug(
                 "packet size %s chunk %s expected %s",
                 packetSize,
@@ -559,6 +1172,7 @@ class ClientUtility(object):
                 "uploadId": uploadId,
                 "hashType": hashType,
                 "hashDigest": hashDigest,
+                "chunkHashDigest": chunkHashDigest,
                 # save file parameters
                 "filePath": saveFilePath,
                 "fileSize": fileSize,
@@ -567,15 +1181,11 @@ class ClientUtility(object):
                 "allowOverwrite": allowOverwrite,
                 "resumable": resumable,
                 "extractChunk": extractChunk,
+                "extractStream": extractStream,
+                "compressionType": compressionType,
+                "compressionDictionary": compressionDictionary,
             }
-            response = requests.post(
-                url,
-                data=mD,
-                headers=self.headerD,
-                files={"chunk": chunk},
-                stream=True,
-                timeout=None,
-            )
+            response = self.postChunk(url, mD, chunk, raw=self.rawChunks)
             if response.status_code != 200:
                 statusCode = response.status_code
                 logger.error(
@@ -66,6 +66,11 @@ def upload(d):
             print("error in upload - no response")
         return None
 
+    # hash of the file as stored (not compressed), so that identical content already on the server is not sent
+    hashType = client.cP.get("HASH_TYPE")
+    storedHash = None
+    if not d["decompress"] and not COMPRESS_FILE:
+        storedHash = IoUtility().getHashDigest(d["sourceFilePath"], hashType=hashType)
     # get upload parameters
     response = client.getUploadParameters(
         d["repositoryType"],
@@ -77,13 +82,25 @@ def upload(d):
         d["version"],
         d["allowOverwrite"],
         d["resumable"],
+        os.path.getsize(d["sourceFilePath"]),
+        hashType if storedHash else None,
+        storedHash,
     )
     if not response or response["status_code"] != 200:
         print("error in get upload parameters %r" % response)
         return None
+    if response["satisfied"]:
+        print("identical content already stored as %s" % response["filePath"])
+        return response["status_code"]
     saveFilePath = response["filePath"]
     chunkIndex = response["chunkIndex"]
     uploadId = response["uploadId"]
+    bitmap = int(response["chunkBitmap"] or "0", 16)
+    compressionType = response["compressionType"]
+    compressionDictionary = response["compressionDictionary"]
+    # recommended for the file from the measured link, or the chunk size of a resumed session
+    chunkSize = int(response["chunkSize"] or client.cP.get("CHUNK_SIZE"))
+    chunkConcurrency = response["chunkConcurrency"]
     # compress, then hash and compute file size parameter, then upload
     decompress = d["decompress"]
     if COMPRESS_FILE:
@@ -100,17 +117,17 @@ def upload(d):
             % (d["sourceFilePath"], os.path.getsize(d["sourceFilePath"]))
         )
     # hash
-    hashType = client.cP.get("HASH_TYPE")
-    fullTestHash = IoUtility().getHashDigest(d["sourceFilePath"], hashType=hashType)
+    fullTestHash = storedHash
+    if not fullTestHash:
+        fullTestHash = IoUtility().getHashDigest(d["sourceFilePath"], hashType=hashType)
     # compute expected chunks
     fileSize = os.path.getsize(d["sourceFilePath"])
-    chunkSize = int(client.cP.get("CHUNK_SIZE"))
     expectedChunks = 1
     if chunkSize < fileSize:
         expectedChunks = math.ceil(fileSize / chunkSize)
     fileExtension = os.path.splitext(d["sourceFilePath"])[-1]
     extractChunk = True
-    if decompress or not COMPRESS_CHUNKS:
+    if decompress or not COMPRESS_CHUNKS or not compressionType:
         extractChunk = False
     # upload chunks sequentially
     mD = {
@@ -130,6 +147,9 @@ def upload(d):
         "allowOverwrite": d["allowOverwrite"],
         "resumable": d["resumable"],
         "extractChunk": extractChunk,
+        "compressionType": compressionType,
+        "compressionDictionary": compressionDictionary,
+        "contentFormat": d["contentFormat"],
     }
     print(
         "decompress %s extract chunk %s compress chunks %s file size %d chunk size %d expected chunks %d"
@@ -142,19 +162,31 @@ def upload(d):
             expectedChunks,
         )
     )
-    status = None
-    for index in tqdm(
-        range(chunkIndex, expectedChunks),
+    # upload concurrent chunks, skipping chunks the server already has
+    # the number of chunks in flight follows the throughput measured as chunks complete
+    indices = [i for i in range(chunkIndex, expectedChunks) if not bitmap & (1 << i)]
+
+    def uploadOne(index):
+        chunkD = dict(mD)
+        chunkD["chunkIndex"] = index
+        return client.uploadChunk(d["sourceFilePath"], **chunkD)
+
+    with tqdm(
         leave=False,
-        total=expectedChunks - chunkIndex,
+        total=len(indices),
         desc=os.path.basename(d["sourceFilePath"]),
         ascii=False,
-    ):
-        mD["chunkIndex"] = index
-        status = client.uploadChunk(d["sourceFilePath"], **mD)
-        if status != 200:
-            print("error in upload %r" % response)
-            break
+    ) as progress:
+        status = client.sendChunks(
+            uploadOne,
+            indices,
+            chunkSize,
+            fileSize,
+            chunkConcurrency,
+            lambda index, status: progress.update(1),
+        )
+    if status != 200:
+        print("error in upload %r" % status)
     return status
 
 
@@ -669,6 +669,7 @@ class Gui(tk.Frame):
             version,
             allowOverwrite,
             resumable,
+            os.path.getsize(readFilePath),
         )
         if not response or response["status_code"] != 200:
             print("error in get upload parameters %r" % response)
@@ -676,6 +677,8 @@ class Gui(tk.Frame):
         saveFilePath = response["filePath"]
         chunkIndex = response["chunkIndex"]
         uploadId = response["uploadId"]
+        compressionType = response["compressionType"]
+        compressionDictionary = response["compressionDictionary"]
         # compress, then hash and compute file size parameter, then upload
         if COMPRESS_FILE:
             print("compressing file")
@@ -688,13 +691,14 @@ class Gui(tk.Frame):
         fullTestHash = IoUtility().getHashDigest(readFilePath, hashType=hashType)
         # compute expected chunks
         fileSize = os.path.getsize(readFilePath)
-        chunkSize = self.__cU.cP.get("CHUNK_SIZE")
+        # recommended for the file, or the chunk size of a resumed session
+        chunkSize = response["chunkSize"] or self.__cU.cP.get("CHUNK_SIZE")
         expectedChunks = 1
         if chunkSize < fileSize:
             expectedChunks = math.ceil(fileSize / chunkSize)
         fileExtension = os.path.splitext(readFilePath)[-1]
         extractChunk = True
-        if DECOMPRESS_FILE or not COMPRESS_CHUNKS:
+        if DECOMPRESS_FILE or not COMPRESS_CHUNKS or not compressionType:
             extractChunk = False
         # upload chunks sequentially
         mD = {
@@ -714,6 +718,9 @@ class Gui(tk.Frame):
             "allowOverwrite": allowOverwrite,
             "resumable": resumable,
             "extractChunk": extractChunk,
+            "compressionType": compressionType,
+            "compressionDictionary": compressionDictionary,
+            "contentFormat": contentFormat,
         }
         self.upload_status.set("0%")
         print(
@@ -0,0 +1,133 @@
+# file: BundleProvider.py
+
+import io
+import json
+import logging
+import os
+import queue
+import tarfile
+import threading
+import typing
+from rcsb.app.file.IoUtility import IoUtility
+
+logging.basicConfig(level=logging.INFO)
+
+
+class BundleProvider(object):
+    """
+    many files of one deposition sent as one streamed tar
+    first member - manifest.json, a list of target descriptors (contentType, milestone, partNumber, contentFormat, version, fileSize, hashDigest)
+    then one member per file, named by its index in the manifest
+    client - writes the tar into a pipe as the request body is sent
+    server - reads the tar from the request body as it arrives, writing each member to its own temp file
+    """
+
+    MANIFEST = "manifest.json"
+
+    @staticmethod
+    def writeBundle(w: typing.IO, sourceFilePaths: typing.List[str], manifest: typing.List[dict]):
+        # stream mode, nothing is held in memory beyond one tar record
+        with tarfile.open(fileobj=w, mode="w|") as tar:
+            data = json.dumps(manifest).encode("utf-8")
+            info = tarfile.TarInfo(BundleProvider.MANIFEST)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+            for index, sourceFilePath in enumerate(sourceFilePaths):
+                info = tarfile.TarInfo(str(index))
+                info.size = os.path.getsize(sourceFilePath)
+                with open(sourceFilePath, "rb") as r:
+                    tar.addfile(info, r)
+
+    @staticmethod
+    def readBundle(
+        r: typing.IO,
+        tempPrefix: str,
+        hashType: typing.Optional[str] = None,
+        blockSize: int = 1048576,
+    ) -> typing.Tuple[typing.List[dict], typing.List[dict]]:
+        """
+
+        Args:
+            r: tar stream (read only forward)
+            tempPrefix: member n is written to <temp prefix>.<n> (the caller removes these on error)
+            hashType: digest each member as written (MD5, SHA1, or SHA256)
+            blockSize: bound on the bytes held in memory at one time
+
+        Returns:
+            manifest, and for each member in manifest order - temp path, file size, hash digest
+
+        """
+        manifest = None
+        entries = {}
+        with tarfile.open(fileobj=r, mode="r|") as tar:
+            for member in tar:
+                if manifest is None:
+                    if member.name != BundleProvider.MANIFEST or not member.isfile():
+                        raise ValueError("error - bundle does not start with a manifest")
+                    manifest = json.load(tar.extractfile(member))
+                    if not isinstance(manifest, list):
+                        raise ValueError("error - bundle manifest is not a list")
+                    continue
+                if not member.isfile() or not member.name.isdigit():
+                    raise ValueError("error - unexpected bundle member %s" % member.name)
+                index = int(member.name)
+                if index >= len(manifest) or index in entries:
+                    raise ValueError("error - bundle member %s not in manifest" % member.name)
+                tempPath = "%s.%d" % (tempPrefix, index)
+                hashObj = IoUtility.getHashObject(hashType) if hashType else None
+                fh = tar.extractfile(member)
+                with open(tempPath, "wb") as w:
+                    while block := fh.read(blockSize):
+                        w.write(block)
+                        if hashObj:
+                            hashObj.update(block)
+                entries[index] = {
+                    "tempPath": tempPath,
+                    "fileSize": member.size,
+                    "hashDigest": hashObj.hexdigest() if hashObj else None,
+                }
+        if manifest is None:
+            raise ValueError("error - empty bundle")
+        if len(entries) != len(manifest):
+            raise ValueError("error - bundle is missing files")
+        return manifest, [entries[index] for index in range(len(manifest))]
+
+
+class BundleReader(object):
+    """
+    file-like reader of a request body that arrives in blocks from the event loop
+    the event loop feeds blocks (from a worker thread, since a full queue blocks), the tar reader reads them in another thread
+    """
+
+    def __init__(self, maxBlocks: int = 16):
+        self.__queue = queue.Queue(maxBlocks)
+        self.__buffer = bytearray()
+        self.__eof = False
+        # set once the reader stops, so that a feeder never waits on a queue that is not read
+        self.closed = threading.Event()
+
+    def feed(self, data: typing.Optional[bytes]) -> bool:
+        # None ends the stream, returns False if the reader has stopped
+        while not self.closed.is_set():
+            try:
+                self.__queue.put(data, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.__eof and (size < 0 or len(self.__buffer) < size):
+            block = self.__queue.get()
+            if block is None:
+                self.__eof = True
+            else:
+                self.__buffer.extend(block)
+        if size < 0:
+            size = len(self.__buffer)
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+    def close(self):
+        self.closed.set()
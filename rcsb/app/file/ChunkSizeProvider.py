@@ -0,0 +1,87 @@
+# file: ChunkSizeProvider.py
+
+import logging
+import math
+import typing
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.Executors import Executors
+
+logging.basicConfig(level=logging.INFO)
+
+
+class ChunkSizeProvider(object):
+    """
+    chunk size and concurrency recommended for an upload, returned with its upload parameters
+    without measurements - CHUNK_SIZE and CHUNK_CONCURRENCY from config.yml
+    with the throughput (bytes per second) and round trip time (seconds) that the client measured on earlier chunks
+      chunk size - about TARGET_SECONDS of transfer, long enough to keep the link busy, short enough to resend cheaply
+      concurrency - enough chunks in flight to cover the bandwidth delay product and the gap between requests
+    a file of fewer chunks than the concurrency is split into smaller chunks, so that it is still sent in parallel
+    under load (io tasks waiting beyond the pool of this server process), concurrency is halved
+    chunk sizes are whole MB, from MIN_CHUNK_SIZE to CHUNK_SIZE_MAX, concurrency from 1 to CHUNK_CONCURRENCY_MAX
+    the chunk size of an upload is fixed once chunks are sent, a resumed upload keeps the chunk size of its session
+    """
+
+    MIN_CHUNK_SIZE = 1048576
+    TARGET_SECONDS = 2.0
+
+    def __init__(self, cP: typing.Type[ConfigProvider] = None):
+        self.cP = cP if cP else ConfigProvider()
+        self.defaultChunkSize = int(self.cP.get("CHUNK_SIZE"))
+        self.defaultConcurrency = int(self.cP.get("CHUNK_CONCURRENCY"))
+        self.maxChunkSize = int(self.cP.get("CHUNK_SIZE_MAX") or self.defaultChunkSize)
+        self.maxConcurrency = int(
+            self.cP.get("CHUNK_CONCURRENCY_MAX") or self.defaultConcurrency
+        )
+
+    def getChunkSize(
+        self,
+        fileSize: typing.Optional[int] = None,
+        throughput: typing.Optional[float] = None,
+        rtt: typing.Optional[float] = None,
+    ) -> int:
+        chunkSize = self.defaultChunkSize
+        if throughput and throughput > 0:
+            chunkSize = throughput * ChunkSizeProvider.TARGET_SECONDS
+        if fileSize and fileSize > 0:
+            concurrency = self.getConcurrency(chunkSize, None, throughput, rtt)
+            if fileSize < chunkSize * concurrency:
+                chunkSize = fileSize / concurrency
+        chunkSize = min(max(chunkSize, ChunkSizeProvider.MIN_CHUNK_SIZE), self.maxChunkSize)
+        # whole MB
+        return max(int(chunkSize) // 1048576, 1) * 1048576
+
+    def getConcurrency(
+        self,
+        chunkSize: int,
+        fileSize: typing.Optional[int] = None,
+        throughput: typing.Optional[float] = None,
+        rtt: typing.Optional[float] = None,
+    ) -> int:
+        concurrency = self.defaultConcurrency
+        if throughput and throughput > 0 and rtt and rtt > 0:
+            # one chunk more than the bytes in flight, so the next request is sent while another waits on its response
+            concurrency = 1 + math.ceil(throughput * rtt / max(chunkSize, 1))
+        if fileSize and fileSize > 0:
+            concurrency = min(concurrency, math.ceil(fileSize / max(chunkSize, 1)))
+        return min(max(concurrency, 1), self.maxConcurrency)
+
+    def isLoaded(self) -> bool:
+        # io tasks of this server process are waiting for workers
+        metrics = Executors.getMetrics().get("io")
+        return bool(metrics and metrics["workers"] and metrics["pending"] > metrics["workers"])
+
+    def getParameters(
+        self,
+        fileSize: typing.Optional[int] = None,
+        throughput: typing.Optional[float] = None,
+        rtt: typing.Optional[float] = None,
+        chunkSize: typing.Optional[int] = None,
+    ) -> dict:
+        # chunk size - recorded in the session of a resumed upload, else recommended
+        if not chunkSize:
+            chunkSize = self.getChunkSize(fileSize, throughput, rtt)
+        concurrency = self.getConcurrency(chunkSize, fileSize, throughput, rtt)
+        if self.isLoaded():
+            concurrency = max(concurrency // 2, 1)
+        return {"chunkSize": chunkSize, "chunkConcurrency": concurrency}
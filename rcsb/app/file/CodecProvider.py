@@ -0,0 +1,475 @@
+# file: CodecProvider.py
+
+import bz2
+import logging
+import lzma
+import os
+import shutil
+import tempfile
+import typing
+import zipfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logging.basicConfig(level=logging.INFO)
+
+
+class Codec(object):
+    """
+    one compression format
+    name - compression type (config.yml COMPRESSION_TYPE, upload requests)
+    extension - extension of a compressed file
+    level - default compression level
+    fastLevel, strongLevel - levels chosen per chunk by adaptive compression
+    streamable - chunks and streams are compressed and decompressed incrementally (not zip)
+    compressors have compress(data) and flush()
+    decompressors have decompress(data, maxLength), eof, unused_data, and needs_input
+    """
+
+    name = None
+    extension = None
+    level = None
+    fastLevel = None
+    strongLevel = None
+    streamable = True
+
+    def available(self) -> bool:
+        # library installed
+        return True
+
+    def getCompressor(self, level: typing.Optional[int] = None):
+        raise NotImplementedError("error - %s has no stream compressor" % self.name)
+
+    def getDecompressor(self):
+        raise NotImplementedError("error - %s has no stream decompressor" % self.name)
+
+    def withDictionary(self, zdict: bytes) -> typing.Optional["Codec"]:  # pylint: disable=W0613
+        # codec using a preset dictionary, None if the format has no preset dictionaries
+        return None
+
+    def inflate(self, decompressor, data: bytes, blockSize: int):
+        # yield decompressed data in blocks of at most block size
+        yield decompressor.decompress(data, blockSize)
+        while not decompressor.eof and not decompressor.needs_input:
+            yield decompressor.decompress(b"", blockSize)
+
+    def compress(self, data: bytes, level: typing.Optional[int] = None) -> bytes:
+        compressor = self.getCompressor(level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes, blockSize: int = 1048576) -> bytes:
+        # one or more concatenated members (gzip, bzip2, xz) or frames (zstd, lz4)
+        out = []
+        while data:
+            decompressor = self.getDecompressor()
+            out.extend(self.inflate(decompressor, data, blockSize))
+            if not decompressor.eof:
+                raise ValueError("error - compressed data ended before the end of stream")
+            data = decompressor.unused_data
+        return b"".join(out)
+
+    def compressFile(
+        self,
+        readFilePath: str,
+        writeFilePath: str,
+        memberName: typing.Optional[str] = None,  # pylint: disable=W0613
+        level: typing.Optional[int] = None,
+        blockSize: int = 1048576,
+    ):
+        # member name is the name of the file inside of an archive (zip only)
+        compressor = self.getCompressor(level)
+        with open(readFilePath, "rb") as r:
+            with open(writeFilePath, "wb") as w:
+                while block := r.read(blockSize):
+                    w.write(compressor.compress(block))
+                w.write(compressor.flush())
+
+    def decompressFile(self, readFilePath: str, writeFilePath: str, blockSize: int = 1048576):
+        decompressor = None
+        with open(readFilePath, "rb") as r:
+            with open(writeFilePath, "wb") as w:
+                while block := r.read(blockSize):
+                    while block:
+                        if decompressor is None or decompressor.eof:
+                            # start of file, or next member
+                            decompressor = self.getDecompressor()
+                        for data in self.inflate(decompressor, block, blockSize):
+                            w.write(data)
+                        block = decompressor.unused_data if decompressor.eof else b""
+        if decompressor is not None and not decompressor.eof:
+            raise ValueError("error - compressed file ended before the end of stream")
+
+
+class ZlibCodec(Codec):
+    name = "zlib"
+    extension = ".zz"
+    level = 6
+    fastLevel = 1
+    strongLevel = 9
+    wbits = zlib.MAX_WBITS
+
+    def __init__(self, zdict: typing.Optional[bytes] = None):
+        # preset dictionary, the stream header carries its checksum so a mismatched dictionary fails to decompress
+        self.zdict = zdict
+
+    def withDictionary(self, zdict: bytes) -> typing.Optional[Codec]:
+        return ZlibCodec(zdict)
+
+    def getCompressor(self, level: typing.Optional[int] = None):
+        level = self.level if level is None else level
+        if self.zdict:
+            return zlib.compressobj(level, zlib.DEFLATED, self.wbits, zdict=self.zdict)
+        return zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+
+    def getDecompressor(self):
+        if self.zdict:
+            return zlib.decompressobj(self.wbits, zdict=self.zdict)
+        return zlib.decompressobj(self.wbits)
+
+    def inflate(self, decompressor, data: bytes, blockSize: int):
+        # output may remain buffered when the output limit is reached as input runs out
+        while not decompressor.eof:
+            out = decompressor.decompress(data, blockSize)
+            data = decompressor.unconsumed_tail
+            if out:
+                yield out
+            if not data and len(out) < blockSize:
+                break
+
+
+class GzipCodec(ZlibCodec):
+    # header without file name or time, so a resumed upload recompresses to the same bytes
+    name = "gzip"
+    extension = ".gz"
+    level = 9
+    fastLevel = 1
+    strongLevel = 9
+    wbits = 16 + zlib.MAX_WBITS
+
+    def withDictionary(self, zdict: bytes) -> typing.Optional[Codec]:
+        # gzip format has no preset dictionary
+        return None
+
+
+class Bzip2Codec(Codec):
+    name = "bzip2"
+    extension = ".bz2"
+    level = 9
+    fastLevel = 1
+    strongLevel = 9
+
+    def getCompressor(self, level: typing.Optional[int] = None):
+        return bz2.BZ2Compressor(self.level if level is None else level)
+
+    def getDecompressor(self):
+        return bz2.BZ2Decompressor()
+
+
+class LzmaCodec(Codec):
+    name = "lzma"
+    extension = ".xz"
+    level = 6
+    fastLevel = 0
+    strongLevel = 6
+
+    def getCompressor(self, level: typing.Optional[int] = None):
+        return lzma.LZMACompressor(preset=self.level if level is None else level)
+
+    def getDecompressor(self):
+        return lzma.LZMADecompressor()
+
+
+class ZipCodec(Codec):
+    name = "zip"
+    extension = ".zip"
+    level = None
+    streamable = False
+
+    def compress(self, data: bytes, level: typing.Optional[int] = None) -> bytes:
+        raise NotImplementedError("error - cannot compress chunks with zip file compression")
+
+    def decompress(self, data: bytes, blockSize: int = 1048576) -> bytes:
+        raise NotImplementedError("error - cannot extract chunks with zip file compression")
+
+    def compressFile(
+        self,
+        readFilePath: str,
+        writeFilePath: str,
+        memberName: typing.Optional[str] = None,
+        level: typing.Optional[int] = None,
+        blockSize: int = 1048576,
+    ):
+        # archive with one file inside, after extraction on server the file has the member name
+        memberName = memberName if memberName else os.path.basename(readFilePath)
+        with zipfile.ZipFile(writeFilePath, "w") as w:
+            w.write(readFilePath, memberName)
+
+    def decompressFile(self, readFilePath: str, writeFilePath: str, blockSize: int = 1048576):
+        # extract into a scratch dir beside the file, so members cannot overwrite neighbouring files
+        outputDir = tempfile.mkdtemp(
+            prefix="._", dir=os.path.dirname(os.path.abspath(writeFilePath))
+        )
+        try:
+            with zipfile.ZipFile(readFilePath, mode="r") as zObj:
+                for member in zObj.namelist()[:1]:
+                    # first file in zip archive, renamed from compressed file format to deposition format
+                    os.replace(zObj.extract(member, path=outputDir), writeFilePath)
+        finally:
+            shutil.rmtree(outputDir, ignore_errors=True)
+
+
+class ZstdNeedsInput(Exception):
+    # raised into a zstd stream reader whose frame input has run out, so that the reader is not finished
+    pass
+
+
+class ZstdFrameInput(object):
+    """
+    input of one zstd frame for a zstd stream reader, fed as it arrives
+    the frame structure (header, block headers, checksum) is read ahead, so only bytes of the frame are handed to the reader
+    and the end of the frame is known without decompressing
+    """
+
+    MAGIC = 0xFD2FB528
+    SKIPPABLE = 0x184D2A50
+
+    def __init__(self):
+        self.pending = bytearray()
+        # frame bytes handed to the reader, frame offset of the next structure to read
+        self.handed = 0
+        self.cursor = 0
+        self.frameSize = None
+        self.__header = False
+        self.__checksumSize = 0
+
+    def feed(self, data: bytes):
+        self.pending += data
+        while self.frameSize is None:
+            start = self.cursor - self.handed
+            if not self.__header:
+                if len(self.pending) < start + 5:
+                    return
+                magic = int.from_bytes(self.pending[start: start + 4], "little")
+                if magic & 0xFFFFFFF0 == ZstdFrameInput.SKIPPABLE:
+                    if len(self.pending) < start + 8:
+                        return
+                    self.frameSize = 8 + int.from_bytes(self.pending[start + 4: start + 8], "little")
+                    return
+                if magic != ZstdFrameInput.MAGIC:
+                    raise ValueError("error - not a zstd frame")
+                descriptor = self.pending[start + 4]
+                singleSegment = descriptor >> 5 & 1
+                self.cursor += (
+                    5
+                    + (1 - singleSegment)
+                    + (0, 1, 2, 4)[descriptor & 3]
+                    + (singleSegment, 2, 4, 8)[descriptor >> 6]
+                )
+                self.__checksumSize = 4 if descriptor & 4 else 0
+                self.__header = True
+            else:
+                if len(self.pending) < start + 3:
+                    return
+                block = int.from_bytes(self.pending[start: start + 3], "little")
+                # an rle block holds one byte whatever its size
+                self.cursor += 3 + (1 if block >> 1 & 3 == 1 else block >> 3)
+                if block & 1:
+                    self.frameSize = self.cursor + self.__checksumSize
+
+    def ended(self) -> bool:
+        # the whole frame has been handed to the reader
+        return self.frameSize is not None and self.handed >= self.frameSize
+
+    def read(self, size: int = -1) -> bytes:
+        if self.ended():
+            return b""
+        limit = (self.frameSize if self.frameSize is not None else self.cursor) - self.handed
+        size = min(size if size > 0 else limit, limit, len(self.pending))
+        if size <= 0:
+            raise ZstdNeedsInput()
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        self.handed += size
+        return data
+
+
+class ZstdDecompressor(object):
+    """
+    zstd decompressor with the interface of the standard library decompressors
+    output of each call is bounded by a zstd stream reader, whose input is one frame (ZstdFrameInput)
+    the reader asks for input only once it has no output to return, so when the input has run out no output is lost
+    """
+
+    def __init__(self, readSize: int = 131072):
+        self.__input = ZstdFrameInput()
+        self.__reader = zstandard.ZstdDecompressor().stream_reader(
+            self.__input, read_size=readSize, read_across_frames=False
+        )
+        self.eof = False
+        self.unused_data = b""
+        self.needs_input = True
+
+    def decompress(self, data: bytes, maxLength: int = -1) -> bytes:
+        if self.eof:
+            raise EOFError("error - end of zstd frame already reached")
+        self.__input.feed(data)
+        out = []
+        size = 0
+        self.needs_input = False
+        while maxLength < 0 or size < maxLength:
+            ended = self.__input.ended()
+            try:
+                # once the frame is all handed over, the reader finishes its input and returns what it still holds
+                block = (self.__reader.read if ended else self.__reader.read1)(
+                    maxLength - size if maxLength >= 0 else 1048576
+                )
+            except ZstdNeedsInput:
+                self.needs_input = True
+                break
+            if not block:
+                if ended:
+                    self.eof = True
+                    self.unused_data = bytes(self.__input.pending)
+                else:
+                    self.needs_input = True
+                break
+            out.append(block)
+            size += len(block)
+        return b"".join(out)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    extension = ".zst"
+    level = 3
+    fastLevel = 1
+    strongLevel = 12
+
+    def __init__(self, threads: int = -1):
+        # compression threads (-1 for one per processor, 0 for single threaded)
+        self.threads = threads
+
+    def available(self) -> bool:
+        return zstandard is not None
+
+    def getCompressor(self, level: typing.Optional[int] = None):
+        return zstandard.ZstdCompressor(
+            level=self.level if level is None else level, threads=self.threads
+        ).compressobj()
+
+    def getDecompressor(self):
+        return ZstdDecompressor()
+
+
+class Lz4Compressor(object):
+    """
+    lz4 frame compressor with the interface of the standard library compressors
+    """
+
+    def __init__(self, level: int):
+        self.__obj = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self.__header = self.__obj.begin()
+
+    def compress(self, data: bytes) -> bytes:
+        header, self.__header = self.__header, b""
+        return header + self.__obj.compress(data)
+
+    def flush(self) -> bytes:
+        header, self.__header = self.__header, b""
+        return header + self.__obj.flush()
+
+
+class Lz4Codec(Codec):
+    name = "lz4"
+    extension = ".lz4"
+    level = 0
+    fastLevel = 0
+    strongLevel = 9
+
+    def available(self) -> bool:
+        return lz4 is not None
+
+    def getCompressor(self, level: typing.Optional[int] = None):
+        return Lz4Compressor(self.level if level is None else level)
+
+    def getDecompressor(self):
+        return lz4.frame.LZ4FrameDecompressor()
+
+
+class CodecProvider(object):
+    """
+    registry of compression codecs, by name (compression type) or by file extension
+    codecs whose library is not installed are registered but not available
+    """
+
+    # compression type of a chunk sent as it is (adaptive compression)
+    STORE = "store"
+    __codecs = {}
+    # preset dictionaries by dictionary id (DictionaryProvider)
+    __dictionaries = {}
+
+    @staticmethod
+    def register(codec: Codec):
+        CodecProvider.__codecs[codec.name] = codec
+
+    @staticmethod
+    def getCodec(
+        name: typing.Optional[str], dictionaryId: typing.Optional[str] = None
+    ) -> typing.Optional[Codec]:
+        # with a dictionary id, None unless the dictionary is loaded and the codec takes preset dictionaries
+        codec = CodecProvider.__codecs.get(str(name))
+        if codec is None or not codec.available():
+            return None
+        if dictionaryId:
+            zdict = CodecProvider.__dictionaries.get(dictionaryId)
+            return codec.withDictionary(zdict) if zdict else None
+        return codec
+
+    @staticmethod
+    def addDictionary(dictionaryId: str, zdict: bytes):
+        CodecProvider.__dictionaries[dictionaryId] = zdict
+
+    @staticmethod
+    def getDictionary(dictionaryId: str) -> typing.Optional[bytes]:
+        return CodecProvider.__dictionaries.get(dictionaryId)
+
+    @staticmethod
+    def getCodecByExtension(fileExtension: typing.Optional[str]) -> typing.Optional[Codec]:
+        if not fileExtension:
+            return None
+        if not fileExtension.startswith("."):
+            fileExtension = "." + fileExtension
+        for codec in CodecProvider.__codecs.values():
+            if codec.extension == fileExtension and codec.available():
+                return codec
+        return None
+
+    @staticmethod
+    def getNames(streamable: bool = False) -> typing.List[str]:
+        # available codecs in order of registration
+        return [
+            name
+            for name, codec in CodecProvider.__codecs.items()
+            if codec.available() and (codec.streamable or not streamable)
+        ]
+
+    @staticmethod
+    def negotiate(offered: typing.List[str], streamable: bool = True) -> typing.Optional[str]:
+        # first of the offered codecs (in order of preference) that is available here
+        names = CodecProvider.getNames(streamable)
+        for name in offered:
+            if name.strip() in names:
+                return name.strip()
+        return None
+
+
+for _codec in [GzipCodec(), Bzip2Codec(), LzmaCodec(), ZipCodec(), ZstdCodec(), Lz4Codec(), ZlibCodec()]:
+    CodecProvider.register(_codec)
@@ -22,6 +22,7 @@ import re
 import validators
 from rcsb.app.config.setConfig import getConfig
 from rcsb.utils.config.ConfigUtil import ConfigUtil
+from rcsb.app.file.CodecProvider import CodecProvider
 
 logger = logging.getLogger(__name__)
 
@@ -114,6 +115,8 @@ class ConfigProvider(object):
         settings = [
             "SERVER_HOST_AND_PORT",
             "SURPLUS_PROCESSORS",
+            "EXECUTOR_PROCESS_WORKERS",
+            "EXECUTOR_THREAD_WORKERS",
             "REPOSITORY_DIR_PATH",
             "SESSION_DIR_PATH",
             "SHARED_LOCK_PATH",
@@ -127,8 +130,19 @@ class ConfigProvider(object):
             "KV_LOCK_TABLE_NAME",
             "KV_MAX_SECONDS",
             "KV_FILE_PATH",
+            "KV_MEMORY_MAX_KEYS",
+            "KV_SNAPSHOT_SECONDS",
+            "STORAGE_REFRESH_SECONDS",
+            "STORAGE_HEADROOM_BYTES",
             "CHUNK_SIZE",
+            "CHUNK_CONCURRENCY",
+            "CHUNK_SIZE_MAX",
+            "CHUNK_CONCURRENCY_MAX",
+            "ASYNC_FINALIZE_BYTES",
             "COMPRESSION_TYPE",
+            "ADAPTIVE_COMPRESSION",
+            "COMPRESSION_DICTIONARY",
+            "COMPRESSION_DICTIONARY_DIR_PATH",
             "HASH_TYPE",
             "DEFAULT_FILE_PERMISSIONS",
             "JWT_SUBJECT",
@@ -137,8 +151,25 @@ class ConfigProvider(object):
             "JWT_DURATION",
             "BYPASS_AUTHORIZATION",
         ]
-        assert_non_falsy = ["KV_MAX_SECONDS", "CHUNK_SIZE", "JWT_DURATION"]
-        assert_non_nullish = ["SURPLUS_PROCESSORS", "LOCK_TIMEOUT"]
+        assert_non_falsy = [
+            "KV_MAX_SECONDS",
+            "CHUNK_SIZE",
+            "CHUNK_CONCURRENCY",
+            "CHUNK_SIZE_MAX",
+            "CHUNK_CONCURRENCY_MAX",
+            "EXECUTOR_THREAD_WORKERS",
+            "JWT_DURATION",
+        ]
+        assert_non_nullish = [
+            "SURPLUS_PROCESSORS",
+            "EXECUTOR_PROCESS_WORKERS",
+            "LOCK_TIMEOUT",
+            "STORAGE_REFRESH_SECONDS",
+            "STORAGE_HEADROOM_BYTES",
+            "ASYNC_FINALIZE_BYTES",
+            "KV_MEMORY_MAX_KEYS",
+            "KV_SNAPSHOT_SECONDS",
+        ]
 
         if not all([non_empty(self.get(setting)) for setting in settings]):
             return False
@@ -155,12 +186,20 @@ class ConfigProvider(object):
         surplus = self.get("SURPLUS_PROCESSORS")
         if not re.fullmatch(r"\d+", str(surplus)):
             return False
+        # validate executor pool sizes
+        workers = [
+            self.get("EXECUTOR_PROCESS_WORKERS"),
+            self.get("EXECUTOR_THREAD_WORKERS"),
+        ]
+        if not all([re.fullmatch(r"\d+", str(worker)) for worker in workers]):
+            return False
         # validate path strings
         paths = [
             self.get("REPOSITORY_DIR_PATH"),
             self.get("SESSION_DIR_PATH"),
             self.get("SHARED_LOCK_PATH"),
             self.get("KV_FILE_PATH"),
+            self.get("COMPRESSION_DICTIONARY_DIR_PATH"),
         ]
         if not all(
             [
@@ -169,6 +208,12 @@ class ConfigProvider(object):
             ]
         ):
             return False
+        # optional staging directory (empty to write uploads in place)
+        staging = self.get("STAGING_DIR_PATH")
+        if non_empty(staging) and not re.fullmatch(
+            r"^\.{0,2}(/?[\w\.\- _\~]+)+/?$", str(staging)
+        ):
+            return False
         # validate lock transactions
         lock = self.get("LOCK_TRANSACTIONS")
         if not isinstance(lock, bool):
@@ -183,7 +228,7 @@ class ConfigProvider(object):
         if not re.fullmatch(r"\d+", str(timeout)):
             return False
         # validate kv mode
-        kv_modes = ["sqlite", "redis"]
+        kv_modes = ["sqlite", "redis", "memory"]
         kv_mode = self.get("KV_MODE")
         if str(kv_mode) not in kv_modes:
             return False
@@ -210,15 +255,58 @@ class ConfigProvider(object):
         max_seconds = self.get("KV_MAX_SECONDS")
         if not re.fullmatch(r"\d+", str(max_seconds)):
             return False
+        # validate memory kv settings (0 for no limit, or no periodic snapshot)
+        memory = [
+            self.get("KV_MEMORY_MAX_KEYS"),
+            self.get("KV_SNAPSHOT_SECONDS"),
+        ]
+        if not all([re.fullmatch(r"\d+", str(setting)) for setting in memory]):
+            return False
+        # optional snapshot path (empty for none)
+        snapshot = self.get("KV_SNAPSHOT_PATH")
+        if non_empty(snapshot) and not re.fullmatch(
+            r"^\.{0,2}(/?[\w\.\- _\~]+)+/?$", str(snapshot)
+        ):
+            return False
+        # validate disk space settings
+        storage = [
+            self.get("STORAGE_REFRESH_SECONDS"),
+            self.get("STORAGE_HEADROOM_BYTES"),
+        ]
+        if not all([re.fullmatch(r"\d+", str(setting)) for setting in storage]):
+            return False
+        # validate background finalization threshold (0 for never)
+        if not re.fullmatch(r"\d+", str(self.get("ASYNC_FINALIZE_BYTES"))):
+            return False
         # validate chunk size
         chunk_size = self.get("CHUNK_SIZE")
         if not re.fullmatch(r"\d+", str(chunk_size)):
             return False
+        # validate chunk concurrency
+        chunk_concurrency = self.get("CHUNK_CONCURRENCY")
+        if not re.fullmatch(r"\d+", str(chunk_concurrency)):
+            return False
+        # validate recommended chunk size and concurrency bounds (not below the defaults)
+        chunk_maxima = [
+            (self.get("CHUNK_SIZE_MAX"), chunk_size),
+            (self.get("CHUNK_CONCURRENCY_MAX"), chunk_concurrency),
+        ]
+        for maximum, default in chunk_maxima:
+            if not re.fullmatch(r"\d+", str(maximum)) or int(maximum) < int(default):
+                return False
         # validate compression type
-        compressions = ["gzip", "zip", "bzip2", "lzma"]
+        compressions = CodecProvider.getNames()
         compression = self.get("COMPRESSION_TYPE")
         if str(compression) not in compressions:
             return False
+        # validate adaptive compression
+        adaptive = self.get("ADAPTIVE_COMPRESSION")
+        if not isinstance(adaptive, bool):
+            return False
+        # validate compression dictionary
+        dictionary = self.get("COMPRESSION_DICTIONARY")
+        if not isinstance(dictionary, bool):
+            return False
         # validate hash type
         hash_types = ["MD5", "SHA1", "SHA256"]
         hash_type = self.get("HASH_TYPE")
@@ -20,6 +20,7 @@ class Definitions(object):
     def __init__(self):
         self.contentTypeD = self.getContentTypeD()
         self.fileFormatExtD = self.getFileFormatExtD()
+        self.fileFormatCompressionD = self.getFileFormatCompressionD()
         self.milestoneList = self.getMilestoneList()
         self.repoTypeList = self.getRepoTypeList()
 
@@ -1054,3 +1055,45 @@ class Definitions(object):
         }
 
         return fileFormatExtD
+
+    def getFileFormatCompressionD(self):
+        # chunk compression per content format (keys of file format ext d), other formats are auto
+        # store - already compressed or noise-like, sent as it is
+        # strong - text, compressed at the strong level of the codec
+        # fast - compressed at the fast level of the codec
+        # auto - level chosen from a sample of each chunk
+        # every chunk except store is sampled first, and stored if it does not compress
+        fileFormatCompressionD = {
+            "pdbx": "strong",
+            "pdb": "strong",
+            "cifeps": "strong",
+            "pdbml": "strong",
+            "nmr-star": "strong",
+            "gz": "store",
+            "tgz": "store",
+            "mtz": "store",
+            "html": "strong",
+            "jpg": "store",
+            "png": "store",
+            "svg": "strong",
+            "gif": "store",
+            "ccp4": "store",
+            "mrc2000": "store",
+            "txt": "strong",
+            "xml": "strong",
+            "map": "store",
+            "amber": "strong",
+            "cns": "strong",
+            "cyana": "strong",
+            "xplor": "strong",
+            "xplor-nih": "strong",
+            "pdb-mr": "strong",
+            "mr": "strong",
+            "json": "strong",
+            "fsa": "strong",
+            "fasta": "strong",
+            "sdf": "strong",
+            "mdl": "strong",
+        }
+
+        return fileFormatCompressionD
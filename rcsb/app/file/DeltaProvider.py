@@ -0,0 +1,216 @@
+# file: DeltaProvider.py
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import typing
+import zlib
+from rcsb.app.file.IoUtility import IoUtility
+
+logging.basicConfig(level=logging.INFO)
+
+
+class DeltaProvider(object):
+    """
+    rsync-style delta of a new version of a file against the stored previous version
+    signatures - adler-32 (rolling) and md5 (strong) checksums of each full block of the previous version
+    delta - in file order, literal records (L, length, bytes) and copy records (C, first block, block count)
+    the client rolls the adler-32 checksum one byte at a time only through changed data, matched data advances a block at a time
+    rolling is pure python, so the client gives up (and sends the whole file) after rolling through a bounded number of blocks
+    the server assembles the new version from the previous version and the delta, digesting it as it is written
+    """
+
+    LITERAL = b"L"
+    COPY = b"C"
+    # adler-32 modulus
+    MOD = 65521
+
+    @staticmethod
+    def getBlockSize(fileSize: int) -> int:
+        # about the square root of the file size (as rsync), in whole kilobytes from 2 KB to 1 MB
+        blockSize = int(math.sqrt(fileSize)) // 1024 * 1024
+        return min(max(blockSize, 2048), 1048576)
+
+    @staticmethod
+    def getSignatures(filePath: str, blockSize: typing.Optional[int] = None) -> dict:
+        # static so that the server can run it in the process pool
+        fileSize = os.path.getsize(filePath)
+        if not blockSize:
+            blockSize = DeltaProvider.getBlockSize(fileSize)
+        signatures = []
+        with open(filePath, "rb") as r:
+            while True:
+                block = r.read(blockSize)
+                # a short last block is sent as literal data
+                if len(block) < blockSize:
+                    break
+                signatures.append([zlib.adler32(block), hashlib.md5(block).hexdigest()])
+        return {"blockSize": blockSize, "fileSize": fileSize, "signatures": signatures}
+
+    @staticmethod
+    def makeDelta(
+        sourceFilePath: str,
+        signatureD: dict,
+        deltaFilePath: str,
+        maxLiteralRatio: float = 0.5,
+        maxRolledBlocks: int = 64,
+    ) -> typing.Optional[int]:
+        """
+
+        Args:
+            sourceFilePath: new version of the file (client side)
+            signatureD: block size and signatures of the previous version (from the server)
+            deltaFilePath: delta written to this file
+            maxLiteralRatio: give up when literal data exceeds this fraction of the file
+            maxRolledBlocks: give up when the checksum has been rolled through more than this many blocks of unmatched data
+
+        Returns:
+            size of the delta, or None if the files differ too much for a delta to pay
+
+        """
+        blockSize = int(signatureD["blockSize"])
+        # weak checksum to strong checksum to (first) block index
+        blocks = {}
+        for blockIndex, (weak, strong) in enumerate(signatureD["signatures"]):
+            blocks.setdefault(weak, {}).setdefault(strong, blockIndex)
+        fileSize = os.path.getsize(sourceFilePath)
+        maxLiteral = fileSize * maxLiteralRatio
+        # bytes the checksum may still be rolled through, bounds the work whatever the file size
+        maxRolled = maxRolledBlocks * blockSize
+        with open(sourceFilePath, "rb") as r, open(deltaFilePath, "wb") as w:
+            writer = DeltaWriter(w)
+            if fileSize == 0:
+                return 0
+            data = mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                position = 0
+                # start of literal data not yet written
+                literalStart = 0
+                weak = None
+                a = b = 0
+                rolled = 0
+                while position + blockSize <= fileSize:
+                    if weak is None:
+                        weak = zlib.adler32(data[position: position + blockSize])
+                        a = weak & 0xFFFF
+                        b = weak >> 16
+                    candidates = blocks.get(weak)
+                    if candidates:
+                        strong = hashlib.md5(data[position: position + blockSize]).hexdigest()
+                        blockIndex = candidates.get(strong)
+                        if blockIndex is not None:
+                            writer.literal(data, literalStart, position)
+                            writer.copy(blockIndex)
+                            position += blockSize
+                            literalStart = position
+                            weak = None
+                            continue
+                    if position + blockSize == fileSize:
+                        break
+                    if writer.literalBytes + position - literalStart > maxLiteral or rolled > maxRolled:
+                        return None
+                    rolled += 1
+                    # roll the window one byte
+                    out = data[position]
+                    a = (a - out + data[position + blockSize]) % DeltaProvider.MOD
+                    b = (b - blockSize * out + a - 1) % DeltaProvider.MOD
+                    weak = (b << 16) | a
+                    position += 1
+                writer.literal(data, literalStart, fileSize)
+                writer.flush()
+            finally:
+                data.close()
+            if writer.literalBytes > maxLiteral:
+                return None
+            return w.tell()
+
+    @staticmethod
+    def applyDelta(
+        basePath: str,
+        deltaPath: str,
+        outPath: str,
+        blockSize: int,
+        hashType: typing.Optional[str] = None,
+        copySize: int = 1048576,
+    ) -> typing.Tuple[int, typing.Optional[str]]:
+        """
+
+        Args:
+            basePath: previous version of the file (server side)
+            deltaPath: delta received from the client
+            outPath: new version is written to this file
+            blockSize: block size of the signatures the delta was made with
+            hashType: digest the new version as written (MD5, SHA1, or SHA256)
+            copySize: bound on the bytes held in memory at one time
+
+        Returns:
+            bytes written, digest of the new version (None without hash type)
+
+        """
+        hashObj = IoUtility.getHashObject(hashType) if hashType else None
+        written = 0
+
+        def copy(read, length):
+            nonlocal written
+            while length > 0:
+                block = read(min(copySize, length))
+                if not block:
+                    raise ValueError("error - delta refers beyond the end of a file")
+                w.write(block)
+                if hashObj:
+                    hashObj.update(block)
+                written += len(block)
+                length -= len(block)
+
+        with open(basePath, "rb") as base, open(deltaPath, "rb") as delta, open(outPath, "wb") as w:
+            while recordType := delta.read(1):
+                if recordType == DeltaProvider.LITERAL:
+                    (length,) = struct.unpack(">Q", delta.read(8))
+                    copy(delta.read, length)
+                elif recordType == DeltaProvider.COPY:
+                    first, count = struct.unpack(">QQ", delta.read(16))
+                    base.seek(first * blockSize)
+                    copy(base.read, count * blockSize)
+                else:
+                    raise ValueError("error - unknown delta record")
+        return written, hashObj.hexdigest() if hashObj else None
+
+
+class DeltaWriter(object):
+    """
+    writes delta records, consecutive copied blocks become one copy record
+    """
+
+    def __init__(self, w: typing.IO, blockSize: int = 1048576):
+        self.w = w
+        self.blockSize = blockSize
+        self.literalBytes = 0
+        self.__first = None
+        self.__count = 0
+
+    def copy(self, blockIndex: int):
+        if self.__first is not None and blockIndex == self.__first + self.__count:
+            self.__count += 1
+            return
+        self.flush()
+        self.__first = blockIndex
+        self.__count = 1
+
+    def literal(self, data, start: int, end: int):
+        if end <= start:
+            return
+        self.flush()
+        self.w.write(DeltaProvider.LITERAL + struct.pack(">Q", end - start))
+        for position in range(start, end, self.blockSize):
+            self.w.write(data[position: min(position + self.blockSize, end)])
+        self.literalBytes += end - start
+
+    def flush(self):
+        # write pending copy record
+        if self.__first is not None:
+            self.w.write(DeltaProvider.COPY + struct.pack(">QQ", self.__first, self.__count))
+            self.__first = None
+            self.__count = 0
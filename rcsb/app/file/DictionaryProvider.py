@@ -0,0 +1,170 @@
+# file: DictionaryProvider.py
+
+import collections
+import glob
+import logging
+import os
+import re
+import sys
+import tempfile
+import typing
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.CodecProvider import CodecProvider
+from rcsb.app.file.Definitions import Definitions
+
+logging.basicConfig(level=logging.INFO)
+
+
+class DictionaryProvider(object):
+    """
+    preset dictionaries for zlib compression of chunks, built from sample files in the repository
+    each chunk otherwise restarts compression with an empty history, so small chunks compress poorly
+    dictionary id - content format and version (example pdbx-v2), a rebuilt dictionary takes the next version
+    dictionaries are never changed once written, so a client may keep one by its id
+    files - <dictionary id>.zdict in COMPRESSION_DICTIONARY_DIR_PATH
+    """
+
+    # content formats with dictionaries (mmCIF/PDBx and PDBML)
+    FORMATS = ["pdbx", "pdbml"]
+
+    def __init__(self, cP: typing.Type[ConfigProvider] = None):
+        self.cP = cP if cP else ConfigProvider()
+        self.dirPath = self.cP.get("COMPRESSION_DICTIONARY_DIR_PATH")
+
+    def validateDictionaryId(self, dictionaryId: str) -> bool:
+        return bool(re.fullmatch(r"[\w\-]+-v\d+", str(dictionaryId)))
+
+    def getDictionaryId(self, contentFormat: str) -> typing.Optional[str]:
+        # latest version for the content format
+        versions = self.__getVersions(contentFormat)
+        return "%s-v%d" % (contentFormat, max(versions)) if versions else None
+
+    def getDictionary(self, dictionaryId: str) -> typing.Optional[bytes]:
+        if not self.loadDictionary(dictionaryId):
+            return None
+        return CodecProvider.getDictionary(dictionaryId)
+
+    def loadDictionary(self, dictionaryId: str) -> bool:
+        # make the dictionary available to the codecs of this process
+        if CodecProvider.getDictionary(dictionaryId):
+            return True
+        if not self.validateDictionaryId(dictionaryId):
+            return False
+        filePath = os.path.join(self.dirPath, dictionaryId + ".zdict")
+        if not os.path.exists(filePath):
+            return False
+        with open(filePath, "rb") as r:
+            CodecProvider.addDictionary(dictionaryId, r.read())
+        return True
+
+    def buildDictionary(
+        self,
+        contentFormat: str,
+        samplePaths: typing.Optional[typing.List[str]] = None,
+        size: int = 32768,
+        maxSamples: int = 16,
+        sampleBytes: int = 1048576,
+    ) -> typing.Optional[str]:
+        """
+
+        Args:
+            contentFormat: content format of the samples (pdbx or pdbml)
+            samplePaths: sample files (default - recent files of the content format in the repository)
+            size: dictionary bytes (zlib looks back no further than 32 KiB)
+            maxSamples: files sampled from the repository
+            sampleBytes: bytes read from the start of each sample
+
+        Returns:
+            id of the new dictionary version, None without samples
+
+        """
+        if samplePaths is None:
+            samplePaths = self.findSamples(contentFormat, maxSamples)
+        samples = []
+        for samplePath in samplePaths:
+            with open(samplePath, "rb") as r:
+                samples.append(r.read(sampleBytes))
+        zdict = self.makeDictionary(samples, size)
+        if not zdict:
+            logging.warning("no samples for %s dictionary", contentFormat)
+            return None
+        os.makedirs(self.dirPath, exist_ok=True)
+        while True:
+            versions = self.__getVersions(contentFormat)
+            dictionaryId = "%s-v%d" % (contentFormat, max(versions) + 1 if versions else 1)
+            filePath = os.path.join(self.dirPath, dictionaryId + ".zdict")
+            fd, tempPath = tempfile.mkstemp(prefix="._", dir=self.dirPath)
+            with os.fdopen(fd, "wb") as w:
+                w.write(zdict)
+            try:
+                # a concurrent build of the same version takes the next one
+                os.link(tempPath, filePath)
+            except FileExistsError:
+                continue
+            finally:
+                os.unlink(tempPath)
+            logging.info("built dictionary %s from %d samples", dictionaryId, len(samples))
+            return dictionaryId
+
+    def findSamples(self, contentFormat: str, maxSamples: int = 16) -> typing.List[str]:
+        # most recent repository files of the content format (any repository type, deposition, and version)
+        extension = Definitions().fileFormatExtD.get(contentFormat)
+        if not extension:
+            return []
+        repositoryPath = self.cP.get("REPOSITORY_DIR_PATH")
+        filePaths = glob.glob(
+            os.path.join(repositoryPath, "*", "*", "*.%s.V*" % extension)
+        )
+        filePaths.sort(key=os.path.getmtime, reverse=True)
+        return filePaths[:maxSamples]
+
+    @staticmethod
+    def makeDictionary(samples: typing.List[bytes], size: int = 32768) -> bytes:
+        # lines and words repeated across the samples, most valuable last (nearest to the data compressed)
+        lines = collections.Counter()
+        words = collections.Counter()
+        for sample in samples:
+            sampleLines = set()
+            for line in sample.splitlines():
+                line = line.strip()
+                if 3 < len(line) <= 160:
+                    sampleLines.add(line)
+                words.update(word for word in line.split() if len(word) > 3)
+            # a line counts once per sample, so data rows of one file do not crowd out names common to all files
+            lines.update(sampleLines)
+        minCount = 2 if len(samples) > 1 else 1
+        candidates = [
+            (count * len(line), line + b"\n")
+            for line, count in lines.items()
+            if count >= minCount
+        ]
+        candidates += [
+            ((count - 1) * len(word), word + b" ")
+            for word, count in words.items()
+            if count >= 2
+        ]
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        chosen = []
+        total = 0
+        for score, piece in candidates:
+            if score <= 0 or total + len(piece) > size:
+                continue
+            chosen.append(piece)
+            total += len(piece)
+        return b"".join(reversed(chosen))
+
+    def __getVersions(self, contentFormat: str) -> typing.List[int]:
+        versions = []
+        for filePath in glob.glob(os.path.join(self.dirPath, "%s-v*.zdict" % contentFormat)):
+            match = re.fullmatch(
+                r"%s-v(\d+)\.zdict" % re.escape(contentFormat), os.path.basename(filePath)
+            )
+            if match:
+                versions.append(int(match.group(1)))
+        return versions
+
+
+if __name__ == "__main__":
+    # build a new dictionary version for each content format given (default pdbx and pdbml)
+    for fmt in sys.argv[1:] if len(sys.argv) > 1 else DictionaryProvider.FORMATS:
+        print(DictionaryProvider().buildDictionary(fmt))
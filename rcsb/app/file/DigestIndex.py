@@ -0,0 +1,129 @@
+# file: DigestIndex.py
+
+import fcntl
+import logging
+import os
+import typing
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.Executors import Executors
+from rcsb.app.file.IoUtility import IoUtility
+from rcsb.app.file.KvMemory import KvMemory
+from rcsb.app.file.KvRedis import KvRedis
+from rcsb.app.file.KvSqlite import KvSqlite
+
+logging.basicConfig(level=logging.INFO)
+
+# ioctl of linux file systems with copy on write extents (xfs, btrfs)
+FICLONE = 0x40049409
+
+
+class DigestIndex(object):
+    """
+    finds stored files by content digest, so that an identical upload is linked rather than sent
+    index - kv map table, key digest~<repository type>/<dep id>~<hash type>~<digest>, val <relative path>~<size>~<mtime ns>
+    an entry is scoped to one deposition directory, content is never linked across depositions
+    an entry is trusted only while the file keeps its size and modification time (saves replace files, so a new save invalidates it)
+    without a valid entry, files of the same size in the deposition directory are hashed
+    """
+
+    def __init__(self, cP: typing.Type[ConfigProvider] = None):
+        self.cP = cP if cP else ConfigProvider()
+        self.repositoryDir = self.cP.get("REPOSITORY_DIR_PATH")
+        if self.cP.get("KV_MODE") == "redis":
+            self.kV = KvRedis(self.cP)
+        elif self.cP.get("KV_MODE") == "memory":
+            self.kV = KvMemory(self.cP)
+        else:
+            self.kV = KvSqlite(self.cP)
+
+    def getIndexKey(self, dirPath: str, hashType: str, hashDigest: str) -> str:
+        # dir path - absolute path of the deposition directory
+        return "digest~%s~%s~%s" % (
+            os.path.relpath(dirPath, self.repositoryDir),
+            hashType,
+            hashDigest,
+        )
+
+    async def record(self, filePath: str, hashType: str, hashDigest: str):
+        # file path - absolute path of a saved file whose content has the digest
+        if not hashType or not hashDigest:
+            return
+        try:
+            stat = await Executors.runIo(os.stat, filePath)
+            key = self.getIndexKey(os.path.dirname(filePath), hashType, hashDigest)
+            val = "%s~%d~%d" % (
+                os.path.relpath(filePath, self.repositoryDir),
+                stat.st_size,
+                stat.st_mtime_ns,
+            )
+            await Executors.runIo(self.kV.setMap, key, val)
+        except Exception as exc:
+            # the index only saves uploads, a save does not fail for it
+            logging.warning("could not index digest of %s %r", filePath, exc)
+
+    async def find(
+        self,
+        dirPath: str,
+        hashType: str,
+        hashDigest: str,
+        fileSize: typing.Optional[int] = None,
+    ) -> typing.Optional[str]:
+        # absolute path of a file in the deposition directory with the digest, or None
+        key = self.getIndexKey(dirPath, hashType, hashDigest)
+        val = await Executors.runIo(self.kV.getMap, key)
+        if val:
+            try:
+                relPath, size, mtime = str(val).rsplit("~", 2)
+                filePath = os.path.join(self.repositoryDir, relPath)
+                stat = await Executors.runIo(os.stat, filePath)
+                if (
+                    stat.st_size == int(size)
+                    and stat.st_mtime_ns == int(mtime)
+                    and (not fileSize or stat.st_size == fileSize)
+                ):
+                    return filePath
+            except (OSError, ValueError):
+                pass
+            # file was replaced or removed since it was indexed
+            await Executors.runIo(self.kV.clearMapKey, key)
+        # only files of the same size are hashed, so a file size is required
+        if not fileSize:
+            return None
+        for filePath in await Executors.runIo(self.getCandidates, dirPath, fileSize):
+            digest = await Executors.runCpu(IoUtility.getHashDigest, filePath, hashType)
+            if digest == hashDigest:
+                await self.record(filePath, hashType, hashDigest)
+                return filePath
+        return None
+
+    def getCandidates(self, dirPath: str, fileSize: int) -> typing.List[str]:
+        # stored files of the deposition directory with the file size (not temp files)
+        candidates = []
+        if not os.path.isdir(dirPath):
+            return candidates
+        with os.scandir(dirPath) as entries:
+            for entry in entries:
+                if entry.name.startswith("._") or not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.stat(follow_symlinks=False).st_size == fileSize:
+                    candidates.append(entry.path)
+        return candidates
+
+    def linkFile(self, sourcePath: str, targetPath: str) -> bool:
+        # reflink (copy on write) where the file system supports it, else hardlink
+        # saves replace rather than rewrite files, so a hardlinked version is not changed by a later save
+        try:
+            with open(sourcePath, "rb") as r, open(targetPath, "xb") as w:
+                fcntl.ioctl(w.fileno(), FICLONE, r.fileno())
+            return True
+        except FileExistsError:
+            return False
+        except OSError:
+            if os.path.exists(targetPath):
+                os.unlink(targetPath)
+        try:
+            os.link(sourcePath, targetPath)
+            return True
+        except OSError as exc:
+            logging.info("could not link %s %r", sourcePath, exc)
+            return False
@@ -25,6 +25,7 @@ from rcsb.app.file.PathProvider import PathProvider
 from rcsb.app.file.Definitions import Definitions
 from rcsb.app.file.IoUtility import IoUtility
 from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.Executors import Executors
 
 provider = ConfigProvider()
 locktype = provider.get("LOCK_TYPE")
@@ -107,7 +108,9 @@ class DownloadUtility(object):
             try:
                 async with Locking(filePath, "r"):
                     if hashType:
-                        hashDigest = IoUtility().getHashDigest(filePath, hashType.name)
+                        hashDigest = await Executors.runCpu(
+                            IoUtility.getHashDigest, filePath, hashType.name
+                        )
                         tD = {
                             "rcsb_hash_type": hashType.name,
                             "rcsb_hexdigest": hashDigest,
@@ -0,0 +1,186 @@
+# file: Executors.py
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from rcsb.app.file.ConfigProvider import ConfigProvider
+
+logging.basicConfig(level=logging.INFO)
+
+
+# runs in the worker (thread or process), returns time the task left the queue with the result
+def _timedCall(func, args, kwargs):
+    started = time.time()
+    return started, func(*args, **kwargs)
+
+
+class Executors(object):
+    """
+    keeps blocking work off the event loop
+    process pool - compression and hashing (cpu bound, arguments and results must be picklable)
+    thread pool - filesystem and kv calls (blocking io)
+    pools are created once per server process, on startup or on first use
+    sizes from config.yml (EXECUTOR_PROCESS_WORKERS, EXECUTOR_THREAD_WORKERS)
+    with zero process workers, cpu bound work runs in the thread pool
+    """
+
+    __lock = threading.Lock()
+    __processPool = None
+    __threadPool = None
+    __processWorkers = None
+    __threadWorkers = None
+    __metrics = {}
+
+    @staticmethod
+    def startup(cP=None):
+        cP = cP if cP else ConfigProvider()
+        with Executors.__lock:
+            if Executors.__threadPool is None:
+                threadWorkers = cP.get("EXECUTOR_THREAD_WORKERS")
+                Executors.__threadWorkers = int(threadWorkers) if threadWorkers else 16
+                Executors.__threadPool = ThreadPoolExecutor(
+                    max_workers=Executors.__threadWorkers,
+                    thread_name_prefix="rcsb-io",
+                )
+            if Executors.__processPool is None and Executors.__processWorkers is None:
+                processWorkers = cP.get("EXECUTOR_PROCESS_WORKERS")
+                Executors.__processWorkers = (
+                    int(processWorkers) if processWorkers is not None else 2
+                )
+                if Executors.__processWorkers > 0:
+                    # do not fork a server process that is running threads
+                    method = (
+                        "forkserver"
+                        if "forkserver" in multiprocessing.get_all_start_methods()
+                        else "spawn"
+                    )
+                    Executors.__processPool = ProcessPoolExecutor(
+                        max_workers=Executors.__processWorkers,
+                        mp_context=multiprocessing.get_context(method),
+                    )
+            for pool in ["cpu", "io"]:
+                if pool not in Executors.__metrics:
+                    Executors.__metrics[pool] = Executors.__newMetrics()
+
+    @staticmethod
+    def shutdown():
+        with Executors.__lock:
+            if Executors.__processPool is not None:
+                Executors.__processPool.shutdown(wait=True)
+            if Executors.__threadPool is not None:
+                Executors.__threadPool.shutdown(wait=True)
+            Executors.__processPool = None
+            Executors.__threadPool = None
+            Executors.__processWorkers = None
+            Executors.__threadWorkers = None
+
+    @staticmethod
+    async def runCpu(func: typing.Callable, *args, **kwargs):
+        # compression and hashing - func must be a module level function or static method
+        # also recreates a process pool that was dropped when it broke
+        if Executors.__threadPool is None or (
+            Executors.__processPool is None and Executors.__processWorkers is None
+        ):
+            Executors.startup()
+        pool = Executors.__processPool
+        if pool is None:
+            return await Executors.__run("cpu", Executors.__threadPool, func, args, kwargs)
+        try:
+            return await Executors.__run("cpu", pool, func, args, kwargs)
+        except BrokenProcessPool:
+            # a worker died (for example killed for memory), replace the pool for later tasks
+            logging.warning("process pool broken, restarting")
+            with Executors.__lock:
+                if Executors.__processPool is pool:
+                    Executors.__processPool = None
+                    Executors.__processWorkers = None
+            pool.shutdown(wait=False)
+            raise
+
+    @staticmethod
+    async def runIo(func: typing.Callable, *args, **kwargs):
+        # blocking filesystem and kv calls
+        if Executors.__threadPool is None:
+            Executors.startup()
+        return await Executors.__run("io", Executors.__threadPool, func, args, kwargs)
+
+    @staticmethod
+    def getMetrics() -> dict:
+        # per pool - workers, tasks waiting or running, totals, and queue wait and latency in seconds
+        with Executors.__lock:
+            workers = {
+                "cpu": Executors.__processWorkers or Executors.__threadWorkers,
+                "io": Executors.__threadWorkers,
+            }
+            metrics = {}
+            for pool, mD in Executors.__metrics.items():
+                finished = mD["completed"] + mD["failed"]
+                metrics[pool] = {
+                    "workers": workers[pool],
+                    "pending": mD["pending"],
+                    "max pending": mD["maxPending"],
+                    "submitted": mD["submitted"],
+                    "completed": mD["completed"],
+                    "failed": mD["failed"],
+                    "mean queue seconds": mD["queueSeconds"] / mD["completed"]
+                    if mD["completed"]
+                    else 0,
+                    "max queue seconds": mD["maxQueueSeconds"],
+                    "mean latency seconds": mD["latencySeconds"] / finished
+                    if finished
+                    else 0,
+                    "max latency seconds": mD["maxLatencySeconds"],
+                }
+            return metrics
+
+    @staticmethod
+    def __newMetrics() -> dict:
+        return {
+            "pending": 0,
+            "maxPending": 0,
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "queueSeconds": 0.0,
+            "maxQueueSeconds": 0.0,
+            "latencySeconds": 0.0,
+            "maxLatencySeconds": 0.0,
+        }
+
+    @staticmethod
+    async def __run(name, pool, func, args, kwargs):
+        mD = Executors.__metrics[name]
+        submitted = time.time()
+        with Executors.__lock:
+            mD["submitted"] += 1
+            mD["pending"] += 1
+            mD["maxPending"] = max(mD["maxPending"], mD["pending"])
+        loop = asyncio.get_running_loop()
+        try:
+            started, result = await loop.run_in_executor(
+                pool, functools.partial(_timedCall, func, args, kwargs)
+            )
+        except BaseException:
+            latency = time.time() - submitted
+            with Executors.__lock:
+                mD["pending"] -= 1
+                mD["failed"] += 1
+                mD["latencySeconds"] += latency
+                mD["maxLatencySeconds"] = max(mD["maxLatencySeconds"], latency)
+            raise
+        latency = time.time() - submitted
+        queued = max(started - submitted, 0.0)
+        with Executors.__lock:
+            mD["pending"] -= 1
+            mD["completed"] += 1
+            mD["queueSeconds"] += queued
+            mD["maxQueueSeconds"] = max(mD["maxQueueSeconds"], queued)
+            mD["latencySeconds"] += latency
+            mD["maxLatencySeconds"] = max(mD["maxLatencySeconds"], latency)
+        return result
@@ -0,0 +1,144 @@
+# file: FinalizeProvider.py
+
+import asyncio
+import json
+import logging
+import time
+import typing
+from fastapi import HTTPException
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.Executors import Executors
+from rcsb.app.file.KvMemory import KvMemory
+from rcsb.app.file.KvRedis import KvRedis
+from rcsb.app.file.KvSqlite import KvSqlite
+
+logging.basicConfig(level=logging.INFO)
+
+
+class FinalizeProvider(object):
+    """
+    finalization (hash comparison, decompression, save) of uploads of at least ASYNC_FINALIZE_BYTES as a background job
+    the job runs in the server process that received the last chunk, which responds 202 with the job id (the upload id)
+    the client polls '/uploadStatus/<job id>' (long poll) until the job ends, so no request outlasts the server timeout
+    job status - kv session table key FINALIZE, a json status per job id, so that every server process sees it
+      status - running, done, or failed, phase - verifying, decompressing, or saving, and the result or the error of the finalization
+    a status expires after KV_MAX_SECONDS, expired statuses are removed by session cleanup
+    """
+
+    # session table key of the job statuses
+    FINALIZE = "finalize"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    POLL_SECONDS = 0.5
+    # longest long poll, well within the server timeout
+    MAX_WAIT_SECONDS = 60
+    # references to running jobs, so that they are not collected
+    __tasks = set()
+
+    def __init__(self, cP: typing.Type[ConfigProvider] = None):
+        self.cP = cP if cP else ConfigProvider()
+        if self.cP.get("KV_MODE") == "redis":
+            self.kV = KvRedis(self.cP)
+        elif self.cP.get("KV_MODE") == "memory":
+            self.kV = KvMemory(self.cP)
+        else:
+            self.kV = KvSqlite(self.cP)
+
+    def isBackground(self, fileSize: typing.Optional[int]) -> bool:
+        # 0 - every upload is finalized in its last request
+        minBytes = int(self.cP.get("ASYNC_FINALIZE_BYTES") or 0)
+        return bool(minBytes > 0 and fileSize and int(fileSize) >= minBytes)
+
+    async def start(self, jobId: str, finalize: typing.Awaitable[dict]) -> dict:
+        # returns the running status, to be sent with 202
+        status = await self.setStatus(jobId, FinalizeProvider.RUNNING, "verifying")
+        task = asyncio.ensure_future(self.__run(jobId, finalize))
+        FinalizeProvider.__tasks.add(task)
+        task.add_done_callback(FinalizeProvider.__tasks.discard)
+        logging.info("finalizing %s in the background", jobId)
+        return status
+
+    async def __run(self, jobId: str, finalize: typing.Awaitable[dict]):
+        try:
+            result = await finalize
+            await self.setStatus(jobId, FinalizeProvider.DONE, result=result)
+        except HTTPException as exc:
+            logging.warning("finalization of %s failed %d %s", jobId, exc.status_code, exc.detail)
+            await self.setStatus(
+                jobId, FinalizeProvider.FAILED, statusCode=exc.status_code, detail=exc.detail
+            )
+        except Exception as exc:
+            logging.exception("finalization of %s failed", jobId)
+            await self.setStatus(
+                jobId, FinalizeProvider.FAILED, statusCode=400, detail="error in finalization %r" % exc
+            )
+
+    async def setPhase(self, jobId: typing.Optional[str], phase: str):
+        # no job id - finalized in its last request
+        if jobId:
+            await self.setStatus(jobId, FinalizeProvider.RUNNING, phase)
+
+    async def setStatus(
+        self,
+        jobId: str,
+        status: str,
+        phase: typing.Optional[str] = None,
+        statusCode: typing.Optional[int] = None,
+        detail: typing.Optional[str] = None,
+        result: typing.Optional[dict] = None,
+    ) -> dict:
+        maxSeconds = self.cP.get("KV_MAX_SECONDS") or 14400
+        statusD = {
+            "jobId": jobId,
+            "status": status,
+            "phase": phase,
+            "statusCode": statusCode if statusCode else (200 if status == FinalizeProvider.DONE else 202),
+            "detail": detail,
+            "result": result,
+            "expires": time.time() + float(maxSeconds),
+        }
+        try:
+            await Executors.runIo(
+                self.kV.setSession, FinalizeProvider.FINALIZE, jobId, json.dumps(statusD)
+            )
+        except Exception as exc:
+            # the job goes on, its status is found again on the next update
+            logging.warning("could not record finalization status of %s %r", jobId, exc)
+        return statusD
+
+    async def getStatuses(self) -> dict:
+        statuses = await Executors.runIo(
+            self.kV.getKey, FinalizeProvider.FINALIZE, self.kV.sessionTable
+        )
+        if not statuses:
+            return {}
+        if not isinstance(statuses, dict):
+            statuses = self.kV.deconvert(statuses)
+        return {jobId: json.loads(val) for jobId, val in statuses.items() if val and val != "0"}
+
+    async def getStatus(self, jobId: str) -> typing.Optional[dict]:
+        # unexpired status of the job, None if there is no such job
+        statusD = (await self.getStatuses()).get(jobId)
+        if not statusD or statusD["expires"] <= time.time():
+            return None
+        return statusD
+
+    async def waitStatus(self, jobId: str, seconds: float = 0) -> typing.Optional[dict]:
+        # long poll - returns once the job ends, or after seconds
+        deadline = time.time() + min(max(seconds, 0), FinalizeProvider.MAX_WAIT_SECONDS)
+        while True:
+            statusD = await self.getStatus(jobId)
+            if not statusD or statusD["status"] != FinalizeProvider.RUNNING or time.time() >= deadline:
+                return statusD
+            await asyncio.sleep(FinalizeProvider.POLL_SECONDS)
+
+    async def cleanup(self) -> int:
+        # remove expired statuses, returns the number removed
+        removed = 0
+        now = time.time()
+        for jobId, statusD in (await self.getStatuses()).items():
+            if statusD["expires"] <= now:
+                await Executors.runIo(self.kV.clearSessionVal, FinalizeProvider.FINALIZE, jobId)
+                removed += 1
+        return removed
@@ -25,6 +25,7 @@ from fastapi import HTTPException
 from rcsb.utils.io.FileUtil import FileUtil
 from rcsb.app.file.PathProvider import PathProvider
 from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.Executors import Executors
 
 
 provider = ConfigProvider()
@@ -54,18 +55,31 @@ class IoUtility(object):
         tHash = self.getHashDigest(pth, hashType)
         return tHash == hashDigest
 
+    # as check hash, but hashes in the process pool rather than on the event loop
+    async def checkHashAsync(self, pth: str, hashDigest: str, hashType: str) -> bool:
+        tHash = await Executors.runCpu(IoUtility.getHashDigest, pth, hashType)
+        return tHash == hashDigest
+
+    @staticmethod
+    def getHashObject(hashType: str = "MD5"):
+        # incremental hash object for hash type, or None for unknown hash type
+        if hashType == "SHA1":
+            return hashlib.sha1()
+        elif hashType == "SHA256":
+            return hashlib.sha256()
+        elif hashType == "MD5":
+            return hashlib.md5()
+        return None
+
+    @staticmethod
     def getHashDigest(
-        self, filePath: str, hashType: str = "MD5", blockSize: int = 65536
+        filePath: str, hashType: str = "MD5", blockSize: int = 65536
     ) -> typing.Optional[str]:
+        # static so that the server can run it in the process pool
         if hashType not in ["MD5", "SHA1", "SHA256"]:
             return None
         try:
-            if hashType == "SHA1":
-                hashObj = hashlib.sha1()
-            elif hashType == "SHA256":
-                hashObj = hashlib.sha256()
-            elif hashType == "MD5":
-                hashObj = hashlib.md5()
+            hashObj = IoUtility.getHashObject(hashType)
             # hash file
             if os.path.exists(filePath):
                 with open(filePath, "rb") as r:
@@ -129,11 +143,11 @@ class IoUtility(object):
                 detail="error - file already exists %s" % filePathTarget,
             )
         if not os.path.exists(os.path.dirname(filePathTarget)):
-            os.makedirs(os.path.dirname(filePathTarget))
+            await Executors.runIo(os.makedirs, os.path.dirname(filePathTarget))
         logging.info("copying %s to %s", filePathSource, filePathTarget)
         try:
             async with Locking(filePathSource, "r"):
-                shutil.copy(filePathSource, filePathTarget)
+                await Executors.runIo(shutil.copy, filePathSource, filePathTarget)
         except (FileExistsError, OSError) as err:
             raise HTTPException(status_code=400, detail="error %r" % err)
 
@@ -164,11 +178,11 @@ class IoUtility(object):
                     detail="error - directory already exists %s" % target_path,
                 )
             else:
-                shutil.rmtree(target_path)
+                await Executors.runIo(shutil.rmtree, target_path)
         logger.info("copying %s to %s", source_path, target_path)
         try:
             async with Locking(source_path, "r", is_dir=True):
-                shutil.copytree(source_path, target_path)
+                await Executors.runIo(shutil.copytree, source_path, target_path)
         except (FileExistsError, OSError) as err:
             raise HTTPException(status_code=400, detail="error %r" % err)
 
@@ -276,11 +290,11 @@ class IoUtility(object):
                 logger.info("removing %s", filePathTarget)
                 os.unlink(filePathTarget)
         if not os.path.exists(os.path.dirname(filePathTarget)):
-            os.makedirs(os.path.dirname(filePathTarget))
+            await Executors.runIo(os.makedirs, os.path.dirname(filePathTarget))
         logger.info("moving %s to %s", filePathSource, filePathTarget)
         try:
             async with Locking(filePathSource, "w"):
-                shutil.move(filePathSource, filePathTarget)
+                await Executors.runIo(shutil.move, filePathSource, filePathTarget)
         except (FileExistsError, OSError) as err:
             raise HTTPException(status_code=400, detail="error %r" % err)
 
@@ -303,8 +317,8 @@ class IoUtility(object):
             )
         try:
             async with Locking(dirPath, "w", is_dir=True):
-                if FileUtil().bundleTarfile(compressPath, [os.path.abspath(dirPath)]):
-                    shutil.rmtree(dirPath)
+                if await Executors.runCpu(IoUtility.bundleDir, compressPath, dirPath):
+                    await Executors.runIo(shutil.rmtree, dirPath)
                     if os.path.exists(dirPath):
                         logger.error(
                             "unable to remove dirPath %s after compression", dirPath
@@ -329,8 +343,8 @@ class IoUtility(object):
             )
         try:
             async with Locking(dirPath, "w", is_dir=True):
-                if FileUtil().bundleTarfile(compressPath, [os.path.abspath(dirPath)]):
-                    shutil.rmtree(dirPath)
+                if await Executors.runCpu(IoUtility.bundleDir, compressPath, dirPath):
+                    await Executors.runIo(shutil.rmtree, dirPath)
                     if os.path.exists(dirPath):
                         logger.error(
                             "unable to remove dirPath %s after compression", dirPath
@@ -360,8 +374,8 @@ class IoUtility(object):
             )
         try:
             async with Locking(decompressPath, "w"):
-                if FileUtil().unbundleTarfile(
-                    decompressPath, os.path.abspath(os.path.dirname(dirPath))
+                if await Executors.runCpu(
+                    IoUtility.unbundleDir, decompressPath, dirPath
                 ):
                     os.unlink(decompressPath)
                     if os.path.exists(decompressPath):
@@ -374,3 +388,15 @@ class IoUtility(object):
                     )
         except (FileExistsError, OSError) as err:
             raise HTTPException(status_code=400, detail="error %r" % err)
+
+    @staticmethod
+    def bundleDir(compressPath: str, dirPath: str) -> bool:
+        # tar.gz of dir path (run in the process pool)
+        return FileUtil().bundleTarfile(compressPath, [os.path.abspath(dirPath)])
+
+    @staticmethod
+    def unbundleDir(decompressPath: str, dirPath: str) -> bool:
+        # extract tar.gz beside dir path (run in the process pool)
+        return FileUtil().unbundleTarfile(
+            decompressPath, os.path.abspath(os.path.dirname(dirPath))
+        )
@@ -45,8 +45,51 @@ class KvBase:
     def setSession(self, key1, key2, val):
         raise NotImplementedError("kv base set session not implemented")
 
+    def setSessionBit(self, key1, key2, index):
+        # atomically set one bit of a bitmap session val, return (bit was newly set, bits set)
+        raise NotImplementedError("kv base set session bit not implemented")
+
+    def clearSessionBit(self, key1, key2, index):
+        # atomically clear one bit of a bitmap session val, return (bit was set, bits set)
+        raise NotImplementedError("kv base clear session bit not implemented")
+
+    def setSessionIf(self, key1, key2, expected, val):
+        # atomically set session val only if current val (empty string if none) equals expected, return whether set
+        raise NotImplementedError("kv base set session if not implemented")
+
+    def reserveSession(self, key1, key2, amount, capacity, expires):
+        # atomically set val of key2 to "amount~expires" if amount plus the unexpired amounts of the other vals fits in capacity
+        # expired vals are removed, return whether set
+        raise NotImplementedError("kv base reserve session not implemented")
+
     def clearSessionKey(self, key):
         raise NotImplementedError("kv base clear session key not implemented")
 
     def clearSessionVal(self, key1, key2):
         raise NotImplementedError("kv base clear session val not implemented")
+
+    # compound session functions, overridden where the store can batch them into one round trip
+
+    def setSessionAndMap(self, key1, key2, val, mapKey):
+        # set session val of key2 and map mapKey to the session key1
+        self.setSession(key1, key2, val)
+        self.setMap(mapKey, key1)
+        return True
+
+    def clearSession(self, key, mapKey=None, refs=()):
+        # clear session key and its map entry (by map key if known, else by val)
+        # refs - session keys with a val for this session (key2 = key), cleared too
+        # return whether the session key was cleared
+        result = self.clearSessionKey(key)
+        if mapKey is not None:
+            self.clearMapKey(mapKey)
+        else:
+            self.clearMapVal(key)
+        for ref in refs:
+            self.clearSessionVal(ref, key)
+        return result
+
+    def purgeExpired(self):
+        # remove expired sessions, return the number removed
+        # nothing to do where the store expires keys itself
+        return 0
@@ -1,90 +1,203 @@
 # file - KvConnection.py
 # author - James Smith 2023
 
+import ast
+import os
 import sqlite3
 import logging
+import threading
+import time
 from fastapi.exceptions import HTTPException
 
 # sqlite queries
 
 
 class KvConnection(object):
-    def __init__(self, filepath, sessionTable, mapTable, lockTable):
+    """
+    map and lock tables of (key, val), primary key on key, map table indexed on val
+    session table of (key, field, val, expires_at), primary key on (key, field), indexed on expires_at
+      one row per field of a session, so a field is read or written without reading or writing the others
+      a write to a session renews the expiry of every field of the session (as redis does for a hash), reads skip expired rows
+    one connection per process and thread, reused by every call (sqlite prepares each statement once per connection and caches it)
+    WAL journal - readers do not block the writer, and a writer waits up to BUSY_TIMEOUT_SECONDS for the write lock rather than failing with database is locked
+    the schema is created once per process, not once per instance, and tables of an older schema are rebuilt in place
+    """
+
+    BUSY_TIMEOUT_SECONDS = 30
+    CACHED_STATEMENTS = 256
+    # connections of this thread by file path (and the process that opened them, since a forked worker does not share them)
+    __local = threading.local()
+    # schemas created by this process (keys)
+    __schemas = {}
+    __schemaLock = threading.Lock()
+
+    def __init__(self, filepath, sessionTable, mapTable, lockTable, maxSeconds=14400):
         self.filePath = filepath
         self.sessionTable = sessionTable
         self.mapTable = mapTable
         self.lockTable = lockTable
+        self.maxSeconds = float(maxSeconds)
         try:
-            # string interpolation for table names but not for data
-            with self.getConnection() as connection:
-                connection.cursor().execute(
-                    f"CREATE TABLE IF NOT EXISTS {self.sessionTable} (key, val)"
-                )
-                connection.cursor().execute(
-                    f"CREATE TABLE IF NOT EXISTS {self.mapTable} (key,val)"
-                )
-                connection.cursor().execute(
-                    f"CREATE TABLE IF NOT EXISTS {self.lockTable} (key,val)"
-                )
+            self.createSchema()
         except Exception as exc:
             raise HTTPException(
                 status_code=400, detail=f"exception in KvConnection, {type(exc)} {exc}"
             )
 
+    def createSchema(self):
+        schemaKey = (
+            os.getpid(),
+            os.path.abspath(self.filePath),
+            self.sessionTable,
+            self.mapTable,
+            self.lockTable,
+        )
+        with KvConnection.__schemaLock:
+            if schemaKey in KvConnection.__schemas:
+                return
+            connection = self.getSharedConnection()
+            # string interpolation for table names but not for data
+            # without rowid - rows are stored in primary key order, so a lookup is one b-tree search
+            sessionSchema = (
+                f"CREATE TABLE IF NOT EXISTS {self.sessionTable} "
+                + "(key TEXT NOT NULL, field TEXT NOT NULL, val, expires_at REAL NOT NULL, PRIMARY KEY (key, field)) WITHOUT ROWID"
+            )
+            self.__createTable(
+                connection,
+                self.sessionTable,
+                ["key", "field", "val", "expires_at"],
+                sessionSchema,
+                self.__copySessions,
+            )
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.sessionTable}_expires_at ON {self.sessionTable} (expires_at)"
+            )
+            for table in (self.mapTable, self.lockTable):
+                self.__createTable(
+                    connection,
+                    table,
+                    ["key", "val"],
+                    f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY NOT NULL, val)",
+                    self.__copyRows,
+                )
+            # reverse lookup of a map key by session id
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.mapTable}_val ON {self.mapTable} (val)"
+            )
+            KvConnection.__schemas[schemaKey] = True
+
+    def __isCurrent(self, connection, table, columns):
+        # true if the table does not exist or has the columns with the first as primary key
+        info = connection.execute(f"PRAGMA table_info({table})").fetchall()
+        if not info:
+            return True
+        # row - cid, name, type, notnull, default, pk
+        return [row[1] for row in info] == columns and info[0][5] == 1
+
+    def __createTable(self, connection, table, columns, schema, copy):
+        if self.__isCurrent(connection, table, columns):
+            connection.execute(schema)
+            return
+        # older schema - checked again once the write lock is held, since another process may have rebuilt it
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if not self.__isCurrent(connection, table, columns):
+                logging.info("rebuilding kv table %s", table)
+                connection.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+                connection.execute(schema)
+                copy(connection, table, f"{table}_old")
+                # drops the indexes of the old table too
+                connection.execute(f"DROP TABLE {table}_old")
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+
+    def __copyRows(self, connection, table, oldTable):
+        # the latest row of a duplicated key is kept
+        connection.execute(
+            f"INSERT OR REPLACE INTO {table} (key, val) SELECT key, val FROM {oldTable} ORDER BY rowid"
+        )
+
+    def __copySessions(self, connection, table, oldTable):
+        # (key, val) rows of serialized dictionaries, one row per dictionary item
+        expiresAt = time.time() + self.maxSeconds
+        for key, val in connection.execute(f"SELECT key, val FROM {oldTable}").fetchall():
+            try:
+                _d = ast.literal_eval(val)
+            except (ValueError, SyntaxError):
+                logging.warning("dropping unreadable kv session %s", key)
+                continue
+            if not isinstance(_d, dict):
+                continue
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {table} (key, field, val, expires_at) " + "VALUES (?, ?, ?, ?)",
+                [(key, str(field), fval, expiresAt) for field, fval in _d.items()],
+            )
+
     def getConnection(self):
-        connection = sqlite3.connect(self.filePath)
+        # new connection, autocommit (transactions are begun explicitly)
+        connection = sqlite3.connect(
+            self.filePath,
+            timeout=KvConnection.BUSY_TIMEOUT_SECONDS,
+            isolation_level=None,
+            cached_statements=KvConnection.CACHED_STATEMENTS,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "PRAGMA busy_timeout=%d" % (KvConnection.BUSY_TIMEOUT_SECONDS * 1000)
+        )
         return connection
 
+    def getSharedConnection(self):
+        # connection of this process and thread, opened on first use
+        local = KvConnection.__local
+        if getattr(local, "pid", None) != os.getpid():
+            local.pid = os.getpid()
+            local.connections = {}
+        connection = local.connections.get(self.filePath)
+        if connection is None:
+            connection = self.getConnection()
+            local.connections[self.filePath] = connection
+        return connection
+
+    # map and lock tables (key, val)
+
     def get(self, key, table):
         res = None
         try:
-            with self.getConnection() as connection:
-                params = (key,)
-                res = (
-                    connection.cursor()
-                    .execute(f"SELECT val FROM {table} " + "WHERE key = ?", params)
-                    .fetchone()[0]
-                )
-        except Exception:
-            pass
+            params = (key,)
+            row = (
+                self.getSharedConnection()
+                .execute(f"SELECT val FROM {table} " + "WHERE key = ?", params)
+                .fetchone()
+            )
+            if row is not None:
+                res = row[0]
+        except Exception as exc:
+            logging.warning("possible error in Kv get for table %s, %s %s", table, type(exc), exc)
         return res
 
     def getAll(self, table):
         res = None
         try:
-            with self.getConnection() as connection:
-                res = (connection.cursor().execute(f"SELECT * FROM {table}")).fetchall()
+            res = self.getSharedConnection().execute(f"SELECT * FROM {table}").fetchall()
         except Exception:
             pass
         return res
 
     def set(self, key, val, table):
         try:
-            with self.getConnection() as connection:
-                params = (key,)
-                res = (
-                    connection.cursor()
-                    .execute(f"SELECT val FROM {table} " + "WHERE key = ?", params)
-                    .fetchone()
-                )
-                if res is None:
-                    params = (
-                        key,
-                        val,
-                    )
-                    res = connection.cursor().execute(
-                        f"INSERT INTO {table} " + "VALUES (?, ?)", params
-                    )
-                    connection.commit()
-                else:
-                    params = (
-                        val,
-                        key,
-                    )
-                    res = connection.cursor().execute(
-                        f"UPDATE {table} " + "SET val = ? WHERE key = ?", params
-                    )
-                    connection.commit()
+            # one statement, the primary key makes it an upsert
+            params = (
+                key,
+                val,
+            )
+            self.getSharedConnection().execute(
+                f"INSERT OR REPLACE INTO {table} (key, val) " + "VALUES (?, ?)", params
+            )
         except Exception as exc:
             logging.warning(
                 "possible error in Kv set for table %s, %s = %s, %s %s",
@@ -95,45 +208,169 @@ class KvConnection(object):
                 exc,
             )
 
+    def update(self, key, table, func):
+        # atomic read-modify-write of one row
+        # func receives the current val (None if no row) and returns the new val
+        connection = self.getSharedConnection()
+        # reserve the write lock before reading so concurrent updates serialize
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            params = (key,)
+            row = connection.execute(
+                f"SELECT val FROM {table} " + "WHERE key = ?", params
+            ).fetchone()
+            val = func(row[0] if row is not None else None)
+            params = (
+                key,
+                val,
+            )
+            connection.execute(
+                f"INSERT OR REPLACE INTO {table} (key, val) " + "VALUES (?, ?)", params
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            # the shared connection is left outside of any transaction
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        return val
+
     def clear(self, key, table):
         try:
-            with self.getConnection() as connection:
-                params = (key,)
-                connection.cursor().execute(
-                    f"DELETE FROM {table} " + "WHERE key = ?", params
-                )
-                connection.commit()
+            params = (key,)
+            self.getSharedConnection().execute(
+                f"DELETE FROM {table} " + "WHERE key = ?", params
+            )
         except Exception as exc:
             logging.warning(
-                "possible error in Kv clear table {table}, %s %s", type(exc), exc
+                "possible error in Kv clear table %s, %s %s", table, type(exc), exc
             )
 
     def deleteRowWithKey(self, key, table):
         try:
-            with self.getConnection() as connection:
-                params = (key,)
-                connection.cursor().execute(
-                    f"DELETE FROM {table} " + "WHERE key = ?", params
-                )
-                connection.commit()
+            params = (key,)
+            self.getSharedConnection().execute(
+                f"DELETE FROM {table} " + "WHERE key = ?", params
+            )
         except Exception as exc:
             logging.warning("error in Kv delete from %s, %s %s", table, type(exc), exc)
 
     def deleteRowWithVal(self, val, table):
+        # index search on the map table
         try:
-            with self.getConnection() as connection:
-                params = (val,)
-                connection.cursor().execute(
-                    f"DELETE FROM {table} " + "WHERE val = ?", params
-                )
-                connection.commit()
+            params = (val,)
+            self.getSharedConnection().execute(
+                f"DELETE FROM {table} " + "WHERE val = ?", params
+            )
         except Exception as exc:
             logging.warning("error in Kv delete from %s, %s %s", table, type(exc), exc)
 
     def clearTable(self, table):
         try:
-            with self.getConnection() as connection:
-                connection.cursor().execute(f"DELETE FROM {table}")
-                connection.commit()
+            self.getSharedConnection().execute(f"DELETE FROM {table}")
         except Exception as exc:
             logging.warning("error in Kv delete from %s, %s %s", table, type(exc), exc)
+
+    # session table (key, field, val, expires_at)
+
+    def getField(self, key, field):
+        # unexpired val, None if none
+        params = (key, field, time.time())
+        row = (
+            self.getSharedConnection()
+            .execute(
+                f"SELECT val FROM {self.sessionTable} " + "WHERE key = ? AND field = ? AND expires_at > ?",
+                params,
+            )
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def getFields(self, key):
+        # unexpired vals by field, None if none
+        params = (key, time.time())
+        rows = (
+            self.getSharedConnection()
+            .execute(
+                f"SELECT field, val FROM {self.sessionTable} " + "WHERE key = ? AND expires_at > ?",
+                params,
+            )
+            .fetchall()
+        )
+        return dict(rows) if rows else None
+
+    def __setFields(self, connection, key, fields):
+        # upsert the fields and renew the expiry of the session, within the transaction of the caller
+        expiresAt = time.time() + self.maxSeconds
+        if fields:
+            connection.executemany(
+                f"INSERT INTO {self.sessionTable} (key, field, val, expires_at) "
+                + "VALUES (?, ?, ?, ?) ON CONFLICT (key, field) DO UPDATE SET val = excluded.val, expires_at = excluded.expires_at",
+                [(key, field, val, expiresAt) for field, val in fields.items()],
+            )
+        connection.execute(
+            f"UPDATE {self.sessionTable} SET expires_at = ? " + "WHERE key = ?",
+            (expiresAt, key),
+        )
+
+    def setField(self, key, field, val):
+        self.updateFields(key, lambda _d: {field: val}, read=False)
+
+    def updateFields(self, key, func, read=True):
+        # atomic read-modify-write of one session
+        # func receives the unexpired vals by field (empty if none) and returns the vals to set, or None to set nothing
+        # fields that func deletes from the dictionary it receives are removed
+        # returns the vals that were set
+        connection = self.getSharedConnection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            _d = {}
+            if read:
+                params = (key, time.time())
+                _d = dict(
+                    connection.execute(
+                        f"SELECT field, val FROM {self.sessionTable} " + "WHERE key = ? AND expires_at > ?",
+                        params,
+                    ).fetchall()
+                )
+            fields = list(_d)
+            vals = func(_d)
+            removed = [(key, field) for field in fields if field not in _d]
+            if removed:
+                connection.executemany(
+                    f"DELETE FROM {self.sessionTable} " + "WHERE key = ? AND field = ?", removed
+                )
+            if vals is not None:
+                self.__setFields(connection, key, vals)
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        return vals
+
+    def clearKey(self, key):
+        # returns whether the session had unexpired fields
+        params = (key,)
+        found = self.getFields(key) is not None
+        self.getSharedConnection().execute(
+            f"DELETE FROM {self.sessionTable} " + "WHERE key = ?", params
+        )
+        return found
+
+    def clearField(self, key, field):
+        # returns whether the field was unexpired
+        params = (key, field)
+        found = self.getField(key, field) is not None
+        self.getSharedConnection().execute(
+            f"DELETE FROM {self.sessionTable} " + "WHERE key = ? AND field = ?", params
+        )
+        return found
+
+    def purgeExpired(self):
+        # index range delete, returns the number of rows removed
+        params = (time.time(),)
+        cursor = self.getSharedConnection().execute(
+            f"DELETE FROM {self.sessionTable} " + "WHERE expires_at <= ?", params
+        )
+        return cursor.rowcount
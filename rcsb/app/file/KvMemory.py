@@ -0,0 +1,321 @@
+# file: KvMemory.py
+
+import json
+import logging
+import os
+import threading
+import time
+import typing
+from collections import OrderedDict
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.KvBase import KvBase
+
+logging.basicConfig(level=logging.INFO)
+
+
+class KvMemory(KvBase):
+    """
+    kv in the memory of the server process, for a deployment of one process (or tests) - not shared across processes, machines, or containers
+    every instance of a process shares the same tables
+    sessions - dictionaries of fields by session key, expired KV_MAX_SECONDS after the last write to the session (as redis does for a hash)
+      expired sessions are skipped by reads and removed by purgeExpired (session cleanup)
+    map - key to val with a reverse index of val to key, without expiry (digest index entries persist)
+    each table holds at most KV_MEMORY_MAX_KEYS keys, the least recently used key is evicted (expired sessions first)
+    optional snapshot to KV_SNAPSHOT_PATH at most every KV_SNAPSHOT_SECONDS on writes, and on session cleanup, loaded on first use
+    """
+
+    __lock = threading.RLock()
+    __sessions = OrderedDict()
+    __expires = {}
+    __map = OrderedDict()
+    __mapReverse = {}
+    __loaded = False
+    __snapshotTime = 0.0
+    __changed = False
+
+    def __init__(self, cP: typing.Type[ConfigProvider] = None):
+        super(KvMemory, self).__init__()
+        self.cP = cP if cP else ConfigProvider()
+        self.sessionTable = self.cP.get("KV_SESSION_TABLE_NAME")
+        self.mapTable = self.cP.get("KV_MAP_TABLE_NAME")
+        self.lockTable = self.cP.get("KV_LOCK_TABLE_NAME")
+        self.duration = float(self.cP.get("KV_MAX_SECONDS") or 14400)
+        self.maxKeys = int(self.cP.get("KV_MEMORY_MAX_KEYS") or 0)
+        self.snapshotPath = self.cP.get("KV_SNAPSHOT_PATH") or None
+        self.snapshotSeconds = float(self.cP.get("KV_SNAPSHOT_SECONDS") or 0)
+        with KvMemory.__lock:
+            if not KvMemory.__loaded:
+                KvMemory.__loaded = True
+                self.load()
+
+    # snapshot
+
+    def load(self):
+        # unexpired sessions and the map of the last snapshot, if any
+        if not self.snapshotPath or not os.path.exists(self.snapshotPath):
+            return
+        try:
+            with open(self.snapshotPath, "r", encoding="utf-8") as r:
+                snapshot = json.load(r)
+        except (OSError, ValueError) as exc:
+            logging.warning("could not load kv snapshot %s %r", self.snapshotPath, exc)
+            return
+        now = time.time()
+        with KvMemory.__lock:
+            for key, expiry, fields in snapshot.get("sessions", []):
+                if expiry > now:
+                    KvMemory.__sessions[key] = fields
+                    KvMemory.__expires[key] = expiry
+            for key, val in snapshot.get("map", []):
+                KvMemory.__map[key] = val
+                KvMemory.__mapReverse[val] = key
+        logging.info(
+            "loaded kv snapshot of %d sessions, %d map entries",
+            len(KvMemory.__sessions),
+            len(KvMemory.__map),
+        )
+
+    def snapshot(self) -> bool:
+        # write the tables to the snapshot path (whole file replaced at once), returns whether written
+        if not self.snapshotPath:
+            return False
+        with KvMemory.__lock:
+            snapshot = {
+                "sessions": [
+                    [key, KvMemory.__expires.get(key, 0), fields]
+                    for key, fields in KvMemory.__sessions.items()
+                ],
+                "map": list(KvMemory.__map.items()),
+            }
+            KvMemory.__snapshotTime = time.time()
+            KvMemory.__changed = False
+        tempPath = "%s.%d" % (self.snapshotPath, os.getpid())
+        try:
+            with open(tempPath, "w", encoding="utf-8") as w:
+                json.dump(snapshot, w)
+            os.replace(tempPath, self.snapshotPath)
+        except (OSError, TypeError, ValueError) as exc:
+            logging.warning("could not write kv snapshot %s %r", self.snapshotPath, exc)
+            if os.path.exists(tempPath):
+                os.unlink(tempPath)
+            return False
+        return True
+
+    def __written(self):
+        # after every write, with the lock held
+        KvMemory.__changed = True
+        if (
+            self.snapshotPath
+            and self.snapshotSeconds > 0
+            and time.time() - KvMemory.__snapshotTime >= self.snapshotSeconds
+        ):
+            self.snapshot()
+
+    # eviction
+
+    def __getFields(self, key, create=False):
+        # unexpired session of key, marked as recently used, None if none (or a new session if create)
+        fields = KvMemory.__sessions.get(key)
+        if fields is not None and KvMemory.__expires.get(key, 0) <= time.time():
+            self.__removeSession(key)
+            fields = None
+        if fields is None:
+            if not create:
+                return None
+            fields = {}
+            KvMemory.__sessions[key] = fields
+            self.__evict(KvMemory.__sessions, self.__removeSession)
+        KvMemory.__sessions.move_to_end(key)
+        return fields
+
+    def __touch(self, key):
+        # a write renews the expiry of the session
+        KvMemory.__expires[key] = time.time() + self.duration
+
+    def __removeSession(self, key):
+        KvMemory.__sessions.pop(key, None)
+        KvMemory.__expires.pop(key, None)
+
+    def __removeMap(self, key):
+        val = KvMemory.__map.pop(key, None)
+        if val is not None and KvMemory.__mapReverse.get(val) == key:
+            del KvMemory.__mapReverse[val]
+        return val
+
+    def __evict(self, table, remove):
+        if not self.maxKeys or len(table) <= self.maxKeys:
+            return
+        if table is KvMemory.__sessions:
+            self.__purge()
+        while len(table) > self.maxKeys:
+            key = next(iter(table))
+            logging.warning("kv memory full, evicting %s", key)
+            remove(key)
+
+    def __purge(self):
+        now = time.time()
+        expired = [key for key, expiry in KvMemory.__expires.items() if expiry <= now]
+        for key in expired:
+            self.__removeSession(key)
+        return len(expired)
+
+    # functions for either table
+
+    # get entire dictionary value rather than a sub-value
+    def getKey(self, key, table):
+        with KvMemory.__lock:
+            if table == self.sessionTable:
+                fields = self.__getFields(key)
+                return dict(fields) if fields else None
+            if table == self.mapTable:
+                return KvMemory.__map.get(key)
+        return None
+
+    def clearTable(self, table):
+        with KvMemory.__lock:
+            if table == self.sessionTable:
+                KvMemory.__sessions.clear()
+                KvMemory.__expires.clear()
+            elif table == self.mapTable:
+                KvMemory.__map.clear()
+                KvMemory.__mapReverse.clear()
+            self.__written()
+
+    # map table functions (key, val)
+
+    def getMap(self, key):
+        if not key:
+            return None
+        with KvMemory.__lock:
+            val = KvMemory.__map.get(key)
+            if val is not None:
+                KvMemory.__map.move_to_end(key)
+            return val
+
+    def setMap(self, key, val):
+        if not key:
+            return False
+        with KvMemory.__lock:
+            self.__removeMap(key)
+            KvMemory.__map[key] = val
+            KvMemory.__mapReverse[val] = key
+            self.__evict(KvMemory.__map, self.__removeMap)
+            self.__written()
+        return True
+
+    def clearMapKey(self, key):
+        with KvMemory.__lock:
+            result = self.__removeMap(key) is not None
+            self.__written()
+        return result
+
+    def clearMapVal(self, val):
+        with KvMemory.__lock:
+            key = KvMemory.__mapReverse.get(val)
+            result = key is not None and self.__removeMap(key) is not None
+            self.__written()
+        return result
+
+    # sessions table functions (nested dictionary - key1, key2, val)
+
+    def getSession(self, key1, key2):
+        if not key1:
+            return None
+        with KvMemory.__lock:
+            fields = self.__getFields(key1)
+            if not fields or key2 not in fields:
+                return 0
+            return fields[key2]
+
+    def setSession(self, key1, key2, val):
+        if not key1:
+            return None
+        with KvMemory.__lock:
+            self.__getFields(key1, create=True)[key2] = val
+            self.__touch(key1)
+            self.__written()
+        return None
+
+    def setSessionBit(self, key1, key2, index):
+        if not key1 or not key2:
+            return False, 0
+        with KvMemory.__lock:
+            fields = self.__getFields(key1, create=True)
+            bitmap = int(str(fields.get(key2, 0)), 16)
+            bit = 1 << index
+            fields[key2] = format(bitmap | bit, "x")
+            self.__touch(key1)
+            self.__written()
+            return not bitmap & bit, bin(bitmap | bit).count("1")
+
+    def clearSessionBit(self, key1, key2, index):
+        if not key1 or not key2:
+            return False, 0
+        with KvMemory.__lock:
+            fields = self.__getFields(key1) or {}
+            bitmap = int(str(fields.get(key2, 0)), 16)
+            bit = 1 << index
+            if bitmap & bit:
+                fields[key2] = format(bitmap & ~bit, "x")
+                self.__touch(key1)
+                self.__written()
+            return bool(bitmap & bit), bin(bitmap & ~bit).count("1")
+
+    def setSessionIf(self, key1, key2, expected, val):
+        if not key1 or not key2:
+            return False
+        with KvMemory.__lock:
+            fields = self.__getFields(key1) or {}
+            if str(fields.get(key2, "")) != str(expected):
+                return False
+            self.__getFields(key1, create=True)[key2] = val
+            self.__touch(key1)
+            self.__written()
+            return True
+
+    def reserveSession(self, key1, key2, amount, capacity, expires):
+        if not key1 or not key2:
+            return False
+        with KvMemory.__lock:
+            fields = self.__getFields(key1, create=True)
+            now = time.time()
+            reserved = 0
+            for k, v in list(fields.items()):
+                reservation, expiry = str(v).split("~")
+                if float(expiry) <= now:
+                    del fields[k]
+                elif k != key2:
+                    reserved += int(reservation)
+            result = reserved + amount <= capacity
+            if result:
+                fields[key2] = "%d~%f" % (amount, expires)
+                self.__touch(key1)
+            elif not fields:
+                self.__removeSession(key1)
+            self.__written()
+            return result
+
+    def clearSessionKey(self, key):
+        with KvMemory.__lock:
+            result = self.__getFields(key) is not None
+            self.__removeSession(key)
+            self.__written()
+        return result
+
+    def clearSessionVal(self, key1, key2):
+        with KvMemory.__lock:
+            fields = self.__getFields(key1)
+            if not fields or key2 not in fields:
+                return False
+            del fields[key2]
+            self.__written()
+        return True
+
+    def purgeExpired(self):
+        # also writes the snapshot if anything changed since the last one
+        with KvMemory.__lock:
+            removed = self.__purge()
+            changed = removed or KvMemory.__changed
+        if changed:
+            self.snapshot()
+        return removed
@@ -1,7 +1,10 @@
 # file - KvRedis.py
 # author - James Smith 2023
 
+import os
 import redis
+import threading
+import time
 import typing
 import logging
 from fastapi.exceptions import HTTPException
@@ -10,21 +13,159 @@ from rcsb.app.file.KvBase import KvBase
 
 
 class KvRedis(KvBase):
+    """
+    map table - hash KV_MAP_TABLE_NAME of key to val, with the reverse hash (MAP_REVERSE) of val to key
+      so that a map entry is found from its val (an upload id) with one lookup
+      both hashes are changed together by server-side scripts, atomic and in one round trip
+    lock table - a hash per lock of its fields, and every transition of a lock is one server-side script (see RedisLock)
+    """
+
+    # suffix of the name of the reverse hash of the map table
+    MAP_REVERSE = "~val"
+    # keys - map hash, reverse hash, args - key, val
+    SET_MAP = """
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old and old ~= ARGV[2] and redis.call('HGET', KEYS[2], old) == ARGV[1] then
+    redis.call('HDEL', KEYS[2], old)
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[1])
+return 1
+"""
+    # keys - map hash, reverse hash, args - key
+    CLEAR_MAP_KEY = """
+local val = redis.call('HGET', KEYS[1], ARGV[1])
+if not val then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+if redis.call('HGET', KEYS[2], val) == ARGV[1] then
+    redis.call('HDEL', KEYS[2], val)
+end
+return 1
+"""
+    # keys - map hash, reverse hash, args - val
+    CLEAR_MAP_VAL = """
+local key = redis.call('HGET', KEYS[2], ARGV[1])
+if not key then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('HGET', KEYS[1], key) == ARGV[1] then
+    redis.call('HDEL', KEYS[1], key)
+end
+return 1
+"""
+    # suffix of the name of the set of lock names
+    LOCK_INDEX = "~index"
+    # keys - lock hash, lock index, args - mode (r or w), uid, host, proc, start, lock name
+    # creates the lock if none, then acquires it if free
+    # a writer that finds the lock held claims the waitlist if no one has, so that readers let it go next
+    # returns {acquired (1 or 0), mod, count, waitlist}
+    ACQUIRE_LOCK = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'mod', 0, 'count', 0, 'host', ARGV[3], 'proc', ARGV[4], 'start', ARGV[5], 'waitlist', '-1')
+    redis.call('SADD', KEYS[2], ARGV[6])
+end
+local state = redis.call('HMGET', KEYS[1], 'mod', 'count', 'waitlist')
+local mod = tonumber(state[1])
+local count = tonumber(state[2])
+local waitlist = state[3]
+local free = waitlist == '-1' or waitlist == ARGV[2]
+if ARGV[1] == 'r' then
+    if mod >= 0 and count >= 0 and free then
+        mod = redis.call('HINCRBY', KEYS[1], 'mod', 1)
+        count = redis.call('HINCRBY', KEYS[1], 'count', 1)
+        return {1, mod, count, waitlist}
+    end
+else
+    if mod == 0 and count == 0 and free then
+        mod = redis.call('HINCRBY', KEYS[1], 'mod', -1)
+        count = redis.call('HINCRBY', KEYS[1], 'count', 1)
+        redis.call('HSET', KEYS[1], 'host', ARGV[3], 'proc', ARGV[4], 'start', ARGV[5], 'waitlist', '-1')
+        return {1, mod, count, '-1'}
+    end
+    if mod ~= 0 and waitlist == '-1' then
+        redis.call('HSET', KEYS[1], 'waitlist', ARGV[2])
+        waitlist = ARGV[2]
+    end
+end
+return {0, mod, count, waitlist}
+"""
+    # keys - lock hash, lock index, args - mode (r or w), uid, lock name
+    # releases the lock, clears the waitlist if claimed by uid, and removes the lock if no one holds or claims it
+    RELEASE_LOCK = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local mod
+if ARGV[1] == 'r' then
+    mod = redis.call('HINCRBY', KEYS[1], 'mod', -1)
+else
+    mod = redis.call('HINCRBY', KEYS[1], 'mod', 1)
+end
+local count = redis.call('HINCRBY', KEYS[1], 'count', -1)
+local waitlist = redis.call('HGET', KEYS[1], 'waitlist')
+if waitlist == ARGV[2] then
+    redis.call('HSET', KEYS[1], 'waitlist', '-1')
+    waitlist = '-1'
+end
+if mod == 0 and count == 0 and waitlist == '-1' then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[3])
+end
+return 1
+"""
+    # keys - lock hash, lock index, args - expected waitlist, lock name
+    # clears the waitlist if it is as expected, and removes the lock if no one holds it
+    CLEAR_LOCK_WAITLIST = """
+if redis.call('HGET', KEYS[1], 'waitlist') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'waitlist', '-1')
+local state = redis.call('HMGET', KEYS[1], 'mod', 'count')
+if tonumber(state[1]) == 0 and tonumber(state[2]) == 0 then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+    # clients by host, each with its connection pool, of this process (a forked worker does not share them)
+    __clients = {}
+    __clientPid = None
+    __clientLock = threading.Lock()
+
+    @staticmethod
+    def getClient(host):
+        # one client and connection pool per host and process, shared by every kv, lock, and status call
+        # the client is thread-safe, each command borrows a pooled connection
+        with KvRedis.__clientLock:
+            if KvRedis.__clientPid != os.getpid():
+                KvRedis.__clientPid = os.getpid()
+                KvRedis.__clients = {}
+            client = KvRedis.__clients.get(host)
+            if client is None:
+                pool = redis.ConnectionPool(host=host, port=6379, decode_responses=True)
+                client = redis.Redis(connection_pool=pool)
+                KvRedis.__clients[host] = client
+            return client
+
     def __init__(self, cP: typing.Type[ConfigProvider] = None):
         super(KvRedis, self).__init__()
         self.kV = None
         self.cP = cP if cP else ConfigProvider()
         self.sessionTable = self.cP.get("KV_SESSION_TABLE_NAME")
         self.mapTable = self.cP.get("KV_MAP_TABLE_NAME")
+        self.mapReverseTable = self.mapTable + KvRedis.MAP_REVERSE
         self.lockTable = self.cP.get("KV_LOCK_TABLE_NAME")
+        self.lockIndex = self.lockTable + KvRedis.LOCK_INDEX
         self.redis_host = self.cP.get("REDIS_HOST")  # localhost, redis, or url
         self.duration = self.cP.get("KV_MAX_SECONDS")
         # create database if not exists
         # create table if not exists
         try:
-            self.kV = redis.Redis(
-                host=self.redis_host, port=6379, decode_responses=True
-            )
+            self.kV = KvRedis.getClient(self.redis_host)
         except Exception as exc:
             # already exists
             logging.warning("exception in KvRedis: %s %s", type(exc), exc)
@@ -33,24 +174,32 @@ class KvRedis(KvBase):
             raise HTTPException(
                 status_code=400, detail="error in KvRedis - no database"
             )
+        # sent by sha once loaded on the server
+        self.setMapScript = self.kV.register_script(KvRedis.SET_MAP)
+        self.clearMapKeyScript = self.kV.register_script(KvRedis.CLEAR_MAP_KEY)
+        self.clearMapValScript = self.kV.register_script(KvRedis.CLEAR_MAP_VAL)
+        self.acquireLockScript = self.kV.register_script(KvRedis.ACQUIRE_LOCK)
+        self.releaseLockScript = self.kV.register_script(KvRedis.RELEASE_LOCK)
+        self.clearLockWaitListScript = self.kV.register_script(KvRedis.CLEAR_LOCK_WAITLIST)
 
     # functions for either table
 
     # get entire dictionary value rather than a sub-value
     def getKey(self, key, table):
         if table == self.sessionTable:
-            if not self.kV.exists(key):
-                return None
-            return self.kV.hgetall(key)
+            return self.kV.hgetall(key) or None
         if table == self.mapTable:
-            if not self.kV.exists(key):
-                return None
-            return str(self.kV.get(key))
+            return self.getMap(key)
         return None
 
     # clear either table or everything (redis has no tables other than possibly hash vars)
     def clearTable(self, table=None):
-        if table is not None and self.kV.exists(table):
+        if table is not None and table == self.mapTable:
+            self.kV.delete(self.mapTable, self.mapReverseTable)
+        elif table is not None and table == self.lockTable:
+            keys = [self.getLockKey(key) for key in self.kV.smembers(self.lockIndex)]
+            self.kV.delete(self.lockTable, self.lockIndex, *keys)
+        elif table is not None and self.kV.exists(table):
             self.kV.delete(table)
         else:
             self.kV.flushall()
@@ -62,37 +211,39 @@ class KvRedis(KvBase):
         # validate args
         if not key:
             return None
-        if not self.kV.exists(key):
+        val = self.kV.hget(self.mapTable, key)
+        if val is None:
             return None
-        return str(self.kV.get(key))
+        return str(val)
 
     def setMap(self, key, val):
         # validate args
         if not key:
             return False
-        self.kV.set(key, val)
+        self.setMapScript(keys=[self.mapTable, self.mapReverseTable], args=[key, val])
         return True
 
     # delete key
     def clearMapKey(self, key):
-        self.kV.delete(key)
+        if not key:
+            return False
+        return bool(
+            self.clearMapKeyScript(keys=[self.mapTable, self.mapReverseTable], args=[key])
+        )
 
     # delete key from val
     def clearMapVal(self, val):
-        key = self.getMapKeyFromVal(val)
-        self.kV.delete(key)
+        if not val:
+            return False
+        return bool(
+            self.clearMapValScript(keys=[self.mapTable, self.mapReverseTable], args=[val])
+        )
 
     # helper for delete-key-from-val
     def getMapKeyFromVal(self, val):
         if not val:
             return None
-        keys = self.kV.keys("*")
-        for k in keys:
-            if self.kV.exists(k):
-                v = self.kV.get(k)
-                if not isinstance(v, dict) and v == val:
-                    return k
-        return None
+        return self.kV.hget(self.mapReverseTable, val)
 
     # sessions table functions (nested dictionary - key1, key2, val)
 
@@ -102,11 +253,15 @@ class KvRedis(KvBase):
         # validate args
         if not key1 or not key2:
             return None
-        # validate keys, set val to zero by default
-        if not self.kV.exists(key1) or not self.kV.hexists(key1, key2):
-            self.kV.hset(key1, key2, 0)
-            self.kV.expire(key1, self.duration)
-        return str(self.kV.hget(key1, key2))
+        val = self.kV.hget(key1, key2)
+        if val is None:
+            # validate keys, set val to zero by default
+            pipe = self.kV.pipeline()
+            pipe.hsetnx(key1, key2, 0)
+            pipe.expire(key1, self.duration)
+            pipe.hget(key1, key2)
+            val = pipe.execute()[-1]
+        return str(val)
 
     # key1 = uid
     def setSession(self, key1, key2, val):
@@ -121,13 +276,88 @@ class KvRedis(KvBase):
         # self.kV.expire(key1, self.duration)
         return True
 
+    # key1 = uid, bitmap stored as hexadecimal string
+    def setSessionBit(self, key1, key2, index):
+        # validate args
+        if not key1 or not key2:
+            return False, 0
+
+        def update(pipe):
+            # optimistic transaction - retried if key1 changes before exec
+            bitmap = int(pipe.hget(key1, key2) or "0", 16)
+            bit = 1 << index
+            pipe.multi()
+            if not bitmap & bit:
+                pipe.hset(key1, key2, format(bitmap | bit, "x"))
+                pipe.expire(key1, self.duration)
+            return not bitmap & bit, bin(bitmap | bit).count("1")
+
+        return self.kV.transaction(update, key1, value_from_callable=True)
+
+    def clearSessionBit(self, key1, key2, index):
+        # validate args
+        if not key1 or not key2:
+            return False, 0
+
+        def update(pipe):
+            # optimistic transaction - retried if key1 changes before exec
+            bitmap = int(pipe.hget(key1, key2) or "0", 16)
+            bit = 1 << index
+            pipe.multi()
+            if bitmap & bit:
+                pipe.hset(key1, key2, format(bitmap & ~bit, "x"))
+                pipe.expire(key1, self.duration)
+            return bool(bitmap & bit), bin(bitmap & ~bit).count("1")
+
+        return self.kV.transaction(update, key1, value_from_callable=True)
+
+    def setSessionIf(self, key1, key2, expected, val):
+        # validate args
+        if not key1 or not key2:
+            return False
+
+        def update(pipe):
+            # optimistic transaction - retried if key1 changes before exec
+            current = pipe.hget(key1, key2) or ""
+            pipe.multi()
+            if str(current) != str(expected):
+                return False
+            pipe.hset(key1, key2, val)
+            pipe.expire(key1, self.duration)
+            return True
+
+        return self.kV.transaction(update, key1, value_from_callable=True)
+
+    def reserveSession(self, key1, key2, amount, capacity, expires):
+        # validate args
+        if not key1 or not key2:
+            return False
+
+        def update(pipe):
+            # optimistic transaction - retried if key1 changes before exec
+            now = time.time()
+            reserved = 0
+            expired = []
+            for k, v in pipe.hgetall(key1).items():
+                reservation, expiry = str(v).split("~")
+                if float(expiry) <= now:
+                    expired.append(k)
+                elif k != key2:
+                    reserved += int(reservation)
+            pipe.multi()
+            if expired:
+                pipe.hdel(key1, *expired)
+            if reserved + amount > capacity:
+                return False
+            pipe.hset(key1, key2, "%d~%f" % (amount, expires))
+            return True
+
+        return self.kV.transaction(update, key1, value_from_callable=True)
+
     def clearSessionKey(self, key):
         # validate args
         if not key:
             return False
-        # validate key
-        if not self.kV.exists(key):
-            return True
         self.kV.delete(key)
         return True
 
@@ -135,15 +365,42 @@ class KvRedis(KvBase):
         # validate args
         if not key1 or not key2:
             return False
-        # validate key1
-        if not self.kV.exists(key1):
-            return True
-        # validate key2
-        if not self.kV.hexists(key1, key2):
-            return True
         self.kV.hdel(key1, key2)
         return True
 
+    # pipelined session functions - one round trip each
+
+    def setSessionAndMap(self, key1, key2, val, mapKey):
+        # validate args
+        if not key1 or not key2 or not mapKey:
+            return False
+        pipe = self.kV.pipeline()
+        pipe.hset(key1, key2, val)
+        self.setMapScript(
+            keys=[self.mapTable, self.mapReverseTable], args=[mapKey, key1], client=pipe
+        )
+        pipe.execute()
+        return True
+
+    def clearSession(self, key, mapKey=None, refs=()):
+        # validate args
+        if not key:
+            return False
+        pipe = self.kV.pipeline()
+        pipe.delete(key)
+        if mapKey is not None:
+            self.clearMapKeyScript(
+                keys=[self.mapTable, self.mapReverseTable], args=[mapKey], client=pipe
+            )
+        else:
+            self.clearMapValScript(
+                keys=[self.mapTable, self.mapReverseTable], args=[key], client=pipe
+            )
+        for ref in refs:
+            pipe.hdel(ref, key)
+        pipe.execute()
+        return True
+
     # increment session val
     # presumes key2 has a numeric value
     def inc_session_val(self, key1, key2):
@@ -158,450 +415,72 @@ class KvRedis(KvBase):
         return True
 
     # locking functions
+    # lock state - one hash per lock (lock table name~lock name) of mod, count, host, proc, start, waitlist
+    # with a set of lock names (lock table name~index), so that cleanup finds every lock
 
-    def getLockAll(self):
-        if not self.kV.exists(self.lockTable):
-            return None
-        return self.kV.hgetall(self.lockTable)
+    def getLockKey(self, key):
+        return "%s~%s" % (self.lockTable, key)
 
-    def getLock(self, key, *indices):
+    def getLockState(self, key):
+        # dictionary of the lock fields, None if there is no lock
         if not key:
-            if len(indices) == 1:
-                return None
-            if len(indices) == 2:
-                return None, None
             return None
-        if not self.kV.hexists(self.lockTable, key):
-            if len(indices) == 1:
-                return None
-            if len(indices) == 2:
-                return None, None
+        state = self.kV.hgetall(self.getLockKey(key))
+        if not state:
             return None
-        lst = self.kV.hget(self.lockTable, key)
-        vals = []
-        if lst is not None:
-            lst = eval(lst)  # pylint: disable=W0123
-            for i in indices:
-                vals.append(lst[i])
-            if len(vals) == 1:
-                return vals[0]
-            if len(vals) == 2:
-                return vals[0], vals[1]
-            return vals
-        return None
-
-    def setLock(self, key, val, index=0, start_val=""):
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-        lst[index] = val
-        self.kV.hset(self.lockTable, key, str(lst))
-        return True
+        return KvRedis.__toLockState(state)
 
-    # increment val
-    def incLock(self, key, index=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-        try:
-            lst[index] += 1
-        except Exception:
-            return False
-        self.kV.hset(self.lockTable, key, str(lst))
-        return True
+    @staticmethod
+    def __toLockState(state):
+        for field in ("mod", "count"):
+            if field in state:
+                state[field] = int(state[field])
+        return state
 
-    # decrement val
-    def decLock(self, key, index=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-        try:
-            lst[index] -= 1
-        except Exception:
-            return False
-        self.kV.hset(self.lockTable, key, str(lst))
-        return True
-
-    # atomic operations
+    def getLockAll(self):
+        # lock states by lock name, None if there are no locks
+        keys = list(self.kV.smembers(self.lockIndex))
+        if not keys:
+            return None
+        pipe = self.kV.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(self.getLockKey(key))
+        return {
+            key: KvRedis.__toLockState(state)
+            for key, state in zip(keys, pipe.execute())
+            if state
+        }
+
+    def acquireLock(self, key, uid, mode, host, proc, start):
+        # one attempt, returns (acquired, mod, count, waitlist)
+        acquired, mod, count, waitlist = self.acquireLockScript(
+            keys=[self.getLockKey(key), self.lockIndex],
+            args=[mode, uid, host, proc, start, key],
+        )
+        return bool(acquired), int(mod), int(count), waitlist
+
+    def releaseLock(self, key, uid, mode):
+        # returns whether there was a lock
+        return bool(
+            self.releaseLockScript(
+                keys=[self.getLockKey(key), self.lockIndex], args=[mode, uid, key]
+            )
+        )
 
-    def incIncLock(self, key, index1=0, index2=1, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            try:
-                lst[index1] += 1
-                lst[index2] += 1
-            except Exception:
-                result = False
-            else:
-                self.kV.hset(self.lockTable, key, str(lst))
-        return result
-
-    def incDecLock(self, key, index1=0, index2=1, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            try:
-                lst[index1] += 1
-                lst[index2] -= 1
-            except Exception:
-                result = False
-            else:
-                self.kV.hset(self.lockTable, key, str(lst))
-        return result
-
-    def decDecLock(self, key, index1=0, index2=1, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            try:
-                lst[index1] -= 1
-                lst[index2] -= 1
-            except Exception:
-                result = False
-            else:
-                self.kV.hset(self.lockTable, key, str(lst))
-        return result
-
-    def decIncLock(self, key, index1=0, index2=1, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            try:
-                lst[index1] -= 1
-                lst[index2] += 1
-            except Exception:
-                result = False
-            else:
-                self.kV.hset(self.lockTable, key, str(lst))
-        return result
-
-    def lockHasWaitList(self, key, index) -> bool:
-        # find out if lock is waitlisted
-        s = str(self.getLock(key, index))
-        return bool(s != "-1")
-
-    def getWaitList(self, key, index):
-        # return lock waitlist value
-        return self.getLock(key, index)
-
-    def reservedWaitList(self, key, index, uid):
-        # true if I reserved the lock, false otherwise
-        return self.getWaitList(key, index) == uid
+    def clearLockWaitList(self, key, expected):
+        # returns whether the waitlist was expected (and is now cleared)
+        return bool(
+            self.clearLockWaitListScript(
+                keys=[self.getLockKey(key), self.lockIndex], args=[expected, key]
+            )
+        )
 
     # remove lock variable
     def remLock(self, key):
         if not key:
             return False
-        if self.kV.hexists(self.lockTable, key):
-            self.kV.hdel(self.lockTable, key)
-        return True
-
-    # atomic transactions that have not been implemented in sqlite
-    def incIncIfZero(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod == 0
-                and count == 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] += 1
-                    lst[index2] += 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    def incDecIfZero(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod == 0
-                and count == 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] += 1
-                    lst[index2] -= 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    def decIncIfZero(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod == 0
-                and count == 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] -= 1
-                    lst[index2] += 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    def decDecIfZero(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod == 0
-                and count == 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] -= 1
-                    lst[index2] -= 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    def incIncIfNonNeg(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod >= 0
-                and count >= 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] += 1
-                    lst[index2] += 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    def incDecIfNonNeg(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod >= 0
-                and count >= 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] += 1
-                    lst[index2] -= 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    def decIncIfNonNeg(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod >= 0
-                and count >= 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] -= 1
-                    lst[index2] += 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    def decDecIfNonNeg(self, key, uid, index1=0, index2=0, index3=0, start_val=""):
-        # validate args
-        if not key:
-            return False
-        if not self.kV.hexists(self.lockTable, key):
-            self.kV.hset(self.lockTable, key, start_val)
-        result = True
-        mod = None
-        count = None
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            mod = lst[index1]
-            count = lst[index2]
-            if (
-                mod >= 0
-                and count >= 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                try:
-                    lst[index1] -= 1
-                    lst[index2] -= 1
-                except Exception:
-                    result = False
-                else:
-                    self.kV.hset(self.lockTable, key, str(lst))
-            else:
-                result = False
-        return result, mod, count
-
-    # atomic removal
-    def remIfSafe(self, key, uid, index1=0, index2=0, index3=0):
-        if not key:
-            return False
-        with redis.lock.Lock(self.kV, key):
-            lst = eval(self.kV.hget(self.lockTable, key))  # pylint: disable=W0123
-            if lst is None:
-                return False
-            mod = lst[index1]
-            count = lst[index2]
-            waitlist = lst[index3]
-            if mod is None or count is None or waitlist is None:
-                return False
-            if (
-                mod == 0
-                and count == 0
-                and (
-                    (not self.lockHasWaitList(key, index3))
-                    or self.reservedWaitList(key, index3, uid)
-                )
-            ):
-                self.remLock(key)
+        pipe = self.kV.pipeline()
+        pipe.delete(self.getLockKey(key))
+        pipe.srem(self.lockIndex, key)
+        pipe.execute()
         return True
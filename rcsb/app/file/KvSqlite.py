@@ -1,6 +1,9 @@
 # file - KvSqlite.py
 # author - James Smith 2023
 
+import ast
+import logging
+import time
 import typing
 from rcsb.app.file.ConfigProvider import ConfigProvider
 from rcsb.app.file.KvConnection import KvConnection
@@ -24,7 +27,11 @@ class KvSqlite(KvBase):
         # create table if not exists
         try:
             self.kV = KvConnection(
-                self.filePath, self.sessionTable, self.mapTable, self.lockTable
+                self.filePath,
+                self.sessionTable,
+                self.mapTable,
+                self.lockTable,
+                self.cP.get("KV_MAX_SECONDS") or 14400,
             )
         except Exception:
             # table already exists
@@ -34,67 +41,75 @@ class KvSqlite(KvBase):
                 status_code=400, detail="error in KvSqlite - no database"
             )
 
-    # interconvert sql tables and nested dictionaries
+    # interconvert serialized and nested dictionaries
+    # sessions are stored one row per field, these remain for dictionaries serialized elsewhere
 
     def convert(self, _d):
         return str(_d)
 
     def deconvert(self, _s):
-        return eval(_s)  # pylint: disable=W0123
-
-    def __getDictionary(self, key, val, table):
-        _s = self.kV.get(key, table)
-        if _s is None:
-            self.kV.set(key, self.convert({}), table)
-            _s = self.kV.get(key, table)
-        _d = self.deconvert(_s)
-        if val not in _d:
-            _d[val] = 0
-            self.kV.set(key, self.convert(_d), table)
-            _s = self.kV.get(key, table)
-            _d = self.deconvert(_s)
-        try:
-            return _d[val]
-        except Exception:
-            raise HTTPException(
-                status_code=400, detail=f"error in KV get for table {table}, {_d}"
-            )
+        return ast.literal_eval(_s)
+
+    def __setDictionaryBit(self, key, val, index):
+        result = {}
+
+        def update(_d):
+            bitmap = int(str(_d.get(val, 0)), 16)
+            bit = 1 << index
+            result["new"] = not bitmap & bit
+            bitmap |= bit
+            result["count"] = bin(bitmap).count("1")
+            return {val: format(bitmap, "x")}
+
+        self.kV.updateFields(key, update)
+        return result["new"], result["count"]
+
+    def __clearDictionaryBit(self, key, val, index):
+        result = {}
+
+        def update(_d):
+            bitmap = int(str(_d.get(val, 0)), 16)
+            bit = 1 << index
+            result["cleared"] = bool(bitmap & bit)
+            bitmap &= ~bit
+            result["count"] = bin(bitmap).count("1")
+            if not result["cleared"]:
+                return None
+            return {val: format(bitmap, "x")}
+
+        self.kV.updateFields(key, update)
+        return result["cleared"], result["count"]
+
+    def __setDictionaryIf(self, key, val, expected, vval):
+        def update(_d):
+            if str(_d.get(val, "")) == str(expected):
+                return {val: vval}
+            return None
+
+        return self.kV.updateFields(key, update) is not None
+
+    def __reserveDictionary(self, key, val, amount, capacity, expires):
+        def update(_d):
+            now = time.time()
+            reserved = 0
+            for k, v in list(_d.items()):
+                reservation, expiry = str(v).split("~")
+                if float(expiry) <= now:
+                    del _d[k]
+                elif k != val:
+                    reserved += int(reservation)
+            if reserved + amount <= capacity:
+                return {val: "%d~%f" % (amount, expires)}
+            return None
 
-    def __setDictionary(self, key, val, vval, table):
-        _s = self.kV.get(key, table)
-        if _s is None:
-            self.kV.set(key, self.convert({}), table)
-            _s = self.kV.get(key, table)
-        _d = self.deconvert(_s)
-        if val not in _d:
-            _d[val] = 0
-            self.kV.set(key, self.convert(_d), table)
-            _s = self.kV.get(key, table)
-            _d = self.deconvert(_s)
-        _d[val] = vval
-        self.kV.set(key, self.convert(_d), table)
+        return self.kV.updateFields(key, update) is not None
 
     # value for key, or for nested dictionary get entire dictionary value-set rather than a sub-value
     def getKey(self, key, table):
+        if table == self.sessionTable:
+            return self.kV.getFields(key)
         return self.kV.get(key, table)
 
-    def __clearDictionaryKey(self, key, table):
-        _s = self.kV.get(key, table)
-        if _s is not None:
-            self.kV.clear(key, table)
-            return True
-        return False
-
-    def __clearDictionaryVal(self, key, val, table):
-        _s = self.kV.get(key, table)
-        if _s is not None:
-            _d = self.deconvert(_s)
-            if val in _d:
-                del _d[val]
-                self.kV.set(key, self.convert(_d), table)
-                return True
-        return False
-
     def clearTable(self, table):
         self.kV.clearTable(table)
 
@@ -125,37 +140,54 @@ class KvSqlite(KvBase):
     def getSession(self, key1, key2):
         if not key1:
             return None
-        table = self.sessionTable
-        return self.__getDictionary(key1, key2, table)
+        val = self.kV.getField(key1, key2)
+        return 0 if val is None else val
 
     def setSession(self, key1, key2, val):
         if not key1:
             return None
-        table = self.sessionTable
-        return self.__setDictionary(key1, key2, val, table)
+        try:
+            self.kV.setField(key1, key2, val)
+        except Exception as exc:
+            logging.warning(
+                "possible error in Kv set for table %s, %s = %s, %s %s",
+                self.sessionTable,
+                key1,
+                key2,
+                type(exc),
+                exc,
+            )
+        return None
+
+    def setSessionBit(self, key1, key2, index):
+        if not key1 or not key2:
+            return False, 0
+        return self.__setDictionaryBit(key1, key2, index)
+
+    def clearSessionBit(self, key1, key2, index):
+        if not key1 or not key2:
+            return False, 0
+        return self.__clearDictionaryBit(key1, key2, index)
+
+    def setSessionIf(self, key1, key2, expected, val):
+        if not key1 or not key2:
+            return False
+        return self.__setDictionaryIf(key1, key2, expected, val)
+
+    def reserveSession(self, key1, key2, amount, capacity, expires):
+        if not key1 or not key2:
+            return False
+        return self.__reserveDictionary(key1, key2, amount, capacity, expires)
 
     def clearSessionKey(self, key):
-        table = self.sessionTable
-        return self.__clearDictionaryKey(key, table)
+        return self.kV.clearKey(key)
 
     def clearSessionVal(self, key1, key2):
-        table = self.sessionTable
-        return self.__clearDictionaryVal(key1, key2, table)
+        return self.kV.clearField(key1, key2)
 
     def inc_session_val(self, key, val):
-        table = self.sessionTable
-        return self.__incrementSessionValue(key, val, table)
-
-    def __incrementSessionValue(self, key, val, table):
-        _s = self.kV.get(key, table)
-        if _s is None:
-            self.kV.set(key, self.convert({}), table)
-            _s = self.kV.get(key, table)
-        _d = self.deconvert(_s)
-        if val not in _d:
-            _d[val] = 0
-            self.kV.set(key, self.convert(_d), table)
-            _s = self.kV.get(key, table)
-            _d = self.deconvert(_s)
-        _d[val] += 1
-        self.kV.set(key, self.convert(_d), table)
+        return self.kV.updateFields(key, lambda _d: {val: int(_d.get(val, 0)) + 1})
+
+    def purgeExpired(self):
+        # expired sessions are otherwise only skipped by reads
+        return self.kV.purgeExpired()
@@ -2,6 +2,7 @@
 # author: James Smith 2023
 
 import asyncio
+import glob
 import json
 import os
 import sys
@@ -11,8 +12,13 @@ import uuid
 import typing
 from rcsb.app.file.ConfigProvider import ConfigProvider
 from rcsb.app.file.PathProvider import PathProvider
+from rcsb.app.file.KvMemory import KvMemory
 from rcsb.app.file.KvRedis import KvRedis
 from rcsb.app.file.KvSqlite import KvSqlite
+from rcsb.app.file.Executors import Executors
+from rcsb.app.file.StorageProvider import StorageProvider
+from rcsb.app.file.StagingProvider import StagingProvider
+from rcsb.app.file.FinalizeProvider import FinalizeProvider
 
 provider = ConfigProvider()
 locktype = provider.get("LOCK_TYPE")
@@ -43,6 +49,8 @@ class Sessions(object):
         if kV:  # not same as self.kV
             if cP.get("KV_MODE") == "redis":
                 self.kV = KvRedis()
+            elif cP.get("KV_MODE") == "memory":
+                self.kV = KvMemory()
             else:
                 self.kV = KvSqlite()
 
@@ -68,6 +76,10 @@ class Sessions(object):
                 contentFormat,
                 version,
             )
+            if self.uploadId is not None and not StagingProvider(self.cP).isStagedHere(self.uploadId):
+                # temp files are staged on another server, begin again here
+                logging.info("not resuming session %s staged on another server", self.uploadId)
+                self.uploadId = None
             if self.uploadId is not None:
                 logging.info("resuming session %s", self.uploadId)
         if self.uploadId is None:
@@ -76,7 +88,7 @@ class Sessions(object):
     # UPLOAD HELPER FUNCTIONS
 
     def getNewUploadId(self):
-        return uuid.uuid4().hex
+        return StagingProvider(self.cP).getUploadId(uuid.uuid4().hex)
 
     # find upload id using file parameters
     async def getResumedUpload(
@@ -98,19 +110,51 @@ class Sessions(object):
             contentFormat=contentFormat,
             version=version,
         )
-        uploadId = self.kV.getMap(mapKey)
+        uploadId = await Executors.runIo(self.kV.getMap, mapKey)
         if uploadId is None:
             # not a resumed upload
             return None
         return uploadId
 
     # in-place temp file name and path
-    def getTempFilePath(self, dirPath, uploadId=None):
+    # in the deposition directory, or in the same directories on the staging storage (staged upload ids)
+    # unstaged - always in the deposition directory (hard links)
+    def getTempFilePath(self, dirPath, uploadId=None, staged=True):
         if not uploadId:
             uploadId = self.uploadId
+        if staged:
+            dirPath = StagingProvider(self.cP).getTempDirPath(dirPath, uploadId)
         tempPath = os.path.join(dirPath, "._" + uploadId)
         return tempPath
 
+    # make the staging directories of the deposition directory
+    def makeTempDir(self, dirPath, uploadId=None):
+        tempDir = os.path.dirname(self.getTempFilePath(dirPath, uploadId))
+        if not os.path.exists(tempDir):
+            os.makedirs(tempDir, mode=self.cP.get("DEFAULT_FILE_PERMISSIONS"), exist_ok=True)
+
+    # whether this server holds the temp files of the upload
+    def isStagedHere(self, uploadId=None):
+        return StagingProvider(self.cP).isStagedHere(uploadId or self.uploadId)
+
+    # raw compressed chunks of a streamed upload, beside the temp file
+    def getStreamFilePath(self, dirPath, uploadId=None):
+        return self.getTempFilePath(dirPath, uploadId) + ".stream"
+
+    # bytes of the repository file system already allocated to the temp files of the upload
+    # a preallocated temp file is already missing from the free bytes of the file system
+    def getTempAllocatedBytes(self, dirPath, uploadId=None) -> int:
+        device = os.stat(self.cP.get("REPOSITORY_DIR_PATH")).st_dev
+        allocated = 0
+        for path in (self.getTempFilePath(dirPath, uploadId), self.getStreamFilePath(dirPath, uploadId)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_dev == device:
+                allocated += stat.st_blocks * 512
+        return allocated
+
     def getSaveFilePath(
         self,
         repositoryType: str,
@@ -163,45 +207,158 @@ class Sessions(object):
     ):
         if os.path.exists(tempPath):
             os.unlink(tempPath)
+        if os.path.exists(tempPath + ".stream"):
+            os.unlink(tempPath + ".stream")
         self.removePlaceholderFile(tempPath)
-        if not resumable:
-            return True
         if not uid:
             uid = self.uploadId
+        # return reserved disk space
+        try:
+            await self.releaseKvReservation(uid)
+        except Exception:
+            logging.warning("could not release disk reservation of %s", uid)
+        if not resumable:
+            # every upload records its chunk bitmap, only resumable uploads have a map entry
+            try:
+                await Executors.runIo(self.kV.clearSessionKey, uid)
+            except Exception:
+                return False
+            return True
         return await self.clearKvSession(mapKey, uid)
 
-    # DATABASE FUNCTIONS (RESUMABLE UPLOADS ONLY)
+    # DATABASE FUNCTIONS
+
+    # chunk bitmap (all uploads)
+
+    # record one received chunk, returns (chunk was not received before, number of chunks received)
+    async def setKvChunk(self, chunkIndex: int) -> typing.Tuple[bool, int]:
+        return await Executors.runIo(
+            self.kV.setSessionBit, self.uploadId, "bitmap", chunkIndex
+        )
+
+    # forget one received chunk and its digest, so that the upload is not finalized until the chunk is retransmitted
+    async def clearKvChunk(self, chunkIndex: int) -> typing.Tuple[bool, int]:
+        await Executors.runIo(self.kV.clearSessionVal, self.uploadId, "digest~%d" % chunkIndex)
+        return await Executors.runIo(
+            self.kV.clearSessionBit, self.uploadId, "bitmap", chunkIndex
+        )
+
+    # bitmap of received chunks as an integer (bit n set = chunk n received)
+    async def getKvBitmap(self, uploadId=None) -> int:
+        status = await self.getKvSessionDict(uploadId)
+        if "bitmap" in status:
+            return int(str(status["bitmap"]), 16)
+        return 0
+
+    # chunk digests (all uploads that send per-chunk digests)
+
+    # record digest of a chunk that matched the client digest
+    async def setKvChunkDigest(self, chunkIndex: int, digest: str):
+        await self.setKvSession(self.uploadId, "digest~%d" % chunkIndex, digest)
+
+    # verified digests in chunk order, or None unless every chunk has one
+    async def getKvChunkDigests(self, expectedChunks: int) -> typing.Optional[list]:
+        status = await self.getKvSessionDict()
+        digests = [status.get("digest~%d" % index) for index in range(expectedChunks)]
+        if not digests or not all(digests):
+            return None
+        return digests
+
+    # chunk sizes (all uploads)
 
-    # compute chunks uploaded using current file size divided by chunk size
+    # record bytes written for a chunk, the size of a preallocated temp file says nothing of what was received
+    async def setKvChunkSize(self, chunkIndex: int, size: int):
+        await self.setKvSession(self.uploadId, "size~%d" % chunkIndex, size)
+
+    # bytes written for all chunks, or None unless every chunk has a size
+    async def getKvReceivedBytes(self, expectedChunks: int) -> typing.Optional[int]:
+        status = await self.getKvSessionDict()
+        sizes = [status.get("size~%d" % index) for index in range(expectedChunks)]
+        if not sizes or any(size is None for size in sizes):
+            return None
+        return sum(int(size) for size in sizes)
+
+    # compressed stream position (streamed uploads)
+
+    # claim the right to decompress the stream, returns claim token or None if another request holds it
+    # a claim older than the lock timeout is presumed abandoned
+    async def claimKvStream(self) -> typing.Optional[str]:
+        status = await self.getKvSessionDict()
+        owner = str(status.get("streamOwner") or "")
+        timeout = self.cP.get("LOCK_TIMEOUT") or 60
+        if owner and time.time() - float(owner.split("~")[-1]) < float(timeout):
+            return None
+        token = "%s~%f" % (uuid.uuid4().hex, time.time())
+        if await Executors.runIo(
+            self.kV.setSessionIf, self.uploadId, "streamOwner", owner, token
+        ):
+            return token
+        return None
+
+    # renew a claim before it expires, returns the renewed claim token or None if another request took the claim
+    async def renewKvStream(self, token: str) -> typing.Optional[str]:
+        renewed = "%s~%f" % (token.split("~")[0], time.time())
+        if await Executors.runIo(
+            self.kV.setSessionIf, self.uploadId, "streamOwner", token, renewed
+        ):
+            return renewed
+        return None
+
+    async def releaseKvStream(self, token: str):
+        await Executors.runIo(self.kV.setSessionIf, self.uploadId, "streamOwner", token, "")
+
+    # disk space reserved with upload parameters (StorageProvider)
+
+    async def releaseKvReservation(self, uploadId=None):
+        if uploadId is None:
+            uploadId = self.uploadId
+        await Executors.runIo(
+            self.kV.clearSessionVal, StorageProvider.RESERVATIONS, uploadId
+        )
+
+    # RESUMABLE UPLOADS ONLY
+
+    # index of first chunk not yet received
     # parameter dir path = absolute path without file name
     async def getUploadCount(self, dirPath: str) -> int:
-        status = await self.getKvSession()
-        if status:
-            status = str(status)
-            status = status.replace("'", '"')
-            status = json.loads(status)
-            if "chunkSize" in status:
-                chunkSize = int(status["chunkSize"])
-                tempPath = self.getTempFilePath(dirPath)
-                if os.path.exists(tempPath):
-                    fileSize = os.path.getsize(tempPath)
-                    uploadCount = round(fileSize / chunkSize)
-                    return int(uploadCount)
-                else:
-                    logging.exception("error - could not find path %s", tempPath)
-        return 0
+        bitmap = await self.getKvBitmap()
+        if bitmap:
+            tempPath = self.getTempFilePath(dirPath)
+            streamPath = self.getStreamFilePath(dirPath)
+            if not os.path.exists(tempPath) and not os.path.exists(streamPath):
+                logging.exception("error - could not find path %s", tempPath)
+                return 0
+        uploadCount = 0
+        while bitmap & (1 << uploadCount):
+            uploadCount += 1
+        return uploadCount
 
     # returns entire dictionary of session table entry
     async def getKvSession(self, uploadId=None):
         if uploadId is None:
             uploadId = self.uploadId
-        return self.kV.getKey(uploadId, self.kV.sessionTable)
+        return await Executors.runIo(self.kV.getKey, uploadId, self.kV.sessionTable)
+
+    # session table entry as a dictionary (empty if none)
+    async def getKvSessionDict(self, uploadId=None) -> dict:
+        status = await self.getKvSession(uploadId)
+        if not status:
+            return {}
+        if isinstance(status, dict):
+            return status
+        status = str(status)
+        status = status.replace("'", '"')
+        return json.loads(status)
 
     async def setKvSession(self, key1, key2, val):
-        self.kV.setSession(key1, key2, val)
+        await Executors.runIo(self.kV.setSession, key1, key2, val)
 
     async def setKvMap(self, key, val):
-        self.kV.setMap(key, val)
+        await Executors.runIo(self.kV.setMap, key, val)
+
+    async def setKvSessionAndMap(self, key1, key2, val, mapKey):
+        # one round trip where the kv batches commands
+        await Executors.runIo(self.kV.setSessionAndMap, key1, key2, val, mapKey)
 
     async def getKvPrimaryMapKey(
         self,
@@ -247,17 +404,12 @@ class Sessions(object):
             uid = self.uploadId
         response = True
         try:
-            # remove expired sessions entry (key = upload id)
-            res = self.kV.clearSessionKey(uid)
-            # remove map table entry
+            # remove expired sessions entry (key = upload id) and map table entry
             # key = file parameters, val = upload id
             # without file parameters, must find key from val
+            res = await Executors.runIo(self.kV.clearSession, uid, mapKey)
             if not res:
                 response = False
-            if mapKey is not None:
-                self.kV.clearMapKey(mapKey)
-            else:
-                self.kV.clearMapVal(uid)
         except Exception:
             return False
         return response
@@ -309,7 +461,7 @@ class Sessions(object):
         sessionDir = cP.get("SESSION_DIR_PATH")
         kvMaxSeconds = cP.get("KV_MAX_SECONDS")
         kvMode = cP.get("KV_MODE")
-        if kvMode != "sqlite" and kvMode != "redis":
+        if kvMode not in ("sqlite", "redis", "memory"):
             logging.exception("error - unknown kv mode")
             return False
         if seconds is None:
@@ -331,15 +483,18 @@ class Sessions(object):
                         kV = KvSqlite(cP)
                     elif kvMode == "redis":
                         kV = KvRedis(cP)
+                    elif kvMode == "memory":
+                        kV = KvMemory(cP)
                     try:
-                        # remove expired entry and temp files
-                        if not kV.clearSessionKey(sessionId):
+                        # remove expired entry, map table entry with val (key = file parameters, val = session id),
+                        # and reserved disk space, in one call
+                        if not await Executors.runIo(
+                            kV.clearSession, sessionId, None, [StorageProvider.RESERVATIONS]
+                        ):
                             logging.exception(
                                 "error - could not remove session key for %s, upload may not have been resumable",
                                 sessionId,
                             )
-                        # remove map table entry with val (key = file parameters, val = session id)
-                        kV.clearMapVal(sessionId)
                     except Exception:
                         pass
                     # clear temp files
@@ -349,9 +504,33 @@ class Sessions(object):
                     ).getTempFilePath(dirPath, sessionId)
                     if os.path.exists(tempPath):
                         os.unlink(tempPath)
+                    # stream or delta side file, or bundle members
+                    for sidePath in glob.glob(glob.escape(tempPath) + ".*"):
+                        os.unlink(sidePath)
                     # remove placeholder file
                     if os.path.exists(placeholder_path):
                         os.unlink(placeholder_path)
+        # expired kv sessions, including those without placeholders
+        try:
+            if kvMode == "sqlite":
+                kV = KvSqlite(cP)
+            elif kvMode == "memory":
+                kV = KvMemory(cP)
+            else:
+                kV = KvRedis(cP)
+            await Executors.runIo(kV.purgeExpired)
+        except Exception as exc:
+            logging.warning("could not purge expired kv sessions %r", exc)
+        # staged temp files of this server, including those of sessions cleared on another server
+        try:
+            await Executors.runIo(StagingProvider(cP).cleanup, seconds)
+        except Exception as exc:
+            logging.warning("could not clear staging directory %r", exc)
+        # statuses of uploads finalized in the background
+        try:
+            await FinalizeProvider(cP).cleanup()
+        except Exception as exc:
+            logging.warning("could not clear finalization statuses %r", exc)
         # remove expired locks
         timeout = cP.get("LOCK_TIMEOUT")
         if not isinstance(timeout, int):
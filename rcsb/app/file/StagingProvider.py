@@ -0,0 +1,144 @@
+# file: StagingProvider.py
+
+import errno
+import hashlib
+import logging
+import os
+import socket
+import time
+import typing
+from rcsb.app.file.ConfigProvider import ConfigProvider
+
+logging.basicConfig(level=logging.INFO)
+
+
+class StagingProvider(object):
+    """
+    in-progress uploads staged on local fast storage (ssd or tmpfs) at STAGING_DIR_PATH, then published to the repository
+    temp files keep the repository type and dep id directories of the repository, so session placeholders and cleanup are unchanged
+    publishing - a rename if the staging directory is on the repository file system, else a copy in the kernel (copy_file_range, or sendfile)
+      into the deposition directory, then the atomic rename into the versioned path, so a partial file is never at a repository path
+    a staged upload id begins with the node id of the server that stages it, and every chunk of the session must reach that server
+      other servers answer 421 (misdirected request), so a load balancer should route uploads by upload id
+    upload ids without a node id are written in place whatever the setting, so sessions begun before staging was configured still resume
+    """
+
+    def __init__(self, cP: typing.Type[ConfigProvider] = None):
+        self.cP = cP if cP else ConfigProvider()
+        self.stagingDir = self.cP.get("STAGING_DIR_PATH") or None
+        self.repositoryDir = self.cP.get("REPOSITORY_DIR_PATH")
+
+    @staticmethod
+    def getNodeId() -> str:
+        # same for every process of one server and across restarts, without the separators of placeholder names
+        return hashlib.md5(socket.gethostname().encode("utf-8")).hexdigest()[:8]
+
+    def getUploadId(self, uploadId: str) -> str:
+        # new upload id, pinned to this server if staged
+        if not self.stagingDir:
+            return uploadId
+        return "%s-%s" % (StagingProvider.getNodeId(), uploadId)
+
+    @staticmethod
+    def isStaged(uploadId: str) -> bool:
+        return "-" in uploadId
+
+    def isStagedHere(self, uploadId: str) -> bool:
+        # whether this server holds the temp files of the upload
+        if not StagingProvider.isStaged(uploadId):
+            return True
+        return bool(self.stagingDir) and uploadId.split("-", 1)[0] == StagingProvider.getNodeId()
+
+    def getTempDirPath(self, dirPath: str, uploadId: str) -> str:
+        # directory of the temp files of an upload to the deposition directory
+        if not self.stagingDir or not StagingProvider.isStaged(uploadId):
+            return dirPath
+        relPath = os.path.relpath(dirPath, self.repositoryDir)
+        if relPath.startswith(os.pardir):
+            return dirPath
+        return os.path.join(self.stagingDir, relPath)
+
+    @staticmethod
+    def publishFile(tempPath: str, dirPath: str) -> str:
+        """
+
+        Args:
+            tempPath: completed temp file, staged or already in the deposition directory
+            dirPath: deposition directory
+
+        Returns:
+            path of the temp file in the deposition directory (same name), ready for the atomic rename
+
+        """
+        if os.path.normpath(os.path.dirname(tempPath)) == os.path.normpath(dirPath):
+            return tempPath
+        publishPath = os.path.join(dirPath, os.path.basename(tempPath))
+        try:
+            os.replace(tempPath, publishPath)
+            return publishPath
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+        try:
+            StagingProvider.copyFile(tempPath, publishPath)
+        except BaseException:
+            if os.path.exists(publishPath):
+                os.unlink(publishPath)
+            raise
+        os.unlink(tempPath)
+        return publishPath
+
+    @staticmethod
+    def copyFile(sourcePath: str, targetPath: str, blockSize: int = 8388608) -> int:
+        # bulk copy between file systems without passing the bytes through user space where the kernel allows
+        with open(sourcePath, "rb") as r, open(targetPath, "wb") as w:
+            srcFd = r.fileno()
+            dstFd = w.fileno()
+            fileSize = os.fstat(srcFd).st_size
+            offset = 0
+            try:
+                while offset < fileSize:
+                    copied = os.copy_file_range(srcFd, dstFd, fileSize - offset, offset, offset)
+                    if not copied:
+                        break
+                    offset += copied
+            except (AttributeError, OSError):
+                # copy_file_range unavailable (platform, kernel, or file systems)
+                pass
+            if offset < fileSize:
+                os.lseek(dstFd, offset, os.SEEK_SET)
+                try:
+                    while offset < fileSize:
+                        copied = os.sendfile(dstFd, srcFd, offset, min(fileSize - offset, blockSize))
+                        if not copied:
+                            break
+                        offset += copied
+                except (AttributeError, OSError):
+                    # sendfile unavailable, buffered copy
+                    w.seek(offset)
+                    r.seek(offset)
+                    while block := r.read(blockSize):
+                        w.write(block)
+                        offset += len(block)
+            if offset != fileSize:
+                raise OSError(errno.EIO, "error - incomplete copy of %s" % sourcePath)
+            return offset
+
+    def cleanup(self, seconds: typing.Union[int, float, str]) -> int:
+        # temp files on the staging storage of this server that were not modified within seconds, returns the number removed
+        if not self.stagingDir or not os.path.isdir(self.stagingDir):
+            return 0
+        removed = 0
+        for dirPath, _, fileNames in os.walk(self.stagingDir):
+            for fileName in fileNames:
+                if not fileName.startswith("._"):
+                    continue
+                tempPath = os.path.join(dirPath, fileName)
+                try:
+                    if time.time() - os.path.getmtime(tempPath) >= float(seconds):
+                        logging.info("clearing staged %s", tempPath)
+                        os.unlink(tempPath)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
@@ -0,0 +1,139 @@
+# file: StorageProvider.py
+
+import logging
+import shutil
+import threading
+import time
+import typing
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.Executors import Executors
+from rcsb.app.file.KvMemory import KvMemory
+from rcsb.app.file.KvRedis import KvRedis
+from rcsb.app.file.KvSqlite import KvSqlite
+
+logging.basicConfig(level=logging.INFO)
+
+
+class StorageProvider(object):
+    """
+    disk space accounting for uploads to the repository
+    free bytes - read from the repository file system at most once per STORAGE_REFRESH_SECONDS in each server process
+    reservations - bytes promised to upload sessions (key upload id), kept in the kv so that every server process sees them
+    an upload reserves its file size with its upload parameters and releases it when its session closes or expires
+    capacity - free bytes less STORAGE_HEADROOM_BYTES, an upload is refused (507) if the reservations would exceed it
+    a resumed upload reserves only what its temp files have not yet allocated, since allocated bytes are no longer free
+    likewise an upload's reservation shrinks by what chunk 0 preallocates, so those bytes are not counted twice
+    bytes of other uploads that are not preallocated remain reserved until they close, so admission errs toward refusing
+    """
+
+    # session table key of the reservations
+    RESERVATIONS = "reservations"
+    __lock = threading.Lock()
+    __free = None
+    __total = None
+    __refreshed = 0.0
+
+    def __init__(self, cP: typing.Type[ConfigProvider] = None, kV=True):
+        self.cP = cP if cP else ConfigProvider()
+        self.kV = None
+        if kV:
+            if self.cP.get("KV_MODE") == "redis":
+                self.kV = KvRedis(self.cP)
+            elif self.cP.get("KV_MODE") == "memory":
+                self.kV = KvMemory(self.cP)
+            else:
+                self.kV = KvSqlite(self.cP)
+
+    def getDiskUsage(self) -> typing.Tuple[int, int]:
+        # (total bytes, free bytes) of the repository file system, cached
+        refreshSeconds = self.cP.get("STORAGE_REFRESH_SECONDS")
+        refreshSeconds = float(refreshSeconds) if refreshSeconds is not None else 10.0
+        with StorageProvider.__lock:
+            if (
+                StorageProvider.__free is not None
+                and time.time() - StorageProvider.__refreshed < refreshSeconds
+            ):
+                return StorageProvider.__total, StorageProvider.__free
+        total, _, free = shutil.disk_usage(self.cP.get("REPOSITORY_DIR_PATH"))
+        with StorageProvider.__lock:
+            StorageProvider.__total = total
+            StorageProvider.__free = free
+            StorageProvider.__refreshed = time.time()
+        return total, free
+
+    async def getFreeBytes(self) -> int:
+        # blocks (network file system) only when the cached value is stale
+        _, free = await Executors.runIo(self.getDiskUsage)
+        return free
+
+    async def getCapacity(self) -> int:
+        headroom = self.cP.get("STORAGE_HEADROOM_BYTES") or 0
+        return max(await self.getFreeBytes() - int(headroom), 0)
+
+    async def reserve(self, uploadId: str, fileSize: int, allocated: int = 0) -> bool:
+        # reserve (or resize the reservation of a resumed upload), return False if there is no room
+        # allocated - bytes of the file system already allocated to the upload (preallocated temp file)
+        # released by Sessions.close or Sessions.cleanupSessions
+        if not uploadId or not fileSize or fileSize <= 0:
+            return True
+        capacity = await self.getCapacity()
+        maxSeconds = self.cP.get("KV_MAX_SECONDS") or 14400
+        return await Executors.runIo(
+            self.kV.reserveSession,
+            StorageProvider.RESERVATIONS,
+            uploadId,
+            max(int(fileSize) - int(allocated), 0),
+            capacity,
+            time.time() + float(maxSeconds),
+        )
+
+    async def shrink(self, uploadId: str, fileSize: int, allocated: int):
+        # after the temp file of the upload is preallocated, reserve only what it has not allocated, never refused
+        if not uploadId or not fileSize or fileSize <= 0:
+            return
+        if uploadId not in await self.getReservations():
+            # made no reservation, or already released
+            return
+        maxSeconds = self.cP.get("KV_MAX_SECONDS") or 14400
+        await Executors.runIo(
+            self.kV.reserveSession,
+            StorageProvider.RESERVATIONS,
+            uploadId,
+            max(int(fileSize) - int(allocated), 0),
+            float("inf"),
+            time.time() + float(maxSeconds),
+        )
+
+    async def release(self, uploadId: str):
+        # reservation of an upload made without a session (uploadFile)
+        await Executors.runIo(self.kV.clearSessionVal, StorageProvider.RESERVATIONS, uploadId)
+
+    async def getReservations(self) -> dict:
+        # unexpired reservations in bytes by upload id
+        reservations = await Executors.runIo(
+            self.kV.getKey, StorageProvider.RESERVATIONS, self.kV.sessionTable
+        )
+        if not reservations:
+            return {}
+        if not isinstance(reservations, dict):
+            reservations = self.kV.deconvert(reservations)
+        now = time.time()
+        result = {}
+        for uploadId, val in reservations.items():
+            reservation, expiry = str(val).split("~")
+            if float(expiry) > now:
+                result[uploadId] = int(reservation)
+        return result
+
+    async def storageStatus(self) -> dict:
+        total, free = await Executors.runIo(self.getDiskUsage)
+        reservations = await self.getReservations()
+        reserved = sum(reservations.values())
+        capacity = await self.getCapacity()
+        return {
+            "repository disk bytes total": total,
+            "repository disk bytes free": free,
+            "repository disk bytes reserved": reserved,
+            "repository disk bytes available": max(capacity - reserved, 0),
+            "uploads reserving disk": len(reservations),
+        }
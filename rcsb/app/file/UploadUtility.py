@@ -12,22 +12,32 @@ __author__ = "John Westbrook"
 __email__ = "john.westbrook@rcsb.org"
 __license__ = "Apache 2.0"
 
-import gzip
-import bz2
+import asyncio
+import errno
+import glob
 import io
-import lzma
-import shutil
-import zipfile
+import tempfile
+import threading
+import time
 import logging
 import os
 import typing
-import aiofiles
 from fastapi import HTTPException
 from rcsb.app.file.Sessions import Sessions
+from rcsb.app.file.StorageProvider import StorageProvider
+from rcsb.app.file.StagingProvider import StagingProvider
+from rcsb.app.file.FinalizeProvider import FinalizeProvider
+from rcsb.app.file.ChunkSizeProvider import ChunkSizeProvider
 from rcsb.app.file.ConfigProvider import ConfigProvider
 from rcsb.app.file.PathProvider import PathProvider
 from rcsb.app.file.IoUtility import IoUtility
+from rcsb.app.file.CodecProvider import CodecProvider
+from rcsb.app.file.DictionaryProvider import DictionaryProvider
+from rcsb.app.file.DigestIndex import DigestIndex
+from rcsb.app.file.DeltaProvider import DeltaProvider
+from rcsb.app.file.BundleProvider import BundleProvider, BundleReader
 from rcsb.app.file.serverStatus import ServerStatus
+from rcsb.app.file.Executors import Executors
 
 
 provider = ConfigProvider()
@@ -52,6 +62,10 @@ class UploadUtility(object):
     functions - get upload parameters, upload, compress file, decompress file, compress chunk, decompress chunk
     """
 
+    # decompressor state of streamed uploads in this process, keyed by upload id
+    __streams = {}
+    __streamLock = threading.Lock()
+
     def __init__(self, cP: typing.Type[ConfigProvider] = None):
         self.cP = cP if cP else ConfigProvider()
 
@@ -66,6 +80,13 @@ class UploadUtility(object):
         version: str,
         allowOverwrite: bool,
         resumable: bool,
+        compressionTypes: typing.Optional[str] = None,
+        compressionDictionary: bool = False,
+        fileSize: typing.Optional[int] = None,
+        hashType: typing.Optional[str] = None,
+        hashDigest: typing.Optional[str] = None,
+        throughput: typing.Optional[float] = None,
+        rtt: typing.Optional[float] = None,
     ):
         if not PathProvider(self.cP).validateParameters(
             repositoryType,
@@ -123,19 +144,226 @@ class UploadUtility(object):
         defaultFilePermissions = self.cP.get("DEFAULT_FILE_PERMISSIONS")
         if not os.path.exists(fullPath):
             os.makedirs(fullPath, mode=defaultFilePermissions, exist_ok=True)
+        session.makeTempDir(fullPath)
+        # identical content already in the deposition is linked to the new path rather than uploaded
+        if hashType and hashDigest and not (resumable and await session.getKvBitmap()):
+            if await self.linkIdentical(
+                session, fullPath, resultPath, hashType, hashDigest, fileSize, allowOverwrite
+            ):
+                return {
+                    "filePath": resultPath,
+                    "chunkIndex": 0,
+                    "uploadId": uploadId,
+                    "chunkBitmap": "0",
+                    "compressionType": None,
+                    "compressionDictionary": None,
+                    "satisfied": True,
+                    "chunkSize": None,
+                    "chunkConcurrency": None,
+                }
+        # reserve disk space for the file, before any chunk is sent
+        # less whatever the temp files of a resumed upload already hold
+        allocated = 0
+        if fileSize and resumable:
+            allocated = await Executors.runIo(session.getTempAllocatedBytes, fullPath)
+        if fileSize and not await StorageProvider(self.cP).reserve(uploadId, fileSize, allocated):
+            raise HTTPException(
+                status_code=507,
+                detail="error - repository disk full, space reserved by other uploads",
+            )
         # get chunk index
         uploadCount = 0
+        bitmap = 0
+        chunkSize = None
         if resumable:
             uploadCount = await session.getUploadCount(fullPath)
             if uploadCount > 0:
                 logging.info("resuming upload on chunk %d", uploadCount)
-        return {"filePath": resultPath, "chunkIndex": uploadCount, "uploadId": uploadId}
+                bitmap = await session.getKvBitmap()
+            if bitmap:
+                # chunks already received fix the chunk size
+                chunkSize = (await session.getKvSessionDict()).get("chunkSize")
+                chunkSize = int(chunkSize) if chunkSize else None
+        # chunk size and concurrency for the file, from the client's measured throughput and round trip time
+        chunkD = ChunkSizeProvider(self.cP).getParameters(fileSize, throughput, rtt, chunkSize)
+        # compression type for chunks and streams, the first of the client's (comma separated) preferences available here
+        compressionType = self.cP.get("COMPRESSION_TYPE")
+        if compressionTypes is not None:
+            compressionType = CodecProvider.negotiate(compressionTypes.split(","))
+        # preset dictionary of the content format, when asked for and the client offers zlib
+        dictionaryId = None
+        if compressionDictionary and "zlib" in str(compressionTypes).split(","):
+            dictionaryId = await Executors.runIo(
+                DictionaryProvider(self.cP).getDictionaryId, contentFormat
+            )
+            if dictionaryId:
+                compressionType = "zlib"
+        return {
+            "filePath": resultPath,
+            "chunkIndex": uploadCount,
+            "uploadId": uploadId,
+            "chunkBitmap": format(bitmap, "x"),
+            "compressionType": compressionType,
+            "compressionDictionary": dictionaryId,
+            "satisfied": False,
+            "chunkSize": chunkD["chunkSize"],
+            "chunkConcurrency": chunkD["chunkConcurrency"],
+        }
+
+    async def linkIdentical(
+        self,
+        session: Sessions,
+        dirPath: str,
+        resultPath: str,
+        hashType: str,
+        hashDigest: str,
+        fileSize: typing.Optional[int],
+        allowOverwrite: bool,
+    ) -> bool:
+        # link a stored file with the digest to the save file path, return whether linked
+        digestIndex = DigestIndex(self.cP)
+        sourcePath = await digestIndex.find(dirPath, hashType, hashDigest, fileSize)
+        if not sourcePath:
+            return False
+        filePath = os.path.join(self.cP.get("REPOSITORY_DIR_PATH"), resultPath)
+        if os.path.abspath(sourcePath) == os.path.abspath(filePath):
+            return True
+        # a hard link is made on the repository file system, never staged
+        tempPath = session.getTempFilePath(dirPath, staged=False)
+        if not await Executors.runIo(digestIndex.linkFile, sourcePath, tempPath):
+            return False
+        try:
+            await self.saveFile(tempPath, filePath, allowOverwrite)
+        finally:
+            if os.path.exists(tempPath):
+                os.unlink(tempPath)
+        logging.info("linked %s to identical %s", filePath, sourcePath)
+        return True
 
-    # in-place sequential chunk
+    # whole file in one request (smaller than one chunk), without session, kv entries, or placeholder
+    async def uploadFile(
+        self,
+        # file parameters
+        file: typing.IO,
+        repositoryType: str,
+        depId: str,
+        contentType: str,
+        milestone: typing.Optional[str],
+        partNumber: int,
+        contentFormat: str,
+        version: str,
+        # upload file parameters
+        hashType: typing.Optional[str],
+        hashDigest: typing.Optional[str],
+        fileSize: typing.Optional[int],
+        allowOverwrite: bool,
+        compressionType: typing.Optional[str] = None,
+    ) -> dict:
+        try:
+            if not PathProvider(self.cP).validateParameters(
+                repositoryType, depId, contentType, milestone, partNumber, contentFormat, version
+            ):
+                raise HTTPException(status_code=400, detail="invalid parameters")
+            if compressionType == CodecProvider.STORE:
+                compressionType = None
+            if compressionType:
+                codec = CodecProvider.getCodec(compressionType)
+                if codec is None or not codec.streamable:
+                    raise HTTPException(
+                        status_code=400, detail="error - unknown compression type"
+                    )
+            # no session is opened, the session object only forms paths
+            session = Sessions(uploadId=None, cP=self.cP, kV=False)
+            try:
+                resultPath = session.getSaveFilePath(
+                    repositoryType,
+                    depId,
+                    contentType,
+                    milestone,
+                    partNumber,
+                    contentFormat,
+                    version,
+                    allowOverwrite,
+                )
+            except FileExistsError:
+                raise HTTPException(
+                    status_code=403,
+                    detail="Encountered existing file - overwrite prohibited",
+                )
+            except ValueError:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Error - could not make file path from parameters",
+                )
+            filePath = os.path.join(self.cP.get("REPOSITORY_DIR_PATH"), resultPath)
+            dirPath, _ = os.path.split(filePath)
+            if not os.path.exists(dirPath):
+                os.makedirs(dirPath, mode=self.cP.get("DEFAULT_FILE_PERMISSIONS"), exist_ok=True)
+            session.uploadId = session.getNewUploadId()
+            # identical content already in the deposition is linked rather than written again
+            if hashType and hashDigest and await self.linkIdentical(
+                session, dirPath, resultPath, hashType, hashDigest, fileSize, allowOverwrite
+            ):
+                file.close()
+                result = self.getStoredDigest(filePath, hashType, hashDigest)
+                result["filePath"] = resultPath
+                result["satisfied"] = True
+                return result
+            session.makeTempDir(dirPath)
+            tempPath = session.getTempFilePath(dirPath)
+            # reserve disk space for the file, as getUploadParameters does for chunked uploads
+            storageProvider = StorageProvider(self.cP)
+            if fileSize and not await storageProvider.reserve(session.uploadId, fileSize):
+                raise HTTPException(
+                    status_code=507,
+                    detail="error - repository disk full, space reserved by other uploads",
+                )
+        except HTTPException:
+            file.close()
+            raise
+        try:
+            try:
+                written, digest = await Executors.runIo(
+                    self.writeChunk, file, tempPath, 0, None, compressionType, hashType
+                )
+            except OSError as exc:
+                if exc.errno in (errno.ENOSPC, errno.EDQUOT):
+                    raise HTTPException(
+                        status_code=507, detail="error - repository disk full"
+                    )
+                raise HTTPException(status_code=400, detail="error in file upload %r" % exc)
+            except Exception as exc:
+                raise HTTPException(status_code=400, detail="error in file upload %r" % exc)
+            if hashDigest and hashType:
+                if digest != hashDigest:
+                    raise HTTPException(
+                        status_code=400, detail=f"{hashType} hash comparison failed"
+                    )
+            elif fileSize:
+                if fileSize != written:
+                    raise HTTPException(
+                        status_code=400, detail="Error - file size comparison failed"
+                    )
+            else:
+                raise HTTPException(
+                    status_code=400, detail="Error - no hash or file size provided"
+                )
+            await self.saveFile(tempPath, filePath, allowOverwrite)
+            await DigestIndex(self.cP).record(filePath, hashType, digest)
+            result = self.getStoredDigest(filePath, hashType, digest)
+            result["filePath"] = resultPath
+            return result
+        finally:
+            file.close()
+            if os.path.exists(tempPath):
+                os.unlink(tempPath)
+            await storageProvider.release(session.uploadId)
+
+    # in-place chunk, chunks may arrive concurrently and in any order
     async def upload(
         self,
         # chunk parameters
-        chunk: typing.IO,
+        chunk: typing.Union[typing.IO, "RequestBody"],
         chunkSize: int,  # bytes
         chunkIndex: int,
         expectedChunks: int,
@@ -152,16 +380,26 @@ class UploadUtility(object):
         # other
         resumable: bool,
         extractChunk: bool,
+        chunkHashDigest: typing.Optional[str] = None,
+        extractStream: bool = False,
+        compressionType: typing.Optional[str] = None,
+        compressionDictionary: typing.Optional[str] = None,
     ):
-        df = ServerStatus.getServerStorage()["repository disk bytes free"]
-        if chunkIndex == 0 and fileSize and isinstance(fileSize, int) and df:
-            if fileSize >= df:
-                raise HTTPException(
-                    status_code=507, detail="error - repository disk full"
-                )
         repositoryPath = self.cP.get("REPOSITORY_DIR_PATH")
         filePath = os.path.join(repositoryPath, filePath)
         session = Sessions(uploadId=uploadId, cP=self.cP)
+        if not session.isStagedHere():
+            chunk.close()
+            raise HTTPException(
+                status_code=421, detail="error - upload is staged on another server"
+            )
+        finalizeProvider = FinalizeProvider(self.cP)
+        if finalizeProvider.isBackground(fileSize):
+            # a chunk resent after its upload went to background finalization must not recreate the temp file
+            statusD = await finalizeProvider.getStatus(uploadId)
+            if statusD:
+                chunk.close()
+                return statusD
         sessionKey = uploadId
         mapKey = None
         if resumable:
@@ -169,47 +407,434 @@ class UploadUtility(object):
                 os.path.dirname(os.path.dirname(filePath))
             )
             mapKey = session.getKvPreparedMapKey(repositoryType, filePath)
-            # on first chunk upload, set chunk size, record uid in map table
-            if chunkIndex == 0:
-                await session.setKvSession(sessionKey, "chunkSize", chunkSize)
-                await session.setKvMap(mapKey, sessionKey)
 
         # logging.info("chunk %s of %s for %s", chunkIndex, expectedChunks, uploadId)
 
         dirPath, _ = os.path.split(filePath)
         tempPath = session.getTempFilePath(dirPath)
-        if chunkIndex == 0:
-            session.makePlaceholderFile(tempPath)
-        if chunkSize and isinstance(chunkSize, int):
+        # a streamed upload stores raw chunks beside the temp file, then decompresses them into it in order
+        streamPath = session.getStreamFilePath(dirPath)
+        # once chunk 0 has preallocated the temp file its bytes are missing from the free bytes, so they are not compared again
+        preallocated = (
+            fileSize
+            and isinstance(fileSize, int)
+            and os.path.exists(tempPath)
+            and os.path.getsize(tempPath) >= fileSize
+        )
+        # cached, the file system is not asked on every chunk
+        df = None if preallocated else await StorageProvider(self.cP, kV=False).getFreeBytes()
+        if chunkIndex == 0 and fileSize and isinstance(fileSize, int) and df:
+            if fileSize >= df:
+                chunk.close()
+                raise HTTPException(
+                    status_code=507, detail="error - repository disk full"
+                )
+        # whichever chunk arrives first makes the placeholder
+        session.makePlaceholderFile(tempPath)
+        if chunkSize and isinstance(chunkSize, int) and df is not None:
             if chunkSize >= df:
                 await session.close(tempPath, resumable, mapKey)
                 raise HTTPException(
                     status_code=507, detail="error - repository disk full"
                 )
-        contents = chunk.read()
+        # a spooled chunk (multipart form), or a raw request body that has not arrived yet
+        if isinstance(chunk, RequestBody):
+            received = chunk.length
+        else:
+            received = self.getChunkLength(chunk)
         # empty chunk beyond loop index from client side, don't erase temp file so keep out of try block
-        if contents and len(contents) <= 0:
+        # only a file declared empty (file size 0) may send an empty chunk
+        if received is not None and received <= 0 and fileSize != 0:
             # outside of try block an exception will exit
             chunk.close()
             raise HTTPException(status_code=400, detail="error - empty file")
-        if extractChunk:
-            compressionType = self.cP.get("COMPRESSION_TYPE")
-            contents = await self.decompressChunk(contents, compressionType)
+        if extractChunk and extractStream:
+            chunk.close()
+            raise HTTPException(
+                status_code=400,
+                detail="error - extract chunk and extract stream are exclusive",
+            )
+        if not extractChunk:
+            # preset dictionaries apply to chunks, not streams
+            compressionDictionary = None
+        if extractChunk and compressionType == CodecProvider.STORE:
+            # chunk sent as it is (adaptive compression)
+            compressionType = None
+        elif extractChunk or extractStream:
+            # negotiated with upload parameters, or from config
+            if not compressionType:
+                compressionType = self.cP.get("COMPRESSION_TYPE")
+            if compressionDictionary:
+                await Executors.runIo(
+                    DictionaryProvider(self.cP).loadDictionary, compressionDictionary
+                )
+            codec = CodecProvider.getCodec(compressionType, compressionDictionary)
+            if codec is None and compressionDictionary:
+                chunk.close()
+                raise HTTPException(
+                    status_code=400,
+                    detail="error - unknown compression dictionary %s for %s"
+                    % (compressionDictionary, compressionType),
+                )
+            elif codec is None:
+                chunk.close()
+                raise HTTPException(
+                    status_code=400, detail="error - unknown compression type"
+                )
+            elif not codec.streamable:
+                chunk.close()
+                raise HTTPException(
+                    status_code=400,
+                    detail="error - cannot extract chunks with zip file compression",
+                )
+        else:
+            compressionType = None
+        # an uploaded gzip, bzip2, xz, zstd, or lz4 file is decompressed as its chunks arrive, rather than after the last chunk
+        # its hash digest (and file size) still refers to the compressed file
+        decompressType = None
+        if decompress and fileExtension and not extractChunk and not extractStream:
+            decompressType = self.getStreamCompressionType(fileExtension)
+            if decompressType:
+                extractStream = True
+                compressionType = decompressType
+        # save, then compare hash or file size, then decompress
+        # chunks write to disjoint extents of the temp file, so concurrent chunks need no lock
+        offset = None
+        if chunkSize and isinstance(chunkSize, int):
+            offset = chunkIndex * chunkSize
+        try:
+            if isinstance(chunk, RequestBody):
+                # written as the body arrives
+                written, digest = await self.writeBody(
+                    chunk,
+                    streamPath if extractStream else tempPath,
+                    offset,
+                    fileSize,
+                    compressionType if extractChunk else None,
+                    hashType if chunkHashDigest else None,
+                    compressionDictionary,
+                )
+            else:
+                # stream from the spooled request body into the temp file without holding the chunk in memory
+                written, digest = await Executors.runIo(
+                    self.writeChunk,
+                    chunk,
+                    streamPath if extractStream else tempPath,
+                    offset,
+                    fileSize,
+                    compressionType if extractChunk else None,
+                    hashType if chunkHashDigest else None,
+                    compressionDictionary,
+                )
+        except HTTPException:
+            # body cut short, keep the session so that the client can retransmit the chunk
+            raise
+        except OSError as exc:
+            await session.close(tempPath, resumable, mapKey)
+            if exc.errno in (errno.ENOSPC, errno.EDQUOT):
+                # preallocation (or a write) found no room for the file
+                raise HTTPException(
+                    status_code=507, detail="error - repository disk full"
+                )
+            raise HTTPException(
+                status_code=400, detail=f"error in sequential upload {str(exc)}"
+            )
+        except Exception as exc:
+            await session.close(tempPath, resumable, mapKey)
+            raise HTTPException(
+                status_code=400, detail=f"error in sequential upload {str(exc)}"
+            )
+        finally:
+            chunk.close()
+        if not preallocated and offset == 0 and fileSize and isinstance(fileSize, int):
+            # chunk 0 preallocated the temp file, whose bytes are now missing from the free bytes rather than reserved
+            allocated = await Executors.runIo(session.getTempAllocatedBytes, dirPath)
+            await StorageProvider(self.cP).shrink(uploadId, fileSize, allocated)
+        if extractChunk and received is not None:
+            ServerStatus.addChunkBytes(received, written, compressionType is None)
+        if chunkHashDigest and digest != chunkHashDigest:
+            # the chunk was written over whatever was received before at its offset
+            await session.clearKvChunk(chunkIndex)
+            # keep the session so that the client can retransmit the chunk
+            raise HTTPException(
+                status_code=400, detail=f"{hashType} chunk hash comparison failed"
+            )
+        try:
+            await session.setKvChunkSize(chunkIndex, written)
+            if chunkHashDigest:
+                await session.setKvChunkDigest(chunkIndex, digest)
+            # record chunk in bitmap, a retransmitted chunk is not counted twice
+            isNew, received = await session.setKvChunk(chunkIndex)
+            if resumable and isNew and received == 1:
+                # on first chunk received, set chunk size, record uid in map table
+                await session.setKvSessionAndMap(sessionKey, "chunkSize", chunkSize, mapKey)
+            if extractStream:
+                # decompress whatever is now contiguous, the request that reaches the end of the stream saves the file
+                complete, streamDigest, inputDigest = await self.advanceStream(
+                    session,
+                    tempPath,
+                    streamPath,
+                    compressionType,
+                    chunkSize,
+                    expectedChunks,
+                    hashType,
+                )
+                if complete:
+                    # hash digest refers to the decompressed content (or to the compressed file when decompressing)
+                    # both were digested as they were written
+                    if hashDigest and hashType:
+                        expectedDigest = inputDigest if decompressType else streamDigest
+                        if expectedDigest != hashDigest:
+                            raise HTTPException(
+                                status_code=400,
+                                detail=f"{hashType} hash comparison failed",
+                            )
+                    elif fileSize:
+                        # the side file was preallocated to the file size, so its size is not compared
+                        if fileSize != await session.getKvReceivedBytes(expectedChunks):
+                            raise HTTPException(
+                                status_code=400,
+                                detail="Error - file size comparison failed",
+                            )
+                    else:
+                        raise HTTPException(
+                            status_code=400,
+                            detail="Error - no hash or file size provided",
+                        )
+                    await self.saveFile(tempPath, filePath, allowOverwrite)
+                    # clear database and temp files
+                    await session.close(tempPath, resumable, mapKey)
+                    await DigestIndex(self.cP).record(filePath, hashType, streamDigest)
+                    return self.getStoredDigest(filePath, hashType, streamDigest)
+            # if last chunk received (only one request can complete the bitmap)
+            elif isNew and received == expectedChunks:
+                finalize = self.finalize(
+                    session,
+                    tempPath,
+                    filePath,
+                    expectedChunks,
+                    hashType,
+                    hashDigest,
+                    fileSize,
+                    fileExtension,
+                    decompress,
+                    allowOverwrite,
+                    resumable,
+                    mapKey,
+                )
+                if finalizeProvider.isBackground(fileSize):
+                    # responds 202 at once, the client polls the status of the job
+                    return await finalizeProvider.start(
+                        uploadId,
+                        self.finalizeInBackground(finalize, session, tempPath, resumable, mapKey),
+                    )
+                return await finalize
+            elif received == expectedChunks and finalizeProvider.isBackground(fileSize):
+                # a chunk resent just as its upload went to background finalization
+                statusD = await finalizeProvider.getStatus(uploadId)
+                if statusD:
+                    return statusD
+        except HTTPException as exc:
+            await session.close(tempPath, resumable, mapKey)
+            raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+        except Exception as exc:
+            await session.close(tempPath, resumable, mapKey)
+            raise HTTPException(
+                status_code=400, detail=f"error in sequential upload {str(exc)}"
+            )
+
+    async def getDeltaSignatures(
+        self,
+        repositoryType: str,
+        depId: str,
+        contentType: str,
+        milestone: typing.Optional[str],
+        partNumber: int,
+        contentFormat: str,
+    ) -> dict:
+        # block signatures of the latest version, against which the next version may be sent as a delta
+        pP = PathProvider(self.cP)
+        if not pP.validateParameters(
+            repositoryType, depId, contentType, milestone, partNumber, contentFormat, "latest"
+        ):
+            raise HTTPException(status_code=400, detail="invalid parameters")
+        basePath = pP.getVersionedPath(
+            repositoryType, depId, contentType, milestone, partNumber, contentFormat, "latest"
+        )
+        if not basePath or not os.path.exists(basePath):
+            raise HTTPException(status_code=404, detail="error - no previous version")
+        signatureD = await Executors.runCpu(DeltaProvider.getSignatures, basePath)
+        # relative path, as returned with upload parameters
+        signatureD["filePath"] = os.path.relpath(basePath, self.cP.get("REPOSITORY_DIR_PATH"))
+        return signatureD
+
+    async def finalize(
+        self,
+        session: Sessions,
+        tempPath: str,
+        filePath: str,
+        expectedChunks: int,
+        hashType: str,
+        hashDigest: str,
+        fileSize: int,
+        fileExtension: str,
+        decompress: bool,
+        allowOverwrite: bool,
+        resumable: bool,
+        mapKey: typing.Optional[str],
+    ) -> dict:
+        # compare hash or file size of the completed temp file, decompress (zip), save, then close the session
+        # in the last request, or as a background job (the caller closes the session on error)
+        finalizeProvider = FinalizeProvider(self.cP)
+        jobId = session.uploadId if finalizeProvider.isBackground(fileSize) else None
+        # need not lock temp file (verifying)
+        storedDigest = None
+        # digest of the saved content, for the digest index
+        indexDigest = None
+        if await session.getKvChunkDigests(expectedChunks):
+            # every chunk matched its client digest on arrival, so the file need not be read again
+            # the temp file was preallocated to the file size, so its size is not compared
+            if fileSize and fileSize != await session.getKvReceivedBytes(expectedChunks):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Error - file size comparison failed",
+                )
+            if fileSize and hashDigest and hashType:
+                # every byte of the file matched the digests the client took of its chunks, so it holds what the client digested whole
+                storedDigest = hashDigest
+                indexDigest = hashDigest
+        elif hashDigest and hashType:
+            if not await IoUtility().checkHashAsync(
+                tempPath, hashDigest, hashType
+            ):
+                raise HTTPException(
+                    status_code=400, detail=f"{hashType} hash comparison failed"
+                )
+            storedDigest = hashDigest
+            indexDigest = hashDigest
+        elif fileSize:
+            if fileSize != await session.getKvReceivedBytes(expectedChunks):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Error - file size comparison failed",
+                )
+        else:
+            raise HTTPException(
+                status_code=400, detail="Error - no hash or file size provided"
+            )
+        if decompress and fileExtension:
+            await finalizeProvider.setPhase(jobId, "decompressing")
+            # not streamable (zip) - decompress the temp file before taking the lock on the target
+            await self.decompressFile(tempPath, fileExtension)
+            storedDigest = None
+            indexDigest = None
+            if not os.path.exists(tempPath):
+                compressedPath = tempPath + "." + fileExtension.lstrip(".")
+                if os.path.exists(compressedPath):
+                    os.unlink(compressedPath)
+                raise HTTPException(
+                    status_code=400, detail="error - decompression failed"
+                )
+        await finalizeProvider.setPhase(jobId, "saving")
+        await self.saveFile(tempPath, filePath, allowOverwrite)
+        # clear database and temp files
+        await session.close(tempPath, resumable, mapKey)
+        await DigestIndex(self.cP).record(filePath, hashType, indexDigest)
+        return self.getStoredDigest(filePath, hashType, storedDigest)
+
+    async def finalizeInBackground(
+        self,
+        finalize: typing.Awaitable[dict],
+        session: Sessions,
+        tempPath: str,
+        resumable: bool,
+        mapKey: typing.Optional[str],
+    ) -> dict:
+        # no request remains to close the session of a failed job
+        try:
+            return await finalize
+        except Exception:
+            await session.close(tempPath, resumable, mapKey)
+            raise
+
+    # delta chunk, the delta is assembled with the previous version once every chunk has arrived
+    async def uploadDelta(
+        self,
+        # chunk parameters
+        chunk: typing.IO,
+        chunkSize: int,  # bytes
+        chunkIndex: int,
+        expectedChunks: int,
+        # upload file parameters
+        uploadId: str,
+        hashType: str,
+        hashDigest: str,
+        # save file parameters
+        filePath: str,
+        fileSize: int,  # bytes of the new version
+        baseFilePath: str,
+        blockSize: int,
+        allowOverwrite: bool,
+        # other
+        resumable: bool,
+    ):
+        repositoryPath = self.cP.get("REPOSITORY_DIR_PATH")
+        filePath = os.path.join(repositoryPath, filePath)
+        basePath = os.path.normpath(os.path.join(repositoryPath, baseFilePath))
+        dirPath, _ = os.path.split(filePath)
+        # the previous version is in the same deposition directory
+        if os.path.dirname(basePath) != os.path.normpath(dirPath) or not os.path.isfile(basePath):
+            chunk.close()
+            raise HTTPException(status_code=400, detail="error - invalid base file path")
+        if not blockSize or blockSize <= 0:
+            chunk.close()
+            raise HTTPException(status_code=400, detail="error - invalid block size")
+        session = Sessions(uploadId=uploadId, cP=self.cP)
+        if not session.isStagedHere():
+            chunk.close()
+            raise HTTPException(
+                status_code=421, detail="error - upload is staged on another server"
+            )
+        sessionKey = uploadId
+        mapKey = None
+        if resumable:
+            repositoryType = os.path.basename(os.path.dirname(dirPath))
+            mapKey = session.getKvPreparedMapKey(repositoryType, filePath)
+        tempPath = session.getTempFilePath(dirPath)
+        # the delta is stored beside the temp file, as is a compressed stream
+        deltaPath = session.getStreamFilePath(dirPath)
+        session.makePlaceholderFile(tempPath)
+        offset = None
+        if chunkSize and isinstance(chunkSize, int):
+            offset = chunkIndex * chunkSize
+        try:
+            await Executors.runIo(self.writeChunk, chunk, deltaPath, offset)
+        except OSError as exc:
+            await session.close(tempPath, resumable, mapKey)
+            if exc.errno in (errno.ENOSPC, errno.EDQUOT):
+                raise HTTPException(
+                    status_code=507, detail="error - repository disk full"
+                )
+            raise HTTPException(
+                status_code=400, detail=f"error in delta upload {str(exc)}"
+            )
+        finally:
+            chunk.close()
         try:
-            # save, then compare hash or file size, then decompress
-            # should lock, however client must wait for each response before sending next chunk, precluding race conditions (unless multifile upload problem)
-            async with aiofiles.open(tempPath, "ab") as ofh:
-                await ofh.write(contents)
-            # if last chunk
-            if chunkIndex + 1 == expectedChunks:
-                # need not lock temp file
+            isNew, received = await session.setKvChunk(chunkIndex)
+            if resumable and isNew and received == 1:
+                await session.setKvSessionAndMap(sessionKey, "chunkSize", chunkSize, mapKey)
+            if isNew and received == expectedChunks:
+                written, digest = await Executors.runIo(
+                    DeltaProvider.applyDelta, basePath, deltaPath, tempPath, blockSize, hashType
+                )
                 if hashDigest and hashType:
-                    if not IoUtility().checkHash(tempPath, hashDigest, hashType):
+                    if digest != hashDigest:
                         raise HTTPException(
                             status_code=400, detail=f"{hashType} hash comparison failed"
                         )
                 elif fileSize:
-                    if fileSize != os.path.getsize(tempPath):
+                    if fileSize != written:
                         raise HTTPException(
                             status_code=400,
                             detail="Error - file size comparison failed",
@@ -218,39 +843,583 @@ class UploadUtility(object):
                     raise HTTPException(
                         status_code=400, detail="Error - no hash or file size provided"
                     )
-                # last minute race condition handling
-                if os.path.exists(filePath) and not allowOverwrite:
-                    raise HTTPException(
-                        status_code=403,
-                        detail="Encountered existing file - cannot overwrite",
-                    )
-                # lock target file (though it might not exist) then save
-                try:
-                    async with Locking(filePath, "w"):
-                        # save final version
-                        os.replace(tempPath, filePath)
-                        # decompress
-                        if decompress and fileExtension:
-                            await self.decompressFile(filePath, fileExtension)
-                        # change permissions
-                        default_file_permissions = self.cP.get("DEFAULT_FILE_PERMISSIONS")
-                        os.chmod(filePath, default_file_permissions)
-                except (FileExistsError, OSError) as err:
-                    raise HTTPException(status_code=400, detail="error %r" % err)
+                await self.saveFile(tempPath, filePath, allowOverwrite)
                 # clear database and temp files
                 await session.close(tempPath, resumable, mapKey)
+                await DigestIndex(self.cP).record(filePath, hashType, digest)
+                return self.getStoredDigest(filePath, hashType, digest)
         except HTTPException as exc:
             await session.close(tempPath, resumable, mapKey)
             raise HTTPException(status_code=exc.status_code, detail=exc.detail)
         except Exception as exc:
             await session.close(tempPath, resumable, mapKey)
             raise HTTPException(
-                status_code=400, detail=f"error in sequential upload {str(exc)}"
+                status_code=400, detail=f"error in delta upload {str(exc)}"
             )
+
+    async def uploadBundle(
+        self,
+        stream: typing.AsyncIterator[bytes],
+        repositoryType: str,
+        depId: str,
+        hashType: typing.Optional[str] = None,
+        allowOverwrite: bool = False,
+    ) -> dict:
+        """
+
+        Args:
+            stream: request body, a tar with a manifest of target descriptors (BundleProvider)
+            repositoryType: repository type of every file of the bundle
+            depId: deposition id of every file of the bundle
+            hashType: hash type of the manifest digests (MD5, SHA1, or SHA256)
+            allowOverwrite: whether a file may replace an existing file
+
+        Returns:
+            stored file path and digest of each file, in manifest order
+
+        members are written to temp files as the body arrives, then all are saved under one lock on the deposition directory
+        if any file fails its hash or file size comparison, or its path is not allowed, none is saved
+        """
+        pP = PathProvider(self.cP)
+        dirPath = pP.getDirPath(repositoryType, depId)
+        if not dirPath:
+            raise HTTPException(status_code=400, detail="invalid parameters")
+        if not os.path.exists(dirPath):
+            os.makedirs(dirPath, mode=self.cP.get("DEFAULT_FILE_PERMISSIONS"), exist_ok=True)
+        session = Sessions(uploadId=None, cP=self.cP, kV=False)
+        session.uploadId = session.getNewUploadId()
+        session.makeTempDir(dirPath)
+        tempPrefix = session.getTempFilePath(dirPath)
+        # members staged on other storage are published beside their targets before the lock is taken
+        publishPrefix = os.path.join(dirPath, os.path.basename(tempPrefix))
+        session.makePlaceholderFile(tempPrefix)
+        reader = BundleReader()
+        # the tar reader holds one io worker until the body ends
+        unpack = asyncio.ensure_future(
+            Executors.runIo(self.__readBundle, reader, tempPrefix, hashType)
+        )
+        try:
+            try:
+                async for data in stream:
+                    if data and not await Executors.runIo(reader.feed, data):
+                        break
+            finally:
+                await Executors.runIo(reader.feed, None)
+            try:
+                manifest, entries = await unpack
+            except Exception as exc:
+                raise HTTPException(status_code=400, detail="error in bundle %s" % str(exc))
+            for descriptor, entry in zip(manifest, entries):
+                if not isinstance(descriptor, dict) or not pP.validateParameters(
+                    repositoryType,
+                    depId,
+                    descriptor.get("contentType"),
+                    descriptor.get("milestone"),
+                    descriptor.get("partNumber"),
+                    descriptor.get("contentFormat"),
+                    descriptor.get("version", "next"),
+                ):
+                    raise HTTPException(status_code=400, detail="invalid parameters %r" % descriptor)
+                if hashType and descriptor.get("hashDigest"):
+                    if descriptor["hashDigest"] != entry["hashDigest"]:
+                        raise HTTPException(
+                            status_code=400, detail=f"{hashType} hash comparison failed"
+                        )
+                elif descriptor.get("fileSize") is not None:
+                    if int(descriptor["fileSize"]) != entry["fileSize"]:
+                        raise HTTPException(
+                            status_code=400, detail="Error - file size comparison failed"
+                        )
+                else:
+                    raise HTTPException(
+                        status_code=400, detail="Error - no hash or file size provided"
+                    )
+            for entry in entries:
+                entry["tempPath"] = await Executors.runIo(
+                    StagingProvider.publishFile, entry["tempPath"], dirPath
+                )
+            # one lock for the whole bundle, versions are resolved under it
+            async with Locking(dirPath, "w", is_dir=True):
+                filePaths = []
+                for descriptor in manifest:
+                    filePath = pP.getVersionedPath(
+                        repositoryType,
+                        depId,
+                        descriptor.get("contentType"),
+                        descriptor.get("milestone"),
+                        descriptor.get("partNumber"),
+                        descriptor.get("contentFormat"),
+                        descriptor.get("version", "next"),
+                    )
+                    if not filePath or filePath in filePaths:
+                        raise HTTPException(
+                            status_code=400,
+                            detail="Error - could not make file path from parameters %r" % descriptor,
+                        )
+                    if os.path.exists(filePath) and not allowOverwrite:
+                        raise HTTPException(
+                            status_code=403,
+                            detail="Encountered existing file - overwrite prohibited",
+                        )
+                    filePaths.append(filePath)
+                defaultFilePermissions = self.cP.get("DEFAULT_FILE_PERMISSIONS")
+                for filePath, entry in zip(filePaths, entries):
+                    os.replace(entry["tempPath"], filePath)
+                    os.chmod(filePath, defaultFilePermissions)
+            files = []
+            for filePath, entry in zip(filePaths, entries):
+                await DigestIndex(self.cP).record(filePath, hashType, entry["hashDigest"])
+                files.append(
+                    {
+                        "filePath": os.path.relpath(filePath, self.cP.get("REPOSITORY_DIR_PATH")),
+                        "hashType": hashType if entry["hashDigest"] else None,
+                        "hashDigest": entry["hashDigest"],
+                    }
+                )
+            return {"files": files}
+        except OSError as exc:
+            raise HTTPException(status_code=400, detail="error %r" % exc)
         finally:
-            chunk.close()
+            reader.close()
+            # the tar reader stops at the end of the body, its temp files are removed after
+            await asyncio.gather(unpack, return_exceptions=True)
+            for prefix in {tempPrefix, publishPrefix}:
+                for tempPath in glob.glob(glob.escape(prefix) + ".*"):
+                    os.unlink(tempPath)
+            session.removePlaceholderFile(tempPrefix)
+
+    def __readBundle(
+        self, reader: BundleReader, tempPrefix: str, hashType: typing.Optional[str]
+    ) -> typing.Tuple[typing.List[dict], typing.List[dict]]:
+        try:
+            return BundleProvider.readBundle(reader, tempPrefix, hashType)
+        finally:
+            # a feeder waiting on the reader gives up
+            reader.close()
+
+    async def saveFile(self, tempPath: str, filePath: str, allowOverwrite: bool):
+        # move completed (and decompressed) temp file to its repository path
+        # last minute race condition handling
+        if os.path.exists(filePath) and not allowOverwrite:
+            raise HTTPException(
+                status_code=403,
+                detail="Encountered existing file - cannot overwrite",
+            )
+        publishPath = tempPath
+        # lock target file (though it might not exist) then save
+        try:
+            # a staged temp file is first copied beside the target (without the lock), so that the save is still a rename
+            publishPath = await Executors.runIo(
+                StagingProvider.publishFile, tempPath, os.path.dirname(filePath)
+            )
+            async with Locking(filePath, "w"):
+                # save final version (atomic, so the exclusive lock is held only briefly)
+                os.replace(publishPath, filePath)
+                # change permissions
+                default_file_permissions = self.cP.get("DEFAULT_FILE_PERMISSIONS")
+                os.chmod(filePath, default_file_permissions)
+        except (FileExistsError, OSError) as err:
+            if err.errno in (errno.ENOSPC, errno.EDQUOT):
+                raise HTTPException(
+                    status_code=507, detail="error - repository disk full"
+                )
+            raise HTTPException(status_code=400, detail="error %r" % err)
+        finally:
+            # callers remove the staged temp file
+            if publishPath != tempPath and os.path.exists(publishPath):
+                os.unlink(publishPath)
+
+    def getStreamCompressionType(self, fileExtension: str) -> typing.Optional[str]:
+        # compression type of a file extension that can be decompressed as a stream (not zip)
+        codec = CodecProvider.getCodecByExtension(fileExtension)
+        return codec.name if codec and codec.streamable else None
+
+    def getStoredDigest(
+        self, filePath: str, hashType: typing.Optional[str], digest: typing.Optional[str]
+    ) -> dict:
+        # record digest of the stored content, when known without reading the file again
+        if digest:
+            logging.info("saved %s %s %s", filePath, hashType, digest)
+        return {"hashType": hashType if digest else None, "hashDigest": digest}
+
+    async def advanceStream(
+        self,
+        session: Sessions,
+        tempPath: str,
+        streamPath: str,
+        compressionType: str,
+        chunkSize: int,
+        expectedChunks: int,
+        hashType: typing.Optional[str] = None,
+    ) -> typing.Tuple[bool, typing.Optional[str], typing.Optional[str]]:
+        """
+
+        Args:
+            session: session of the streamed upload
+            tempPath: temp file receiving the decompressed content
+            streamPath: side file holding raw compressed chunks at their offsets
+            compressionType: streamable compression type (gzip, bzip2, lzma, zstd, or lz4)
+            chunkSize: bytes per chunk of the compressed stream
+            expectedChunks: chunks in the compressed stream
+            hashType: digest the decompressed content (MD5, SHA1, or SHA256)
+
+        Returns:
+            whether this request completed the stream, digests of decompressed content and of compressed stream (if completed)
+
+        decompresses in chunk order, so only one request at a time may advance the stream
+        a request that cannot claim the stream returns at once, the claim holder picks up its chunk
+        """
+        while True:
+            token = await session.claimKvStream()
+            if not token:
+                return False, None, None
+            try:
+                status = await session.getKvSessionDict()
+                nextChunk = int(status.get("streamChunk", 0))
+                outOffset = int(status.get("streamOffset", 0))
+                bitmap = int(str(status.get("bitmap", "0")), 16)
+                endChunk = nextChunk
+                while endChunk < expectedChunks and bitmap & (1 << endChunk):
+                    endChunk += 1
+                # one chunk per renewal of the claim, so that a long run does not outlive it
+                for chunkIndex in range(nextChunk, endChunk):
+                    outOffset, digest, inputDigest = await Executors.runIo(
+                        self.inflateStream,
+                        session.uploadId,
+                        tempPath,
+                        streamPath,
+                        compressionType,
+                        chunkSize,
+                        chunkIndex,
+                        chunkIndex + 1,
+                        outOffset,
+                        chunkIndex + 1 == expectedChunks,
+                        hashType,
+                    )
+                    token = await session.renewKvStream(token)
+                    if not token:
+                        # the claim lapsed and was taken, the new holder resumes from the position in the session
+                        return False, None, None
+                    await session.setKvSession(session.uploadId, "streamChunk", chunkIndex + 1)
+                    await session.setKvSession(session.uploadId, "streamOffset", outOffset)
+                    if chunkIndex + 1 == expectedChunks:
+                        return True, digest, inputDigest
+            finally:
+                if token:
+                    await session.releaseKvStream(token)
+            # a chunk that arrived while the stream was claimed
+            if endChunk >= expectedChunks:
+                return False, None, None
+            if not await session.getKvBitmap() & (1 << endChunk):
+                return False, None, None
+
+    def inflateStream(
+        self,
+        uploadId: str,
+        tempPath: str,
+        streamPath: str,
+        compressionType: str,
+        chunkSize: int,
+        firstChunk: int,
+        endChunk: int,
+        outOffset: int,
+        final: bool,
+        hashType: typing.Optional[str] = None,
+        blockSize: int = 1048576,
+    ) -> typing.Tuple[int, typing.Optional[str], typing.Optional[str]]:
+        """
+
+        Args:
+            uploadId: upload id (key of the decompressor state of this process)
+            tempPath: temp file receiving the decompressed content
+            streamPath: side file holding raw compressed chunks at their offsets
+            compressionType: streamable compression type (gzip, bzip2, lzma, zstd, or lz4)
+            chunkSize: bytes per chunk of the compressed stream
+            firstChunk: first chunk to decompress (all before it are already decompressed)
+            endChunk: chunk after the last to decompress
+            outOffset: bytes already decompressed into the temp file (from the session)
+            final: end chunk is the end of the stream
+            hashType: digest the decompressed content and the compressed stream (MD5, SHA1, or SHA256)
+            blockSize: bound on the bytes held in memory at one time
+
+        Returns:
+            bytes decompressed into the temp file, digests of decompressed content and of compressed stream (if final)
+
+        decompressor state cannot be serialized, so it is kept in this process between requests
+        if another process advanced the stream, the state catches up by replaying the side file without writing
+        """
+        state = self.__getStreamState(uploadId, compressionType, hashType, firstChunk)
+        with state["lock"]:
+            fdIn = os.open(streamPath, os.O_RDONLY)
+            fdOut = os.open(tempPath, os.O_WRONLY | os.O_CREAT, 0o666)
+            try:
+                if state["chunk"] < firstChunk:
+                    self.__feedStream(
+                        state, fdIn, None, state["chunk"] * chunkSize, firstChunk * chunkSize, blockSize
+                    )
+                    state["chunk"] = firstChunk
+                if state["offset"] != outOffset:
+                    raise ValueError("error - stream state does not match session")
+                end = os.fstat(fdIn).st_size
+                if not final:
+                    end = min(end, endChunk * chunkSize)
+                self.__feedStream(state, fdIn, fdOut, firstChunk * chunkSize, end, blockSize)
+                state["chunk"] = endChunk
+                if not final:
+                    return state["offset"], None, None
+                decompressor = state["decompressor"]
+                if decompressor is None or not decompressor.eof:
+                    raise ValueError("error - compressed stream is incomplete")
+                digest = state["hash"].hexdigest() if state["hash"] else None
+                inputDigest = state["inputHash"].hexdigest() if state["inputHash"] else None
+                self.dropStreamState(uploadId)
+                return state["offset"], digest, inputDigest
+            except Exception:
+                self.dropStreamState(uploadId)
+                raise
+            finally:
+                os.close(fdIn)
+                os.close(fdOut)
+
+    def dropStreamState(self, uploadId: str):
+        with UploadUtility.__streamLock:
+            UploadUtility.__streams.pop(uploadId, None)
+
+    def __getStreamState(
+        self, uploadId: str, compressionType: str, hashType: typing.Optional[str], firstChunk: int
+    ) -> dict:
+        now = time.time()
+        with UploadUtility.__streamLock:
+            state = UploadUtility.__streams.get(uploadId)
+            if (
+                state is None
+                or state["chunk"] > firstChunk
+                or state["compressionType"] != compressionType
+            ):
+                # no state in this process, or state is ahead of the session - start from the beginning
+                state = {
+                    "compressionType": compressionType,
+                    "decompressor": None,
+                    "hash": IoUtility.getHashObject(hashType) if hashType else None,
+                    "inputHash": IoUtility.getHashObject(hashType) if hashType else None,
+                    "chunk": 0,
+                    "offset": 0,
+                    "lock": threading.Lock(),
+                }
+                UploadUtility.__streams[uploadId] = state
+                # forget streams of abandoned uploads
+                maxSeconds = self.cP.get("KV_MAX_SECONDS") or 14400
+                for key in list(UploadUtility.__streams):
+                    if now - UploadUtility.__streams[key].get("time", now) > float(maxSeconds):
+                        del UploadUtility.__streams[key]
+            state["time"] = now
+            return state
+
+    def __feedStream(
+        self, state: dict, fdIn: int, fdOut: typing.Optional[int], start: int, end: int, blockSize: int
+    ):
+        # decompress side file bytes from start to end, write at the state offset unless no output file
+        codec = CodecProvider.getCodec(state["compressionType"])
+        position = start
+        while position < end:
+            block = os.pread(fdIn, min(blockSize, end - position), position)
+            if not block:
+                raise ValueError("error - compressed stream is shorter than expected")
+            position += len(block)
+            if state["inputHash"]:
+                state["inputHash"].update(block)
+            while block:
+                if state["decompressor"] is None or state["decompressor"].eof:
+                    # start of stream, or next member of a multi-member stream
+                    state["decompressor"] = codec.getDecompressor()
+                decompressor = state["decompressor"]
+                for data in codec.inflate(decompressor, block, blockSize):
+                    if fdOut is not None:
+                        ChunkWriter.pwrite(fdOut, data, state["offset"])
+                    state["offset"] += len(data)
+                    if state["hash"]:
+                        state["hash"].update(data)
+                block = decompressor.unused_data if decompressor.eof else b""
+
+    def getChunkLength(self, chunk: typing.IO) -> int:
+        # size of the spooled chunk without reading it
+        position = chunk.tell()
+        length = chunk.seek(0, os.SEEK_END) - position
+        chunk.seek(position)
+        return length
+
+    def writeChunk(
+        self,
+        chunk: typing.IO,
+        tempPath: str,
+        offset: typing.Optional[int] = None,
+        fileSize: typing.Optional[int] = None,
+        compressionType: typing.Optional[str] = None,
+        hashType: typing.Optional[str] = None,
+        dictionaryId: typing.Optional[str] = None,
+        blockSize: int = 1048576,
+    ) -> typing.Tuple[int, typing.Optional[str]]:
+        """
+
+        Args:
+            chunk: spooled chunk from the request body
+            tempPath: temp file that the chunk is written into
+            offset: position of the chunk in the temp file (None to append)
+            fileSize: size of the complete file, temp file is preallocated (chunk 0) or extended to this size on first write
+            compressionType: decompress the chunk on the way in (streamable compression type)
+            hashType: digest the chunk as written (MD5, SHA1, or SHA256)
+            dictionaryId: preset dictionary of the compression (zlib only)
+            blockSize: bound on the bytes held in memory at one time
+
+        Returns:
+            number of bytes written to the temp file, digest of the bytes written (None without hash type)
+
+        raises OSError (ENOSPC) if the file system cannot hold the file
+        """
+        writer = self.openChunk(
+            tempPath, offset, fileSize, compressionType, hashType, dictionaryId, blockSize
+        )
+        try:
+            # copy within the kernel when the spooled chunk has rolled over to disk (and need not be decompressed or digested)
+            srcFd = (
+                self.__getFileno(chunk) if not compressionType and not hashType else None
+            )
+            if srcFd is not None:
+                srcOffset = chunk.tell()
+                try:
+                    while copied := os.copy_file_range(
+                        srcFd, writer.fd, blockSize, srcOffset, writer.offset
+                    ):
+                        srcOffset += copied
+                        writer.offset += copied
+                    chunk.seek(srcOffset)
+                    return writer.close()
+                except (AttributeError, OSError):
+                    # copy_file_range unavailable (platform, kernel, or cross-device), fall back to buffered copy
+                    chunk.seek(srcOffset)
+            while block := chunk.read(blockSize):
+                writer.write(block)
+            return writer.close()
+        finally:
+            writer.close()
+
+    async def writeBody(
+        self,
+        body: "RequestBody",
+        tempPath: str,
+        offset: typing.Optional[int] = None,
+        fileSize: typing.Optional[int] = None,
+        compressionType: typing.Optional[str] = None,
+        hashType: typing.Optional[str] = None,
+        dictionaryId: typing.Optional[str] = None,
+        blockSize: int = 1048576,
+    ) -> typing.Tuple[int, typing.Optional[str]]:
+        # as write chunk, for a raw request body written as it arrives
+        # blocks are gathered on the event loop, so an io worker is held only while a block is written, not while the network is read
+        writer = await Executors.runIo(
+            self.openChunk, tempPath, offset, fileSize, compressionType, hashType, dictionaryId, blockSize
+        )
+        try:
+            received = 0
+            blocks = []
+            pending = 0
+            stream = body.stream.__aiter__()
+            while True:
+                try:
+                    data = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception as exc:
+                    # client disconnected
+                    raise HTTPException(
+                        status_code=400, detail="error - incomplete chunk body %r" % exc
+                    )
+                received += len(data)
+                blocks.append(data)
+                pending += len(data)
+                if pending >= blockSize:
+                    await Executors.runIo(writer.write, b"".join(blocks))
+                    blocks = []
+                    pending = 0
+            if blocks:
+                await Executors.runIo(writer.write, b"".join(blocks))
+            if body.length is not None and received != body.length:
+                raise HTTPException(
+                    status_code=400,
+                    detail="error - incomplete chunk body (%d of %d bytes)" % (received, body.length),
+                )
+            return writer.close()
+        finally:
+            writer.close()
+
+    def openChunk(
+        self,
+        tempPath: str,
+        offset: typing.Optional[int] = None,
+        fileSize: typing.Optional[int] = None,
+        compressionType: typing.Optional[str] = None,
+        hashType: typing.Optional[str] = None,
+        dictionaryId: typing.Optional[str] = None,
+        blockSize: int = 1048576,
+    ) -> "ChunkWriter":
+        # open the temp file for a chunk at its offset (None to append)
+        fd = os.open(tempPath, os.O_WRONLY | os.O_CREAT, 0o666)
+        try:
+            if offset is None:
+                offset = os.fstat(fd).st_size
+            elif fileSize and isinstance(fileSize, int):
+                # extend (never truncate) so chunks can land in any order
+                if os.fstat(fd).st_size < fileSize:
+                    if offset == 0:
+                        self.preallocate(fd, fileSize)
+                    else:
+                        os.ftruncate(fd, fileSize)
+            codec = None
+            if compressionType:
+                codec = CodecProvider.getCodec(compressionType, dictionaryId)
+            return ChunkWriter(
+                fd,
+                offset,
+                codec,
+                IoUtility.getHashObject(hashType) if hashType else None,
+                blockSize,
+            )
+        except BaseException:
+            os.close(fd)
+            raise
+
+    def preallocate(self, fd: int, fileSize: int):
+        # reserve the extent of the whole file, chunks are then written into it rather than growing the file
+        # a full disk is found before any chunk is written, rather than mid-upload
+        # the client sends chunk 0 before the others, since posix_fallocate may write into blocks on file systems without native support
+        try:
+            os.posix_fallocate(fd, 0, fileSize)
+        except AttributeError:
+            # no posix_fallocate (macOS)
+            os.ftruncate(fd, fileSize)
+        except OSError as exc:
+            if exc.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            # file system cannot preallocate, extend the file (sparse) instead
+            os.ftruncate(fd, fileSize)
+
+    def __getFileno(self, fh: typing.IO) -> typing.Optional[int]:
+        # requesting fileno from an in-memory spooled file would force it to disk
+        if isinstance(fh, tempfile.SpooledTemporaryFile) and not fh._rolled:  # pylint: disable=W0212
+            return None
+        try:
+            return fh.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return None
 
     async def decompressFile(self, inputFilePath: str, fileExtension: str) -> str:
+        # decompress in the process pool rather than on the event loop
+        return await Executors.runCpu(
+            UploadUtility.decompressFilePath, inputFilePath, fileExtension
+        )
+
+    @staticmethod
+    def decompressFilePath(inputFilePath: str, fileExtension: str) -> str:
         """
 
         Args:
@@ -265,42 +1434,18 @@ class UploadUtility(object):
         (with modifications)
 
         """
+        decompressedFilePath = inputFilePath
+        compressedFilePath = None
         try:
-            if not fileExtension.startswith("."):
-                fileExtension = "." + fileExtension
-            if fileExtension not in [".gz", ".bz2", ".xz", ".zip"]:
+            codec = CodecProvider.getCodecByExtension(fileExtension)
+            if codec is None:
                 logging.error("error - unknown file extension %s", fileExtension)
                 return None
-            decompressedFilePath = inputFilePath
-            compressedFilePath = inputFilePath + fileExtension
-            outputDir = os.path.basename(inputFilePath)
+            compressedFilePath = inputFilePath + codec.extension
             # rename from deposition format to compressed file name
             # then decompress from compressed file name to original file name
             os.replace(inputFilePath, compressedFilePath)
-            if compressedFilePath.endswith(".gz"):
-                with gzip.open(compressedFilePath, mode="rb") as inpF:
-                    with io.open(decompressedFilePath, "wb") as outF:
-                        shutil.copyfileobj(inpF, outF)
-            elif compressedFilePath.endswith(".bz2"):
-                with bz2.open(compressedFilePath, mode="rb") as inpF:
-                    with io.open(decompressedFilePath, "wb") as outF:
-                        shutil.copyfileobj(inpF, outF)
-            elif compressedFilePath.endswith(".xz"):
-                with lzma.open(compressedFilePath, mode="rb") as inpF:
-                    with io.open(decompressedFilePath, "wb") as outF:
-                        shutil.copyfileobj(inpF, outF)
-            elif compressedFilePath.endswith(".zip"):
-                with zipfile.ZipFile(compressedFilePath, mode="r") as zObj:
-                    memberList = zObj.namelist()
-                    for member in memberList[:1]:
-                        zObj.extract(member, path=outputDir)
-                if memberList:
-                    # return file name of first file in zip archive
-                    outputFilePath = os.path.join(outputDir, memberList[0])
-                    # rename file in zip archive from compressed file format to deposition format
-                    os.replace(outputFilePath, inputFilePath)
-            else:
-                outputFilePath = inputFilePath
+            codec.decompressFile(compressedFilePath, decompressedFilePath)
             # remove compressed file
             os.unlink(compressedFilePath)
             if os.path.exists(compressedFilePath):
@@ -309,6 +1454,10 @@ class UploadUtility(object):
             logging.exception(
                 "Failing uncompress for file %s with %s", inputFilePath, str(e)
             )
+            # remove partial output, so the caller finds no decompressed file
+            if compressedFilePath and os.path.exists(compressedFilePath):
+                if os.path.exists(decompressedFilePath):
+                    os.unlink(decompressedFilePath)
         logging.debug("Returning file path %r", decompressedFilePath)
         return decompressedFilePath
 
@@ -320,68 +1469,163 @@ class UploadUtility(object):
         Args:
             readFilePath: client side path
             saveFilePath: server side path (zip only)
-            compressionType: gzip, bzip2, zip, or lzma
+            compressionType: gzip, bzip2, zip, lzma, zstd, or lz4
 
         Returns:
             new file path with appropriate extension
 
         """
-        if compressionType == "gzip":
-            tempPath = readFilePath + ".gz"
-            with open(readFilePath, "rb") as r:
-                with gzip.open(tempPath, "wb") as w:
-                    w.write(r.read())
-            readFilePath = tempPath
-        elif compressionType == "bzip2":
-            tempPath = readFilePath + ".bz2"
-            with open(readFilePath, "rb") as r:
-                with bz2.open(tempPath, "wb") as w:
-                    w.write(r.read())
-            readFilePath = tempPath
-        elif compressionType == "zip":
-            tempPath = readFilePath + ".zip"
-            # file name inside of zip archive
-            # after extraction on server, file will have this name
-            targetfilename = os.path.basename(saveFilePath)
-            # create zip archive with one file inside
-            with zipfile.ZipFile(tempPath, "w") as w:
-                w.write(readFilePath, targetfilename)
-            readFilePath = tempPath
-        elif compressionType == "lzma":
-            tempPath = readFilePath + ".xz"
-            with open(readFilePath, "rb") as r:
-                with lzma.open(tempPath, "wb") as w:
-                    w.write(r.read())
-            readFilePath = tempPath
-        return readFilePath
-
-    def compressChunk(self, chunk, compressionType):
-        if compressionType == "gzip":
-            return gzip.compress(chunk)
-        elif compressionType == "bzip2":
-            return bz2.compress(chunk)
-        elif compressionType == "lzma":
-            return lzma.compress(chunk)
-        elif compressionType == "zip":
+        codec = CodecProvider.getCodec(compressionType)
+        if codec is None:
+            logging.error("error - unknown compression type %s", compressionType)
+            return readFilePath
+        # compressed output is deterministic (no time in headers), so a resumed upload recompresses to the same bytes
+        tempPath = readFilePath + codec.extension
+        # file name inside of zip archive, after extraction on server the file will have this name
+        memberName = os.path.basename(saveFilePath) if saveFilePath else None
+        codec.compressFile(readFilePath, tempPath, memberName)
+        return tempPath
+
+    def compressChunk(self, chunk, compressionType, dictionaryId=None):
+        codec = CodecProvider.getCodec(compressionType, dictionaryId)
+        if codec is None:
+            logging.error("error - unknown compression type %s", compressionType)
+            return None
+        elif not codec.streamable:
             logging.error("error - cannot compress chunks with zip file compression")
             return None
+        return codec.compress(chunk)
+
+    def compressChunkAdaptive(
+        self,
+        chunk: bytes,
+        compressionType: str,
+        policy: str = "auto",
+        sampleSize: int = 65536,
+        storeRatio: float = 0.9,
+        strongRatio: float = 0.5,
+        dictionaryId: typing.Optional[str] = None,
+    ) -> typing.Tuple[typing.Optional[str], typing.Optional[bytes]]:
+        """
+
+        Args:
+            chunk: uncompressed chunk
+            compressionType: streamable compression type (negotiated with upload parameters)
+            policy: store, fast, strong, or auto (Definitions.fileFormatCompressionD by content format)
+            sampleSize: bytes sampled from each of the start, middle, and end of the chunk
+            storeRatio: store a chunk whose sample compresses to no less than this fraction
+            strongRatio: with auto policy, compress at the strong level to no more than this fraction
+            dictionaryId: preset dictionary (zlib only, negotiated with upload parameters)
+
+        Returns:
+            compression type of the chunk (store if sent as it is), chunk to send
+
+        """
+        codec = CodecProvider.getCodec(compressionType, dictionaryId)
+        if codec is None or not codec.streamable:
+            logging.error("error - cannot compress chunks with %s", compressionType)
+            return None, None
+        if policy == "store" or not chunk:
+            return CodecProvider.STORE, chunk
+        # fast compression of a sample measures the achievable ratio
+        if len(chunk) > 3 * sampleSize:
+            middle = (len(chunk) - sampleSize) // 2
+            sample = chunk[:sampleSize] + chunk[middle: middle + sampleSize] + chunk[-sampleSize:]
         else:
-            logging.error("error - unknown compression type for file extension")
-            return None
+            sample = chunk
+        ratio = len(codec.compress(sample, codec.fastLevel)) / len(sample)
+        if ratio >= storeRatio:
+            return CodecProvider.STORE, chunk
+        if policy == "auto":
+            policy = "strong" if ratio <= strongRatio else "fast"
+        level = codec.strongLevel if policy == "strong" else codec.fastLevel
+        return codec.name, codec.compress(chunk, level)
 
-    async def decompressChunk(self, chunk, compressionType):
-        if compressionType == "gzip":
-            return gzip.decompress(chunk)
-        elif compressionType == "bzip2":
-            return bz2.decompress(chunk)
-        elif compressionType == "lzma":
-            return lzma.decompress(chunk)
-        elif compressionType == "zip":
+    async def decompressChunk(self, chunk, compressionType, dictionaryId=None):
+        if dictionaryId:
+            await Executors.runIo(DictionaryProvider(self.cP).loadDictionary, dictionaryId)
+        codec = CodecProvider.getCodec(compressionType, dictionaryId)
+        if codec is None:
+            raise HTTPException(
+                status_code=400, detail="error - unknown compression type"
+            )
+        elif not codec.streamable:
             raise HTTPException(
                 status_code=400,
                 detail="error - cannot extract chunks with zip file compression",
             )
-        else:
-            raise HTTPException(
-                status_code=400, detail="error - unknown compression type"
+        return await Executors.runCpu(codec.decompress, chunk)
+
+
+class RequestBody(object):
+    """
+    raw request body of a chunk, read as it arrives rather than spooled from a multipart form
+    """
+
+    def __init__(self, stream: typing.AsyncIterator[bytes], length: typing.Optional[int] = None):
+        self.stream = stream
+        # content length
+        self.length = length
+
+    def close(self):
+        # an unread body is discarded by the server
+        pass
+
+
+class ChunkWriter(object):
+    """
+    writes one chunk into the temp file a block at a time, decompressing and digesting on the way
+    """
+
+    def __init__(
+        self,
+        fd: int,
+        offset: int,
+        codec=None,
+        hashObj=None,
+        blockSize: int = 1048576,
+    ):
+        self.fd = fd
+        self.start = offset
+        self.offset = offset
+        self.codec = codec
+        self.decompressor = codec.getDecompressor() if codec else None
+        self.hashObj = hashObj
+        self.blockSize = blockSize
+        self.__result = None
+
+    def write(self, block: bytes):
+        if self.decompressor is None:
+            self.offset = ChunkWriter.pwrite(self.fd, block, self.offset)
+            if self.hashObj:
+                self.hashObj.update(block)
+            return
+        while block:
+            # a chunk may hold more than one compressed member
+            if self.decompressor.eof:
+                self.decompressor = self.codec.getDecompressor()
+            for data in self.codec.inflate(self.decompressor, block, self.blockSize):
+                self.offset = ChunkWriter.pwrite(self.fd, data, self.offset)
+                if self.hashObj:
+                    self.hashObj.update(data)
+            block = self.decompressor.unused_data if self.decompressor.eof else b""
+
+    def close(self) -> typing.Tuple[int, typing.Optional[str]]:
+        # number of bytes written, digest of the bytes written (None without hash type)
+        if self.__result is None:
+            os.close(self.fd)
+            self.__result = (
+                self.offset - self.start,
+                self.hashObj.hexdigest() if self.hashObj else None,
             )
+        return self.__result
+
+    @staticmethod
+    def pwrite(fd: int, data: bytes, offset: int) -> int:
+        # positioned write of all data, returns offset following the data
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+        return offset
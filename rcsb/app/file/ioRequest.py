@@ -15,6 +15,7 @@ from rcsb.app.file.PathProvider import PathProvider
 from rcsb.app.file.ConfigProvider import ConfigProvider
 from rcsb.app.file.JWTAuthBearer import JWTAuthBearer
 from rcsb.app.file.IoUtility import IoUtility
+from rcsb.app.file.Executors import Executors
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
@@ -51,7 +52,7 @@ async def getHash(
     )
     if not filePath:
         raise HTTPException(status_code=404, detail="error - could not form file path")
-    hashDigest = IoUtility().getHashDigest(filePath)
+    hashDigest = await Executors.runCpu(IoUtility.getHashDigest, filePath)
     if not hashDigest:
         raise HTTPException(
             status_code=421, detail="error - could not form hash digest"
@@ -23,6 +23,7 @@ from . import ioRequest
 from . import pathRequest
 from . import tokenRequest
 from .Sessions import Sessions
+from .Executors import Executors
 
 provider = ConfigProvider.ConfigProvider()
 locktype = provider.get("LOCK_TYPE")
@@ -79,6 +80,8 @@ async def startupEvent():
         os.makedirs(sessionDir, mode=defaultFilePermissions, exist_ok=True)
     if not os.path.exists(sharedLockDir):
         os.makedirs(sharedLockDir, mode=defaultFilePermissions, exist_ok=True)
+    # process pool and thread pool for blocking work
+    Executors.startup(cp)
 
 
 @app.on_event("shutdown")
@@ -91,6 +94,7 @@ async def shutdownEvent():
     )
     await Sessions.cleanupSessions(maxSeconds)
     await Locking.cleanup()
+    Executors.shutdown()
 
 
 app.include_router(
@@ -12,16 +12,19 @@ __license__ = "Apache 2.0"
 import logging
 import os
 import time
-import redis
 import psutil
 import shutil
 from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.KvRedis import KvRedis
 from rcsb.utils.io.ProcessStatusUtil import ProcessStatusUtil
 
 logger = logging.getLogger(__name__)
 
 
 class ServerStatus:
+    # compressed chunks received by this server process
+    __chunkBytes = {"chunks": 0, "stored": 0, "received": 0, "written": 0}
+
     @staticmethod
     def serverStatus():
         # status of gunicorn server and remote repository file system
@@ -67,7 +70,7 @@ class ServerStatus:
         cP = ConfigProvider()
         redis_host = cP.get("REDIS_HOST")
         try:
-            r = redis.Redis(host=redis_host, decode_responses=True)
+            r = KvRedis.getClient(redis_host)
         except Exception as exc:
             # already exists
             logging.warning("exception in redis status: %s %s", type(exc), exc)
@@ -102,3 +105,23 @@ class ServerStatus:
         psU = ProcessStatusUtil()
         psD = psU.getInfo()
         return {"msg": "Status is nominal!", "version": cP.getVersion(), "status": psD}
+
+    @staticmethod
+    def addChunkBytes(received: int, written: int, stored: bool = False):
+        # chunk bytes on the wire and on disk
+        ServerStatus.__chunkBytes["chunks"] += 1
+        ServerStatus.__chunkBytes["stored"] += 1 if stored else 0
+        ServerStatus.__chunkBytes["received"] += received
+        ServerStatus.__chunkBytes["written"] += written
+
+    @staticmethod
+    def compressionStatus():
+        # bytes saved on the wire by chunk compression, since this server process started
+        chunkBytes = ServerStatus.__chunkBytes
+        return {
+            "chunks received": chunkBytes["chunks"],
+            "chunks stored uncompressed": chunkBytes["stored"],
+            "chunk bytes received": chunkBytes["received"],
+            "chunk bytes written": chunkBytes["written"],
+            "chunk bytes saved": chunkBytes["written"] - chunkBytes["received"],
+        }
@@ -13,6 +13,8 @@ import logging
 import asyncio
 from fastapi import APIRouter, Form
 from rcsb.app.file.serverStatus import ServerStatus
+from rcsb.app.file.Executors import Executors
+from rcsb.app.file.StorageProvider import StorageProvider
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +36,24 @@ def processStatus():
     return ServerStatus.processStatus()
 
 
+@router.get("/executorStatus", tags=["status"])
+def executorStatus():
+    # queue and latency metrics of the process pool (cpu) and thread pool (io)
+    return Executors.getMetrics()
+
+
+@router.get("/compressionStatus", tags=["status"])
+def compressionStatus():
+    # bytes saved by compressed chunks (extract chunk uploads) in this server process
+    return ServerStatus.compressionStatus()
+
+
+@router.get("/storageStatus", tags=["status"])
+async def storageStatus():
+    # repository disk space (cached) and space reserved by upload sessions
+    return await StorageProvider().storageStatus()
+
+
 @router.post("/asyncTest", status_code=200)
 async def asyncTest(index: int = Form(1), waittime: int = Form(10)) -> dict:
     """
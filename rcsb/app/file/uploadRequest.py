@@ -10,11 +10,14 @@ __license__ = "Apache 2.0"
 
 import logging
 from typing import Optional
-from fastapi import APIRouter, Query, File, Form, HTTPException, UploadFile, Depends
+from fastapi import APIRouter, Query, File, Form, Header, HTTPException, UploadFile, Depends, Response, Request
 from pydantic import BaseModel  # pylint: disable=no-name-in-module
 from pydantic import Field
 from rcsb.app.file.ConfigProvider import ConfigProvider
-from rcsb.app.file.UploadUtility import UploadUtility
+from rcsb.app.file.UploadUtility import UploadUtility, RequestBody
+from rcsb.app.file.FinalizeProvider import FinalizeProvider
+from rcsb.app.file.DictionaryProvider import DictionaryProvider
+from rcsb.app.file.Executors import Executors
 from rcsb.app.file.JWTAuthBearer import JWTAuthBearer
 
 logger = logging.getLogger(__name__)
@@ -40,6 +43,42 @@ class UploadResult(BaseModel):
     uploadId: str = Field(
         None, title="upload id", description="upload id", example="A1101A10101E"
     )
+    chunkBitmap: str = Field(
+        None,
+        title="chunk bitmap",
+        description="hexadecimal bitmap of chunks already received (bit n = chunk n)",
+        example="1f",
+    )
+    compressionType: Optional[str] = Field(
+        None,
+        title="compression type",
+        description="compression type of chunks and streams (none if no offered type is available)",
+        example="zstd",
+    )
+    compressionDictionary: Optional[str] = Field(
+        None,
+        title="compression dictionary",
+        description="id of the preset dictionary of zlib compressed chunks (none if not asked for or not available)",
+        example="pdbx-v1",
+    )
+    satisfied: bool = Field(
+        False,
+        title="satisfied",
+        description="identical content was already stored, so the file path was linked to it and no chunks are to be sent",
+        example=False,
+    )
+    chunkSize: Optional[int] = Field(
+        None,
+        title="chunk size",
+        description="recommended chunk size in bytes (the chunk size of the session for a resumed upload)",
+        example=33554432,
+    )
+    chunkConcurrency: Optional[int] = Field(
+        None,
+        title="chunk concurrency",
+        description="recommended number of chunks sent at once",
+        example=4,
+    )
 
 
 # required prior to chunked upload
@@ -54,6 +93,13 @@ async def getUploadParameters(
     version: str = Query(default="next"),
     allowOverwrite: bool = Query(default=True),
     resumable: bool = Query(default=False),
+    compressionTypes: Optional[str] = Query(default=None),
+    compressionDictionary: bool = Query(default=False),
+    fileSize: Optional[int] = Query(default=None),
+    hashType: Optional[str] = Query(default=None),
+    hashDigest: Optional[str] = Query(default=None),
+    throughput: Optional[float] = Query(default=None),
+    rtt: Optional[float] = Query(default=None),
 ):
     try:
         return await UploadUtility().getUploadParameters(
@@ -66,6 +112,141 @@ async def getUploadParameters(
             version,
             allowOverwrite,
             resumable,
+            compressionTypes,
+            compressionDictionary,
+            fileSize,
+            hashType,
+            hashDigest,
+            throughput,
+            rtt,
+        )
+    except HTTPException as exc:
+        logger.exception("error %d %s", exc.status_code, exc.detail)
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+# preset dictionary named by upload parameters (unchanged once written, so clients may keep it)
+@router.get("/compressionDictionary")
+async def getCompressionDictionary(dictionaryId: str = Query(...)):
+    zdict = await Executors.runIo(DictionaryProvider().getDictionary, dictionaryId)
+    if not zdict:
+        raise HTTPException(status_code=404, detail="error - unknown compression dictionary")
+    return Response(content=zdict, media_type="application/octet-stream")
+
+
+# block signatures of the latest version, for a delta upload of the next version
+@router.get("/deltaSignatures")
+async def deltaSignatures(
+    repositoryType: str = Query(...),
+    depId: str = Query(...),
+    contentType: str = Query(...),
+    milestone: Optional[str] = Query(default=""),
+    partNumber: int = Query(...),
+    contentFormat: str = Query(...),
+):
+    try:
+        return await UploadUtility().getDeltaSignatures(
+            repositoryType, depId, contentType, milestone, partNumber, contentFormat
+        )
+    except HTTPException as exc:
+        logger.exception("error %d %s", exc.status_code, exc.detail)
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+# upload chunked delta of the next version against the latest version
+@router.post("/uploadDelta", status_code=200)
+async def uploadDelta(
+    # chunk parameters
+    chunk: UploadFile = File(...),
+    chunkSize: int = Form(None),
+    chunkIndex: int = Form(None),
+    expectedChunks: int = Form(None),
+    # upload file parameters
+    uploadId: str = Form(None),
+    hashType: str = Form(None),
+    hashDigest: str = Form(None),
+    # save file parameters
+    filePath: str = Form(...),
+    fileSize: int = Form(None),
+    baseFilePath: str = Form(...),
+    blockSize: int = Form(...),
+    allowOverwrite: bool = Form(False),
+    # other
+    resumable: bool = Form(False),
+):
+    try:
+        return await UploadUtility().uploadDelta(
+            chunk=chunk.file,
+            chunkSize=chunkSize,
+            chunkIndex=chunkIndex,
+            expectedChunks=expectedChunks,
+            uploadId=uploadId,
+            hashType=hashType,
+            hashDigest=hashDigest,
+            filePath=filePath,
+            fileSize=fileSize,
+            baseFilePath=baseFilePath,
+            blockSize=blockSize,
+            allowOverwrite=allowOverwrite,
+            resumable=resumable,
+        )
+    except HTTPException as exc:
+        logger.exception("error %d %s", exc.status_code, exc.detail)
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+# upload a whole file (smaller than one chunk) in one request, without upload parameters
+@router.post("/uploadFile", status_code=200)
+async def uploadFile(
+    # file parameters
+    file: UploadFile = File(...),
+    repositoryType: str = Form(...),
+    depId: str = Form(...),
+    contentType: str = Form(...),
+    milestone: Optional[str] = Form(default=""),
+    partNumber: int = Form(...),
+    contentFormat: str = Form(...),
+    version: str = Form(default="next"),
+    # upload file parameters
+    hashType: str = Form(None),
+    hashDigest: str = Form(None),
+    fileSize: int = Form(None),
+    allowOverwrite: bool = Form(False),
+    compressionType: str = Form(None),
+):
+    try:
+        return await UploadUtility().uploadFile(
+            file=file.file,
+            repositoryType=repositoryType,
+            depId=depId,
+            contentType=contentType,
+            milestone=milestone,
+            partNumber=partNumber,
+            contentFormat=contentFormat,
+            version=version,
+            hashType=hashType,
+            hashDigest=hashDigest,
+            fileSize=fileSize,
+            allowOverwrite=allowOverwrite,
+            compressionType=compressionType,
+        )
+    except HTTPException as exc:
+        logger.exception("error %d %s", exc.status_code, exc.detail)
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+# upload many files of one deposition as one streamed tar body (no multipart form)
+@router.post("/uploadBundle", status_code=200)
+async def uploadBundle(
+    request: Request,
+    repositoryType: str = Query(...),
+    depId: str = Query(...),
+    hashType: Optional[str] = Query(default=None),
+    allowOverwrite: bool = Query(default=False),
+):
+    try:
+        return await UploadUtility().uploadBundle(
+            request.stream(), repositoryType, depId, hashType, allowOverwrite
         )
     except HTTPException as exc:
         logger.exception("error %d %s", exc.status_code, exc.detail)
@@ -75,6 +256,7 @@ async def getUploadParameters(
 # upload chunked file
 @router.post("/upload", status_code=200)
 async def upload(
+    response: Response,
     # chunk parameters
     chunk: UploadFile = File(...),
     chunkSize: int = Form(None),
@@ -84,6 +266,7 @@ async def upload(
     uploadId: str = Form(None),
     hashType: str = Form(None),
     hashDigest: str = Form(None),
+    chunkHashDigest: str = Form(None),
     # save file parameters
     filePath: str = Form(...),
     fileSize: int = Form(None),
@@ -93,10 +276,13 @@ async def upload(
     # other
     resumable: bool = Form(False),
     extractChunk: bool = Form(False),
+    extractStream: bool = Form(False),
+    compressionType: str = Form(None),
+    compressionDictionary: str = Form(None),
 ):
     # return status
     try:
-        return await UploadUtility().upload(
+        result = await UploadUtility().upload(
             # chunk parameters
             chunk=chunk.file,
             chunkSize=chunkSize,
@@ -106,6 +292,7 @@ async def upload(
             uploadId=uploadId,
             hashType=hashType,
             hashDigest=hashDigest,
+            chunkHashDigest=chunkHashDigest,
             # save file parameters
             filePath=filePath,
             fileSize=fileSize,
@@ -114,7 +301,93 @@ async def upload(
             allowOverwrite=allowOverwrite,
             resumable=resumable,
             extractChunk=extractChunk,
+            extractStream=extractStream,
+            compressionType=compressionType,
+            compressionDictionary=compressionDictionary,
         )
+        if result and "jobId" in result:
+            # finalized in the background (202 while the job runs)
+            response.status_code = result["statusCode"]
+        return result
     except HTTPException as exc:
         logger.exception("error %d %s", exc.status_code, exc.detail)
         raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+# upload chunk as the raw request body (no multipart form), parameters in headers
+@router.put("/upload/{uploadId}/{chunkIndex}", status_code=200)
+async def uploadChunk(
+    request: Request,
+    response: Response,
+    # chunk parameters
+    uploadId: str,
+    chunkIndex: int,
+    chunkSize: int = Header(None, alias="X-Chunk-Size"),
+    expectedChunks: int = Header(None, alias="X-Expected-Chunks"),
+    contentLength: int = Header(None, alias="Content-Length"),
+    # upload file parameters
+    hashType: str = Header(None, alias="X-Hash-Type"),
+    hashDigest: str = Header(None, alias="X-Hash-Digest"),
+    chunkHashDigest: str = Header(None, alias="X-Chunk-Hash-Digest"),
+    # save file parameters
+    filePath: str = Header(..., alias="X-File-Path"),
+    fileSize: int = Header(None, alias="X-File-Size"),
+    fileExtension: str = Header(None, alias="X-File-Extension"),
+    decompress: bool = Header(False, alias="X-Decompress"),
+    allowOverwrite: bool = Header(False, alias="X-Allow-Overwrite"),
+    # other
+    resumable: bool = Header(False, alias="X-Resumable"),
+    extractChunk: bool = Header(False, alias="X-Extract-Chunk"),
+    extractStream: bool = Header(False, alias="X-Extract-Stream"),
+    compressionType: str = Header(None, alias="X-Compression-Type"),
+    compressionDictionary: str = Header(None, alias="X-Compression-Dictionary"),
+):
+    # the body is written as it arrives, so its length is needed up front
+    if contentLength is None:
+        raise HTTPException(status_code=411, detail="error - content length required")
+    try:
+        result = await UploadUtility().upload(
+            # chunk parameters
+            chunk=RequestBody(request.stream(), contentLength),
+            chunkSize=chunkSize,
+            chunkIndex=chunkIndex,
+            expectedChunks=expectedChunks,
+            # upload file parameters
+            uploadId=uploadId,
+            hashType=hashType,
+            hashDigest=hashDigest,
+            chunkHashDigest=chunkHashDigest,
+            # save file parameters
+            filePath=filePath,
+            fileSize=fileSize,
+            fileExtension=fileExtension,
+            decompress=decompress,
+            allowOverwrite=allowOverwrite,
+            resumable=resumable,
+            extractChunk=extractChunk,
+            extractStream=extractStream,
+            compressionType=compressionType,
+            compressionDictionary=compressionDictionary,
+        )
+        if result and "jobId" in result:
+            # finalized in the background (202 while the job runs)
+            response.status_code = result["statusCode"]
+        return result
+    except HTTPException as exc:
+        logger.exception("error %d %s", exc.status_code, exc.detail)
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+# status of an upload finalized in the background, waits up to wait seconds for the job to end (long poll)
+# responds 202 while the job runs, then with the status code of the finalization
+@router.get("/uploadStatus/{jobId}")
+async def uploadStatus(
+    jobId: str,
+    response: Response,
+    wait: float = Query(0, title="seconds to wait for the job to end", ge=0),
+):
+    statusD = await FinalizeProvider().waitStatus(jobId, wait)
+    if not statusD:
+        raise HTTPException(status_code=404, detail="error - no finalization job %s" % jobId)
+    response.status_code = statusD["statusCode"]
+    return statusD
@@ -25,6 +25,8 @@ from rcsb.utils.io.LogUtil import StructFormatter
 from rcsb.app.client.ClientUtility import ClientUtility
 from rcsb.app.file.IoUtility import IoUtility
 from rcsb.app.file.PathProvider import PathProvider
+from rcsb.app.file.CodecProvider import CodecProvider
+from rcsb.app.file.DictionaryProvider import DictionaryProvider
 
 logging.basicConfig(
     level=logging.INFO,
@@ -199,6 +201,8 @@ class ClientTests(unittest.TestCase):
                 response["status_code"] == 200,
                 "error - status code %s" % response["status_code"],
             )
+            # random content is sent as it is (adaptive compression)
+            self.assertEqual(response["bytesSaved"], 0)
 
             # return 200
             partNumber = 2
@@ -268,10 +272,70 @@ class ClientTests(unittest.TestCase):
                 f"{PathProvider().getVersionedPath(repositoryType, depId, contentType, milestone, partNumber, contentFormat, version)} decompress {decompress} overwrite {allowOverwrite}"
             )
             self.assertTrue(response["status_code"] == 200)
+
+            # return 200 (compress whole file as one stream)
+            partNumber = 4
+            decompress = False
+            fileExtension = os.path.splitext(self.__testFileDatPath)[-1]
+            response = self.__cU.upload(
+                self.__testFileDatPath,
+                repositoryType,
+                depId,
+                contentType,
+                milestone,
+                partNumber,
+                contentFormat,
+                version,
+                decompress,
+                fileExtension,
+                allowOverwrite,
+                resumable,
+                extractStream=True,
+            )
+            self.assertTrue(response["status_code"] == 200)
+            savedFilePath = PathProvider().getVersionedPath(
+                repositoryType, depId, contentType, milestone, partNumber, contentFormat, version
+            )
+            self.assertEqual(
+                IoUtility().getHashDigest(savedFilePath),
+                IoUtility().getHashDigest(self.__testFileDatPath),
+            )
         except Exception as e:
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testDictionaryUpload(self):
+        logger.info("test dictionary upload")
+        text = b"".join(
+            b"_atom_site.Cartn_x %d\n_atom_site.Cartn_y %d\n_struct.title sample %d\n" % (i, i * 7, i)
+            for i in range(20000)
+        )
+        sourceFilePath = os.path.join(self.__unitTestFolder, "dictionary.cif")
+        with open(sourceFilePath, "wb") as w:
+            w.write(text)
+        dP = DictionaryProvider(self.__cP)
+        dictionaryId = dP.buildDictionary("pdbx", [sourceFilePath])
+        try:
+            self.__cU.compressionDictionary = True
+            response = self.__cU.upload(
+                sourceFilePath,
+                self.__repositoryType,
+                "D_1000000001",
+                "model",
+                "",
+                3,
+                "pdbx",
+                1,
+                allowOverwrite=True,
+            )
+            self.assertEqual(response["status_code"], 200)
+            self.assertGreater(response["bytesSaved"], 0)
+            # dictionary fetched from the server
+            self.assertEqual(CodecProvider.getDictionary(dictionaryId), dP.getDictionary(dictionaryId))
+            self.assertTrue(filecmp.cmp(sourceFilePath, self.__repositoryFile3, shallow=False))
+        finally:
+            os.unlink(os.path.join(dP.dirPath, dictionaryId + ".zdict"))
+
     def testResumableUpload(self):
         logger.info("test resumable upload")
         self.assertTrue(os.path.exists(self.__testFileDatPath))
@@ -1310,6 +1374,7 @@ def client_tests():
     suite = unittest.TestSuite()
     suite.addTest(ClientTests("testSimpleUpload"))
     suite.addTest(ClientTests("testResumableUpload"))
+    suite.addTest(ClientTests("testDictionaryUpload"))
     suite.addTest(ClientTests("testSimpleDownload"))
     suite.addTest(ClientTests("testChunkDownload"))
     suite.addTest(ClientTests("testFilePathLocal"))
@@ -49,6 +49,57 @@ class KvRedisTest(unittest.TestCase):
         kV.clearSessionKey("test")
         kV.clearTable(kV.sessionTable)
 
+    def testMapReverse(self):
+        cP = ConfigProvider()
+        kV = KvRedis(cP)
+        # a map entry is cleared from its val, without a scan of the database
+        kV.setMap("testMapReverse", "upload1")
+        self.assertEqual(kV.getMapKeyFromVal("upload1"), "testMapReverse")
+        self.assertTrue(kV.clearMapVal("upload1"))
+        self.assertIsNone(kV.getMap("testMapReverse"))
+        self.assertFalse(kV.clearMapVal("upload1"))
+        # a new val of a key replaces its reverse entry
+        kV.setMap("testMapReverse", "upload2")
+        kV.setMap("testMapReverse", "upload3")
+        self.assertIsNone(kV.getMapKeyFromVal("upload2"))
+        self.assertFalse(kV.clearMapVal("upload2"))
+        self.assertEqual(kV.getMap("testMapReverse"), "upload3")
+        self.assertTrue(kV.clearMapKey("testMapReverse"))
+        self.assertIsNone(kV.getMapKeyFromVal("upload3"))
+
+    def testLockScripts(self):
+        cP = ConfigProvider()
+        kV = KvRedis(cP)
+        kV.clearTable(kV.lockTable)
+        # writer acquires, a second writer waitlists, a reader is denied
+        self.assertEqual(kV.acquireLock("test~lock", "w1", "w", "host", 1, 1.0), (True, -1, 1, "-1"))
+        self.assertEqual(kV.acquireLock("test~lock", "w2", "w", "host", 2, 2.0), (False, -1, 1, "w2"))
+        self.assertFalse(kV.acquireLock("test~lock", "r1", "r", "host", 3, 3.0)[0])
+        # on release, the waitlisted writer goes next
+        self.assertTrue(kV.releaseLock("test~lock", "w1", "w"))
+        self.assertFalse(kV.acquireLock("test~lock", "r1", "r", "host", 3, 3.0)[0])
+        self.assertEqual(kV.acquireLock("test~lock", "w2", "w", "host", 2, 2.0), (True, -1, 1, "-1"))
+        self.assertEqual(kV.getLockState("test~lock")["proc"], "2")
+        self.assertTrue(kV.releaseLock("test~lock", "w2", "w"))
+        # the last release removes the lock
+        self.assertIsNone(kV.getLockState("test~lock"))
+        self.assertIsNone(kV.getLockAll())
+
+    def testSessionAndMap(self):
+        cP = ConfigProvider()
+        kV = KvRedis(cP)
+        self.assertIs(kV.kV, KvRedis(cP).kV)
+        # first chunk - session val and map entry together
+        kV.setSessionAndMap("testSessionAndMap", "chunkSize", 1024, "testSessionAndMapKey")
+        self.assertEqual(str(kV.getSession("testSessionAndMap", "chunkSize")), "1024")
+        self.assertEqual(kV.getMap("testSessionAndMapKey"), "testSessionAndMap")
+        kV.setSession("testReservations", "testSessionAndMap", "1~0")
+        # cleanup - session, map entry by val, and reservation together
+        self.assertTrue(kV.clearSession("testSessionAndMap", None, ["testReservations"]))
+        self.assertIsNone(kV.getKey("testSessionAndMap", kV.sessionTable))
+        self.assertIsNone(kV.getMap("testSessionAndMapKey"))
+        self.assertIsNone(kV.getKey("testReservations", kV.sessionTable))
+
 
 if __name__ == "__main__":
     unittest.main()
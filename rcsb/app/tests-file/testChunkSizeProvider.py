@@ -0,0 +1,52 @@
+##
+# File:    testChunkSizeProvider.py
+# Date:    Oct-2026
+# Version: 0.001
+#
+
+import logging
+import unittest
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.ChunkSizeProvider import ChunkSizeProvider
+
+logging.basicConfig(level=logging.INFO)
+
+MB = 1048576
+
+
+class ChunkSizeProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.__cP = ConfigProvider()
+        self.__cP._set("CHUNK_SIZE", 32 * MB)
+        self.__cP._set("CHUNK_CONCURRENCY", 4)
+        self.__cP._set("CHUNK_SIZE_MAX", 256 * MB)
+        self.__cP._set("CHUNK_CONCURRENCY_MAX", 16)
+        self.__provider = ChunkSizeProvider(self.__cP)
+
+    def testDefaults(self):
+        # without measurements
+        self.assertEqual(self.__provider.getParameters(), {"chunkSize": 32 * MB, "chunkConcurrency": 4})
+        # a file of fewer chunks than the concurrency is split smaller
+        self.assertEqual(self.__provider.getParameters(64 * MB), {"chunkSize": 16 * MB, "chunkConcurrency": 4})
+        self.assertEqual(self.__provider.getParameters(MB // 2), {"chunkSize": MB, "chunkConcurrency": 1})
+
+    def testMeasured(self):
+        # fast local network - large chunks, few in flight
+        parameters = self.__provider.getParameters(10000 * MB, 100 * MB, 0.001)
+        self.assertEqual(parameters, {"chunkSize": 200 * MB, "chunkConcurrency": 2})
+        # slow remote link - small chunks, cheap to resend
+        parameters = self.__provider.getParameters(10000 * MB, MB // 10, 0.3)
+        self.assertEqual(parameters, {"chunkSize": MB, "chunkConcurrency": 2})
+        # long fat link - chunk size at its maximum, more chunks cover the bandwidth delay product
+        parameters = self.__provider.getParameters(100000 * MB, 1000 * MB, 0.5)
+        self.assertEqual(parameters, {"chunkSize": 256 * MB, "chunkConcurrency": 3})
+
+    def testResumed(self):
+        # the chunk size of the session is kept
+        parameters = self.__provider.getParameters(10000 * MB, 100 * MB, 0.001, 8 * MB)
+        self.assertEqual(parameters["chunkSize"], 8 * MB)
+        self.assertEqual(parameters["chunkConcurrency"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+##
+# File:    testCodecProvider.py
+# Date:    Oct-2026
+# Version: 0.001
+#
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+import zstandard
+from rcsb.app.file.CodecProvider import CodecProvider
+
+logging.basicConfig(level=logging.INFO)
+
+
+class CodecProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.__data = os.urandom(50) * 20000 + os.urandom(300000)
+        self.__dirPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.__dirPath, ignore_errors=True)
+
+    def testRegistry(self):
+        names = CodecProvider.getNames()
+        for name in ["gzip", "bzip2", "lzma", "zip", "zstd", "lz4"]:
+            self.assertIn(name, names)
+        self.assertNotIn("zip", CodecProvider.getNames(streamable=True))
+        self.assertIsNone(CodecProvider.getCodec("brotli"))
+        self.assertEqual(CodecProvider.getCodecByExtension("zst").name, "zstd")
+        self.assertEqual(CodecProvider.getCodecByExtension(".gz").name, "gzip")
+        self.assertEqual(CodecProvider.negotiate(["brotli", "lz4", "gzip"]), "lz4")
+        self.assertIsNone(CodecProvider.negotiate(["zip"]))
+
+    def testStreamRoundTrip(self):
+        # concatenated members, fed in pieces that do not align with member boundaries
+        for name in CodecProvider.getNames(streamable=True):
+            codec = CodecProvider.getCodec(name)
+            stream = codec.compress(self.__data) + codec.compress(b"tail")
+            self.assertEqual(codec.decompress(stream), self.__data + b"tail", name)
+            out = []
+            decompressor = codec.getDecompressor()
+            for start in range(0, len(stream), 7777):
+                block = stream[start: start + 7777]
+                while block:
+                    if decompressor.eof:
+                        decompressor = codec.getDecompressor()
+                    out.extend(codec.inflate(decompressor, block, 65536))
+                    block = decompressor.unused_data if decompressor.eof else b""
+            self.assertTrue(decompressor.eof, name)
+            self.assertEqual(b"".join(out), self.__data + b"tail", name)
+
+    def testFileRoundTrip(self):
+        filePath = os.path.join(self.__dirPath, "file.dat")
+        with open(filePath, "wb") as w:
+            w.write(self.__data)
+        for name in CodecProvider.getNames():
+            codec = CodecProvider.getCodec(name)
+            compressedPath = filePath + codec.extension
+            outputPath = os.path.join(self.__dirPath, "output.dat")
+            codec.compressFile(filePath, compressedPath, "member.dat")
+            codec.decompressFile(compressedPath, outputPath)
+            with open(outputPath, "rb") as r:
+                self.assertEqual(r.read(), self.__data, name)
+            # compressed output is deterministic
+            codec.compressFile(filePath, outputPath, "member.dat")
+            if name != "zip":
+                with open(compressedPath, "rb") as r1, open(outputPath, "rb") as r2:
+                    self.assertEqual(r1.read(), r2.read(), name)
+
+    def testBoundedOutput(self):
+        # highly compressible input is inflated in blocks of at most block size, whatever the compression ratio
+        data = bytes(64 * 1048576)
+        for name in CodecProvider.getNames(streamable=True):
+            codec = CodecProvider.getCodec(name)
+            stream = codec.compress(data, codec.fastLevel)
+            if name == "zstd":
+                # frame with content size and checksum in its header
+                stream += zstandard.ZstdCompressor(write_checksum=True).compress(b"tail" * 1000)
+            decompressor = codec.getDecompressor()
+            size = 0
+            for start in range(0, len(stream), 131072):
+                block = stream[start: start + 131072]
+                while block:
+                    if decompressor.eof:
+                        decompressor = codec.getDecompressor()
+                    for out in codec.inflate(decompressor, block, 1048576):
+                        self.assertLessEqual(len(out), 1048576, name)
+                        size += len(out)
+                    block = decompressor.unused_data if decompressor.eof else b""
+            self.assertTrue(decompressor.eof, name)
+            self.assertEqual(size, len(data) + (4000 if name == "zstd" else 0), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
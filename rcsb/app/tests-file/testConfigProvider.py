@@ -139,6 +139,25 @@ class ConfigProviderTests(unittest.TestCase):
             False,
             "error - could not invalidate surplus processors",
         )
+        # validate executor pool sizes
+        test(
+            "EXECUTOR_PROCESS_WORKERS",
+            0,
+            True,
+            "error - zero process workers did not validate",
+        )
+        test(
+            "EXECUTOR_PROCESS_WORKERS",
+            -1,
+            False,
+            "error - could not invalidate process workers",
+        )
+        test(
+            "EXECUTOR_THREAD_WORKERS",
+            0,
+            False,
+            "error - could not invalidate thread workers",
+        )
         # test file path regex
         test(
             "REPOSITORY_DIR_PATH",
@@ -182,6 +201,10 @@ class ConfigProviderTests(unittest.TestCase):
             True,
             "error - could not validate path with delimiting dots",
         )
+        # staging directory is optional
+        test("STAGING_DIR_PATH", "", True, "error - could not validate empty staging directory")
+        test("STAGING_DIR_PATH", "/dev/shm/staging", True, "error - could not validate staging directory")
+        test("STAGING_DIR_PATH", "/tmp/a*b", False, "error - could not invalidate staging directory")
         # test booleans
         test("LOCK_TRANSACTIONS", True, True, "error - could not validate boolean")
         test("LOCK_TRANSACTIONS", "true", False, "error - could not invalidate boolean")
@@ -202,6 +225,13 @@ class ConfigProviderTests(unittest.TestCase):
         # test kv mode
         test("KV_MODE", "redis", True, "error - could not validate kv mode")
         test("KV_MODE", "mongo", False, "error - could not invalidate kv mode")
+        test("KV_MODE", "memory", True, "error - could not validate kv mode memory")
+        # memory kv settings
+        test("KV_MEMORY_MAX_KEYS", 0, True, "error - could not validate unlimited memory kv")
+        test("KV_MEMORY_MAX_KEYS", -1, False, "error - could not invalidate memory kv max keys")
+        test("KV_SNAPSHOT_PATH", "", True, "error - could not validate empty snapshot path")
+        test("KV_SNAPSHOT_PATH", "./kv.json", True, "error - could not validate snapshot path")
+        test("KV_SNAPSHOT_SECONDS", -1, False, "error - could not invalidate snapshot seconds")
         # test relation between lock type and kv mode
         cP._set("LOCK_TYPE", "redis")
         cP._set("KV_MODE", "redis")
@@ -235,8 +265,21 @@ class ConfigProviderTests(unittest.TestCase):
         )
         # validate max seconds
         test("KV_MAX_SECONDS", -1, False, "error - could not invalidate max seconds")
+        # validate disk space settings
+        test("STORAGE_REFRESH_SECONDS", 0, True, "error - could not validate refresh seconds")
+        test("STORAGE_HEADROOM_BYTES", -1, False, "error - could not invalidate headroom bytes")
         # validate chunk size
         test("CHUNK_SIZE", -1, False, "error - could not invalidate chunk size")
+        test(
+            "CHUNK_CONCURRENCY",
+            0,
+            False,
+            "error - could not invalidate chunk concurrency",
+        )
+        test("CHUNK_SIZE_MAX", 1048576, False, "error - could not invalidate chunk size maximum below chunk size")
+        test("CHUNK_CONCURRENCY_MAX", 16, True, "error - could not validate chunk concurrency maximum")
+        test("ASYNC_FINALIZE_BYTES", 0, True, "error - could not validate background finalization disabled")
+        test("ASYNC_FINALIZE_BYTES", -1, False, "error - could not invalidate background finalization bytes")
         # validate compression type
         test(
             "COMPRESSION_TYPE",
@@ -244,6 +287,24 @@ class ConfigProviderTests(unittest.TestCase):
             False,
             "error - could not invalidate compression type",
         )
+        test(
+            "COMPRESSION_TYPE",
+            "zstd",
+            True,
+            "error - could not validate registered compression type",
+        )
+        test(
+            "ADAPTIVE_COMPRESSION",
+            "yes",
+            False,
+            "error - could not invalidate adaptive compression",
+        )
+        test(
+            "COMPRESSION_DICTIONARY",
+            1,
+            False,
+            "error - could not invalidate compression dictionary",
+        )
         # validate hash type
         test("HASH_TYPE", "SHA", False, "error - could not invalidate hash type")
         # validate default file permissions
@@ -0,0 +1,78 @@
+##
+# File:    testDeltaProvider.py
+# Date:    Oct-2026
+# Version: 0.001
+#
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from rcsb.app.file.DeltaProvider import DeltaProvider
+
+logging.basicConfig(level=logging.INFO)
+
+
+class DeltaProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.__dirPath = tempfile.mkdtemp()
+        self.__base = os.urandom(300000)
+        self.__basePath = os.path.join(self.__dirPath, "base.dat")
+        with open(self.__basePath, "wb") as w:
+            w.write(self.__base)
+
+    def tearDown(self):
+        shutil.rmtree(self.__dirPath, ignore_errors=True)
+
+    def __roundTrip(self, data, blockSize=2048, maxRolledBlocks=64):
+        sourcePath = os.path.join(self.__dirPath, "source.dat")
+        deltaPath = os.path.join(self.__dirPath, "delta.dat")
+        outPath = os.path.join(self.__dirPath, "out.dat")
+        with open(sourcePath, "wb") as w:
+            w.write(data)
+        signatureD = DeltaProvider.getSignatures(self.__basePath, blockSize)
+        deltaSize = DeltaProvider.makeDelta(
+            sourcePath, signatureD, deltaPath, maxRolledBlocks=maxRolledBlocks
+        )
+        if deltaSize is None:
+            return None
+        written, digest = DeltaProvider.applyDelta(
+            self.__basePath, deltaPath, outPath, blockSize, "MD5"
+        )
+        self.assertEqual(written, len(data))
+        self.assertEqual(digest, hashlib.md5(data).hexdigest())
+        with open(outPath, "rb") as r:
+            self.assertEqual(r.read(), data)
+        return deltaSize
+
+    def testSignatures(self):
+        signatureD = DeltaProvider.getSignatures(self.__basePath, 4096)
+        self.assertEqual(signatureD["fileSize"], len(self.__base))
+        # a short last block has no signature
+        self.assertEqual(len(signatureD["signatures"]), len(self.__base) // 4096)
+        self.assertEqual(DeltaProvider.getBlockSize(0), 2048)
+        self.assertEqual(DeltaProvider.getBlockSize(1 << 40), 1048576)
+
+    def testDelta(self):
+        # identical, then shifted by an insertion and a deletion
+        self.assertLess(self.__roundTrip(self.__base), 2048 + 100)
+        data = self.__base[:1000] + b"inserted" + self.__base[1000:150000] + self.__base[150500:] + b"tail"
+        self.assertLess(self.__roundTrip(data), 4 * 2048 + 100)
+        self.assertEqual(self.__roundTrip(b""), 0)
+        # unrelated content is not worth a delta
+        self.assertIsNone(self.__roundTrip(os.urandom(300000)))
+
+    def testRollingBound(self):
+        # one byte changed every 16 blocks, each change rolls the checksum through about a block
+        data = bytearray(self.__base)
+        for position in range(1000, len(data), 16 * 2048):
+            data[position] ^= 0xFF
+        self.assertIsNotNone(self.__roundTrip(bytes(data)))
+        # little literal data, but more rolling than allowed
+        self.assertIsNone(self.__roundTrip(bytes(data), maxRolledBlocks=4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+##
+# File:    testDictionaryProvider.py
+# Date:    Oct-2026
+# Version: 0.001
+#
+
+import logging
+import os
+import shutil
+import unittest
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.CodecProvider import CodecProvider
+from rcsb.app.file.DictionaryProvider import DictionaryProvider
+
+logging.basicConfig(level=logging.INFO)
+
+
+def makeSample(index: int) -> bytes:
+    # mmCIF header and atom site loop, with coordinates that differ between samples
+    lines = [b"data_%04dXYZ" % index, b"#", b"_entry.id %04dXYZ" % index, b"#"]
+    for category in [b"struct", b"exptl", b"cell", b"pdbx_database_status", b"audit_author"]:
+        for item in [b"entry_id", b"title", b"method", b"details", b"pdbx_ordinal"]:
+            lines.append(b"_%s.%s %d" % (category, item, index))
+        lines.append(b"#")
+    lines.append(b"loop_")
+    for item in [b"group_PDB", b"id", b"type_symbol", b"label_atom_id", b"label_comp_id", b"Cartn_x", b"Cartn_y", b"Cartn_z"]:
+        lines.append(b"_atom_site." + item)
+    for atom in range(200):
+        lines.append(b"ATOM %d C CA MET %d.%03d %d.%03d 1.000" % (atom, index, atom, atom, index))
+    return b"\n".join(lines) + b"\n"
+
+
+class DictionaryProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.__cP = ConfigProvider()
+        self.__dirPath = self.__cP.get("COMPRESSION_DICTIONARY_DIR_PATH")
+        self.__samplePath = os.path.join(os.path.dirname(self.__dirPath), "dictionary-samples")
+        os.makedirs(self.__samplePath, exist_ok=True)
+        self.__samplePaths = []
+        for index in range(4):
+            samplePath = os.path.join(self.__samplePath, "sample%d.cif" % index)
+            with open(samplePath, "wb") as w:
+                w.write(makeSample(index))
+            self.__samplePaths.append(samplePath)
+        self.__versions = set(os.listdir(self.__dirPath)) if os.path.exists(self.__dirPath) else set()
+
+    def tearDown(self):
+        shutil.rmtree(self.__samplePath, ignore_errors=True)
+        # remove dictionaries built by the test only
+        if os.path.exists(self.__dirPath):
+            for fileName in set(os.listdir(self.__dirPath)) - self.__versions:
+                os.unlink(os.path.join(self.__dirPath, fileName))
+
+    def testBuildDictionary(self):
+        dP = DictionaryProvider(self.__cP)
+        first = dP.buildDictionary("unit-test", self.__samplePaths)
+        second = dP.buildDictionary("unit-test", self.__samplePaths)
+        # versions increase, the latest is offered
+        self.assertEqual(int(second.rsplit("-v", 1)[1]), int(first.rsplit("-v", 1)[1]) + 1)
+        self.assertEqual(dP.getDictionaryId("unit-test"), second)
+        zdict = dP.getDictionary(second)
+        self.assertTrue(zdict and len(zdict) <= 32768)
+        self.assertIn(b"_atom_site.Cartn_x", zdict)
+        self.assertIsNone(dP.getDictionary("../config-v1"))
+        self.assertIsNone(dP.buildDictionary("unit-test", []))
+        # small chunks compress better with the dictionary
+        chunk = makeSample(99)[:4096]
+        codec = CodecProvider.getCodec("zlib", second)
+        compressed = codec.compress(chunk)
+        self.assertLess(len(compressed), len(CodecProvider.getCodec("zlib").compress(chunk)))
+        self.assertEqual(codec.decompress(compressed), chunk)
+        # a dictionary does not apply to gzip, and an unknown dictionary has no codec
+        self.assertIsNone(CodecProvider.getCodec("gzip", second))
+        self.assertIsNone(CodecProvider.getCodec("zlib", "unit-test-v0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+##
+# File:    testExecutors.py
+# Date:    Oct-2026
+# Version: 0.001
+#
+
+import asyncio
+import gzip
+import logging
+import os
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from rcsb.app.file.Executors import Executors
+from rcsb.app.file.IoUtility import IoUtility
+
+logging.basicConfig(level=logging.INFO)
+
+
+class ExecutorsTest(unittest.TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        Executors.shutdown()
+
+    def testRunCpu(self):
+        data = b"data_test\n" * 1000
+        result = asyncio.run(
+            Executors.runCpu(gzip.decompress, gzip.compress(data))
+        )
+        self.assertEqual(result, data)
+        # static methods are picklable for the process pool
+        filePath = os.path.abspath(__file__)
+        digest = asyncio.run(Executors.runCpu(IoUtility.getHashDigest, filePath, "MD5"))
+        self.assertEqual(digest, IoUtility().getHashDigest(filePath, "MD5"))
+        metrics = Executors.getMetrics()["cpu"]
+        self.assertGreaterEqual(metrics["completed"], 2)
+        self.assertEqual(metrics["pending"], 0)
+
+    def testBrokenProcessPool(self):
+        if asyncio.run(Executors.runCpu(os.getpid)) == os.getpid():
+            self.skipTest("no process workers")
+        # a worker that dies breaks the pool
+        with self.assertRaises(BrokenProcessPool):
+            asyncio.run(Executors.runCpu(os._exit, 1))
+        # later tasks run in a new process pool rather than in threads
+        self.assertNotEqual(asyncio.run(Executors.runCpu(os.getpid)), os.getpid())
+
+    def testRunIo(self):
+        before = Executors.getMetrics().get("io", {}).get("failed", 0)
+        self.assertTrue(asyncio.run(Executors.runIo(os.path.exists, __file__)))
+        with self.assertRaises(FileNotFoundError):
+            asyncio.run(Executors.runIo(os.stat, "/nonexistent/path"))
+        metrics = Executors.getMetrics()["io"]
+        self.assertEqual(metrics["failed"], before + 1)
+        self.assertGreaterEqual(metrics["max latency seconds"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,38 @@
 # file - testFileUpload.py
 # author - James Smith 2023
 
+import asyncio
+import glob
+import gzip
+import io
 import json
 import re
 import sys
 import unittest
+import uuid
 import os
 import shutil
+import tempfile
 import logging
 import time
+import zipfile
 from copy import deepcopy
 import math
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from rcsb.app.file.IoUtility import IoUtility
 from rcsb.app.file.main import app
 from rcsb.app.file.JWTAuthToken import JWTAuthToken
 from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.CodecProvider import CodecProvider
+from rcsb.app.file.UploadUtility import UploadUtility
+from rcsb.app.file.Sessions import Sessions
+from rcsb.app.file.DictionaryProvider import DictionaryProvider
+from rcsb.app.file.DeltaProvider import DeltaProvider
+from rcsb.app.file.BundleProvider import BundleProvider
+from rcsb.app.file.StagingProvider import StagingProvider
+from rcsb.app.file.FinalizeProvider import FinalizeProvider
+from rcsb.app.file.StorageProvider import StorageProvider
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -477,12 +494,1208 @@ class UploadTest(unittest.TestCase):
                 )
                 logging.info("uploaded chunk %d", index)
 
+    def testOutOfOrderUpload(self):
+        logging.info("test out of order upload")
+        sourceFilePath = self.__dataFile
+        hashType = self.__hashType
+        fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=hashType)
+        fileSize = os.path.getsize(sourceFilePath)
+        # smaller chunks than configured so that the file has several
+        chunkSize = int(self.__chunkSize) // 4
+        expectedChunks = math.ceil(fileSize / chunkSize)
+        # get upload parameters
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": False,
+            "resumable": False,
+        }
+        response = client.get(
+            url, params=parameters, headers=self.__headerD, timeout=None
+        )
+        self.assertTrue(
+            response.status_code == 200, "error in get upload parameters %r" % response
+        )
+        response = response.json()
+        repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+        mD = {
+            # chunk parameters
+            "chunkSize": chunkSize,
+            "chunkIndex": 0,
+            "expectedChunks": expectedChunks,
+            # upload file parameters
+            "uploadId": response["uploadId"],
+            "hashType": hashType,
+            "hashDigest": fullTestHash,
+            # save file parameters
+            "filePath": response["filePath"],
+            "fileSize": fileSize,
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": False,
+            "resumable": False,
+        }
+        # last chunk first, then the rest in reverse order, with one chunk sent twice
+        order = list(reversed(range(expectedChunks)))
+        order.insert(2, order[1])
+        url = os.path.join(self.__baseUrl, "upload")
+        with open(sourceFilePath, "rb") as r:
+            for index in order:
+                r.seek(index * chunkSize)
+                mD["chunkIndex"] = index
+                response = client.post(
+                    url,
+                    data=deepcopy(mD),
+                    files={"chunk": r.read(chunkSize)},
+                    headers=self.__headerD,
+                    timeout=None,
+                )
+                self.assertTrue(
+                    response.status_code == 200, "error in upload %r" % response
+                )
+                if index != 0:
+                    self.assertFalse(os.path.exists(repositoryFile))
+        self.assertTrue(os.path.exists(repositoryFile))
+        self.assertTrue(IoUtility().checkHash(repositoryFile, fullTestHash, hashType))
+
+    def testPreallocateUpload(self):
+        logging.info("test preallocate upload")
+        sourceFilePath = self.__dataFile
+        hashType = self.__hashType
+        fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=hashType)
+        fileSize = os.path.getsize(sourceFilePath)
+        chunkSize = int(self.__chunkSize) // 4
+        expectedChunks = math.ceil(fileSize / chunkSize)
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": False,
+            "resumable": False,
+            "fileSize": fileSize,
+        }
+        statusUrl = os.path.join(self.__baseUrl, "storageStatus")
+        response = client.get(
+            url, params=parameters, headers=self.__headerD, timeout=None
+        )
+        self.assertTrue(
+            response.status_code == 200, "error in get upload parameters %r" % response
+        )
+        response = response.json()
+        reserved = client.get(statusUrl).json()["repository disk bytes reserved"]
+        repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+        tempPath = Sessions(uploadId=response["uploadId"], cP=self.__cP).getTempFilePath(
+            os.path.dirname(repositoryFile)
+        )
+        mD = {
+            "chunkSize": chunkSize,
+            "chunkIndex": 0,
+            "expectedChunks": expectedChunks,
+            "uploadId": response["uploadId"],
+            "hashType": hashType,
+            "hashDigest": fullTestHash,
+            "filePath": response["filePath"],
+            "fileSize": fileSize,
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": False,
+            "resumable": False,
+        }
+        url = os.path.join(self.__baseUrl, "upload")
+        try:
+            with open(sourceFilePath, "rb") as r:
+                for index in range(expectedChunks):
+                    r.seek(index * chunkSize)
+                    mD["chunkIndex"] = index
+                    response = client.post(
+                        url,
+                        data=deepcopy(mD),
+                        files={"chunk": r.read(chunkSize)},
+                        headers=self.__headerD,
+                        timeout=None,
+                    )
+                    self.assertTrue(
+                        response.status_code == 200, "error in upload %r" % response
+                    )
+                    if index == 0 and expectedChunks > 1:
+                        # chunk 0 reserved the extent of the whole file
+                        self.assertEqual(os.path.getsize(tempPath), fileSize)
+                        # and its allocated bytes left the reservation made with the upload parameters
+                        allocated = Sessions(uploadId=mD["uploadId"], cP=self.__cP).getTempAllocatedBytes(
+                            os.path.dirname(repositoryFile)
+                        )
+                        self.assertEqual(
+                            client.get(statusUrl).json()["repository disk bytes reserved"],
+                            reserved - fileSize + max(fileSize - allocated, 0),
+                        )
+                        # so the free bytes it took (cached here as less than a chunk) do not refuse later chunks
+                        StorageProvider._StorageProvider__free = chunkSize - 1  # pylint: disable=W0212
+                        StorageProvider._StorageProvider__refreshed = time.time()  # pylint: disable=W0212
+        finally:
+            StorageProvider._StorageProvider__refreshed = 0.0  # pylint: disable=W0212
+        self.assertFalse(os.path.exists(tempPath))
+        self.assertTrue(IoUtility().checkHash(repositoryFile, fullTestHash, hashType))
+
+    def testShortUpload(self):
+        logging.info("test short upload")
+        # fewer bytes than the file size, into a temp file preallocated to the file size
+        with open(self.__dataFile, "rb") as r:
+            data = r.read(1024)
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": True,
+            "resumable": False,
+        }
+        response = client.get(url, params=parameters, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in get upload parameters %r" % response)
+        response = response.json()
+        mD = {
+            "chunkSize": len(data),
+            "chunkIndex": 0,
+            "expectedChunks": 1,
+            "uploadId": response["uploadId"],
+            "hashType": self.__hashType,
+            "filePath": response["filePath"],
+            "fileSize": len(data) * 2,
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": True,
+            "resumable": False,
+        }
+        response = client.post(
+            os.path.join(self.__baseUrl, "upload"),
+            data=deepcopy(mD),
+            files={"chunk": data},
+            headers=self.__headerD,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file size comparison failed", response.json()["detail"])
+
+    def testEmptyChunk(self):
+        logging.info("test empty chunk")
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": True,
+            "resumable": False,
+        }
+        response = client.get(url, params=parameters, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in get upload parameters %r" % response)
+        response = response.json()
+        mD = {
+            "chunkSize": self.__chunkSize,
+            "chunkIndex": 0,
+            "expectedChunks": 1,
+            "uploadId": response["uploadId"],
+            "hashType": self.__hashType,
+            "hashDigest": IoUtility().getHashDigest(os.devnull, hashType=self.__hashType),
+            "filePath": response["filePath"],
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": True,
+            "resumable": False,
+        }
+        url = os.path.join(self.__baseUrl, "upload")
+        # an empty chunk is refused with or without a file size
+        for fileSize in (None, 1024):
+            mD2 = deepcopy(mD)
+            if fileSize:
+                mD2["fileSize"] = fileSize
+            response = client.post(url, data=mD2, files={"chunk": b""}, headers=self.__headerD)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("empty file", response.json()["detail"])
+        # unless the file is declared empty
+        mD["fileSize"] = 0
+        response = client.post(url, data=deepcopy(mD), files={"chunk": b""}, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in upload %r" % response)
+
+    def testRawChunkUpload(self):
+        logging.info("test raw chunk upload")
+        sourceFilePath = self.__dataFile
+        hashType = self.__hashType
+        fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=hashType)
+        fileSize = os.path.getsize(sourceFilePath)
+        chunkSize = int(self.__chunkSize)
+        expectedChunks = math.ceil(fileSize / chunkSize)
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": False,
+            "resumable": False,
+        }
+        response = client.get(url, params=parameters, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in get upload parameters %r" % response)
+        response = response.json()
+        uploadId = response["uploadId"]
+        repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+        headerD = dict(self.__headerD)
+        headerD.update(
+            {
+                "X-Chunk-Size": str(chunkSize),
+                "X-Expected-Chunks": str(expectedChunks),
+                "X-Hash-Type": hashType,
+                "X-Hash-Digest": fullTestHash,
+                "X-File-Path": response["filePath"],
+                "X-File-Size": str(fileSize),
+            }
+        )
+        # chunks sent last to first, as raw bodies
+        with open(sourceFilePath, "rb") as r:
+            for index in reversed(range(expectedChunks)):
+                r.seek(index * chunkSize)
+                url = os.path.join(self.__baseUrl, "upload", uploadId, str(index))
+                response = client.put(url, content=r.read(chunkSize), headers=headerD)
+                self.assertEqual(response.status_code, 200, "error in upload %r" % response)
+        self.assertTrue(IoUtility().checkHash(repositoryFile, fullTestHash, hashType))
+
+    def testChunkHashUpload(self):
+        logging.info("test chunk hash upload")
+        sourceFilePath = self.__dataFile
+        hashType = self.__hashType
+        fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=hashType)
+        fileSize = os.path.getsize(sourceFilePath)
+        chunkSize = int(self.__chunkSize) // 4
+        expectedChunks = math.ceil(fileSize / chunkSize)
+        # get upload parameters
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": False,
+            "resumable": False,
+        }
+        response = client.get(
+            url, params=parameters, headers=self.__headerD, timeout=None
+        )
+        self.assertTrue(
+            response.status_code == 200, "error in get upload parameters %r" % response
+        )
+        response = response.json()
+        repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+        mD = {
+            # chunk parameters
+            "chunkSize": chunkSize,
+            "chunkIndex": 0,
+            "expectedChunks": expectedChunks,
+            # upload file parameters
+            "uploadId": response["uploadId"],
+            "hashType": hashType,
+            "hashDigest": fullTestHash,
+            # save file parameters
+            "filePath": response["filePath"],
+            "fileSize": fileSize,
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": False,
+            "resumable": False,
+        }
+        url = os.path.join(self.__baseUrl, "upload")
+        with open(sourceFilePath, "rb") as r:
+            for index in range(expectedChunks):
+                r.seek(index * chunkSize)
+                chunk = r.read(chunkSize)
+                hashObj = IoUtility.getHashObject(hashType)
+                hashObj.update(chunk)
+                mD["chunkIndex"] = index
+                mD["chunkHashDigest"] = hashObj.hexdigest()
+                if index == 1:
+                    # corrupted in transit - rejected without ending the upload
+                    response = client.post(
+                        url,
+                        data=deepcopy(mD),
+                        files={"chunk": b"x" + chunk[1:]},
+                        headers=self.__headerD,
+                        timeout=None,
+                    )
+                    self.assertTrue(
+                        response.status_code == 400, "error in upload %r" % response
+                    )
+                    self.assertIn("chunk hash comparison failed", response.text)
+                # retransmitted
+                response = client.post(
+                    url,
+                    data=deepcopy(mD),
+                    files={"chunk": chunk},
+                    headers=self.__headerD,
+                    timeout=None,
+                )
+                self.assertTrue(
+                    response.status_code == 200, "error in upload %r" % response
+                )
+        # the file was not read again, but every chunk matched its digest, so the whole-file digest is returned
+        self.assertEqual(response.json()["hashDigest"], fullTestHash)
+        self.assertTrue(os.path.exists(repositoryFile))
+        self.assertTrue(IoUtility().checkHash(repositoryFile, fullTestHash, hashType))
+
+    def testStreamUpload(self):
+        logging.info("test stream upload")
+        sourceFilePath = self.__dataFile
+        hashType = self.__hashType
+        # hash refers to the decompressed content
+        fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=hashType)
+        # one continuous stream (of two gzip members) split at arbitrary byte boundaries
+        with open(sourceFilePath, "rb") as r:
+            data = r.read()
+        half = len(data) // 3
+        stream = gzip.compress(data[:half]) + gzip.compress(data[half:])
+        del data
+        fileSize = len(stream)
+        chunkSize = int(self.__chunkSize) // 4 + 7
+        expectedChunks = math.ceil(fileSize / chunkSize)
+        # get upload parameters
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": False,
+            "resumable": False,
+        }
+        response = client.get(
+            url, params=parameters, headers=self.__headerD, timeout=None
+        )
+        self.assertTrue(
+            response.status_code == 200, "error in get upload parameters %r" % response
+        )
+        response = response.json()
+        repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+        mD = {
+            # chunk parameters
+            "chunkSize": chunkSize,
+            "chunkIndex": 0,
+            "expectedChunks": expectedChunks,
+            # upload file parameters
+            "uploadId": response["uploadId"],
+            "hashType": hashType,
+            "hashDigest": fullTestHash,
+            # save file parameters
+            "filePath": response["filePath"],
+            "fileSize": fileSize,
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": False,
+            "resumable": False,
+            "extractStream": True,
+        }
+        # chunks out of order, with one chunk sent twice
+        order = list(reversed(range(expectedChunks)))
+        order.insert(2, order[1])
+        url = os.path.join(self.__baseUrl, "upload")
+        for index in order:
+            mD["chunkIndex"] = index
+            response = client.post(
+                url,
+                data=deepcopy(mD),
+                files={"chunk": stream[index * chunkSize: (index + 1) * chunkSize]},
+                headers=self.__headerD,
+                timeout=None,
+            )
+            self.assertTrue(
+                response.status_code == 200, "error in upload %r" % response
+            )
+            if index != 0:
+                self.assertFalse(os.path.exists(repositoryFile))
+        self.assertTrue(os.path.exists(repositoryFile))
+        self.assertTrue(IoUtility().checkHash(repositoryFile, fullTestHash, hashType))
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(os.path.dirname(repositoryFile), "._" + mD["uploadId"] + ".stream")
+            )
+        )
+
+    def testDecompressUpload(self):
+        logging.info("test decompress upload")
+        hashType = self.__hashType
+        with open(self.__dataFile, "rb") as r:
+            data = r.read()
+        contentHash = IoUtility.getHashObject(hashType)
+        contentHash.update(data)
+        # zip archive (member name differs from the target file name)
+        zipBuffer = io.BytesIO()
+        with zipfile.ZipFile(zipBuffer, "w") as w:
+            w.writestr("member.cif", data[:1000000])
+        uploads = [
+            (".gz", gzip.compress(data), int(self.__chunkSize) // 4),
+            (".zip", zipBuffer.getvalue(), int(self.__chunkSize)),
+        ]
+        del data
+        client = TestClient(app)
+        for fileExtension, compressed, chunkSize in uploads:
+            url = os.path.join(self.__baseUrl, "getUploadParameters")
+            parameters = {
+                "repositoryType": self.__repositoryType,
+                "depId": self.__depId,
+                "contentType": self.__contentType,
+                "milestone": self.__milestone,
+                "partNumber": self.__partNumber,
+                "contentFormat": self.__contentFormat,
+                "version": self.__version,
+                "allowOverwrite": True,
+                "resumable": False,
+            }
+            response = client.get(
+                url, params=parameters, headers=self.__headerD, timeout=None
+            )
+            self.assertTrue(
+                response.status_code == 200, "error in get upload parameters %r" % response
+            )
+            response = response.json()
+            repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+            # hash digest refers to the compressed file
+            compressedHash = IoUtility.getHashObject(hashType)
+            compressedHash.update(compressed)
+            fileSize = len(compressed)
+            expectedChunks = math.ceil(fileSize / chunkSize)
+            mD = {
+                "chunkSize": chunkSize,
+                "chunkIndex": 0,
+                "expectedChunks": expectedChunks,
+                "uploadId": response["uploadId"],
+                "hashType": hashType,
+                "hashDigest": compressedHash.hexdigest(),
+                "filePath": response["filePath"],
+                "fileSize": fileSize,
+                "fileExtension": fileExtension,
+                "decompress": True,
+                "allowOverwrite": True,
+                "resumable": False,
+            }
+            url = os.path.join(self.__baseUrl, "upload")
+            for index in reversed(range(expectedChunks)):
+                mD["chunkIndex"] = index
+                response = client.post(
+                    url,
+                    data=deepcopy(mD),
+                    files={"chunk": compressed[index * chunkSize: (index + 1) * chunkSize]},
+                    headers=self.__headerD,
+                    timeout=None,
+                )
+                self.assertTrue(
+                    response.status_code == 200, "error in upload %r" % response
+                )
+            self.assertTrue(os.path.exists(repositoryFile))
+            if fileExtension == ".gz":
+                # digest of the stored content is recorded as it is decompressed
+                self.assertEqual(response.json()["hashDigest"], contentHash.hexdigest())
+                self.assertTrue(
+                    IoUtility().checkHash(repositoryFile, contentHash.hexdigest(), hashType)
+                )
+            else:
+                self.assertEqual(os.path.getsize(repositoryFile), 1000000)
+            # nothing left beside the stored file
+            self.assertEqual(
+                os.listdir(os.path.dirname(repositoryFile)),
+                [os.path.basename(repositoryFile)],
+            )
+
+    def testCodecUpload(self):
+        logging.info("test codec upload")
+        hashType = self.__hashType
+        with open(self.__dataFile, "rb") as r:
+            data = r.read()
+        fullTestHash = IoUtility().getHashDigest(self.__dataFile, hashType=hashType)
+        chunkSize = int(self.__chunkSize) // 2
+        client = TestClient(app)
+        # chunks compressed one by one, then one stream split at arbitrary byte boundaries
+        for offered, expected, extractStream in [
+            ("brotli,zstd,gzip", "zstd", False),
+            ("lz4", "lz4", True),
+        ]:
+            url = os.path.join(self.__baseUrl, "getUploadParameters")
+            parameters = {
+                "repositoryType": self.__repositoryType,
+                "depId": self.__depId,
+                "contentType": self.__contentType,
+                "milestone": self.__milestone,
+                "partNumber": self.__partNumber,
+                "contentFormat": self.__contentFormat,
+                "version": self.__version,
+                "allowOverwrite": True,
+                "resumable": False,
+                "compressionTypes": offered,
+            }
+            response = client.get(
+                url, params=parameters, headers=self.__headerD, timeout=None
+            )
+            self.assertTrue(
+                response.status_code == 200, "error in get upload parameters %r" % response
+            )
+            response = response.json()
+            self.assertEqual(response["compressionType"], expected)
+            codec = CodecProvider.getCodec(response["compressionType"])
+            repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+            if extractStream:
+                chunks = [codec.compress(data)]
+                chunks = [
+                    chunks[0][i: i + chunkSize] for i in range(0, len(chunks[0]), chunkSize)
+                ]
+                fileSize = sum(len(chunk) for chunk in chunks)
+            else:
+                chunks = [
+                    codec.compress(data[i: i + chunkSize]) for i in range(0, len(data), chunkSize)
+                ]
+                fileSize = len(data)
+            mD = {
+                "chunkSize": chunkSize,
+                "chunkIndex": 0,
+                "expectedChunks": len(chunks),
+                "uploadId": response["uploadId"],
+                "hashType": hashType,
+                "hashDigest": fullTestHash,
+                "filePath": response["filePath"],
+                "fileSize": fileSize,
+                "fileExtension": None,
+                "decompress": False,
+                "allowOverwrite": True,
+                "resumable": False,
+                "extractChunk": not extractStream,
+                "extractStream": extractStream,
+                "compressionType": response["compressionType"],
+            }
+            url = os.path.join(self.__baseUrl, "upload")
+            for index, chunk in enumerate(chunks):
+                mD["chunkIndex"] = index
+                response = client.post(
+                    url,
+                    data=deepcopy(mD),
+                    files={"chunk": chunk},
+                    headers=self.__headerD,
+                    timeout=None,
+                )
+                self.assertTrue(
+                    response.status_code == 200, "error in upload %r" % response
+                )
+            self.assertTrue(IoUtility().checkHash(repositoryFile, fullTestHash, hashType))
+        # no offered type in common
+        parameters["compressionTypes"] = "brotli"
+        response = client.get(
+            os.path.join(self.__baseUrl, "getUploadParameters"),
+            params=parameters,
+            headers=self.__headerD,
+            timeout=None,
+        )
+        self.assertIsNone(response.json()["compressionType"])
+
+    def testAdaptiveUpload(self):
+        logging.info("test adaptive upload")
+        hashType = self.__hashType
+        chunkSize = int(self.__chunkSize) // 2
+        # random chunks are stored, text chunks are compressed
+        with open(self.__dataFile, "rb") as r:
+            data = r.read(chunkSize * 2)
+        text = b"ATOM   1  N   MET A   1      11.104  13.207  10.567  1.00 20.00           N\n"
+        data += (text * (chunkSize // len(text) + 1))[:chunkSize]
+        contentHash = IoUtility.getHashObject(hashType)
+        contentHash.update(data)
+        uU = UploadUtility(self.__cP)
+        chunks = [
+            uU.compressChunkAdaptive(data[i: i + chunkSize], "gzip", "strong")
+            for i in range(0, len(data), chunkSize)
+        ]
+        self.assertEqual([c for c, _ in chunks], ["store", "store", "gzip"])
+        self.assertLess(len(chunks[2][1]), chunkSize // 10)
+        # policy of a content format that is already compressed
+        self.assertEqual(uU.compressChunkAdaptive(data[-chunkSize:], "gzip", "store")[0], "store")
+        client = TestClient(app)
+        before = client.get(os.path.join(self.__baseUrl, "compressionStatus")).json()
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": True,
+            "resumable": False,
+        }
+        response = client.get(
+            url, params=parameters, headers=self.__headerD, timeout=None
+        )
+        self.assertTrue(
+            response.status_code == 200, "error in get upload parameters %r" % response
+        )
+        response = response.json()
+        repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+        mD = {
+            "chunkSize": chunkSize,
+            "chunkIndex": 0,
+            "expectedChunks": len(chunks),
+            "uploadId": response["uploadId"],
+            "hashType": hashType,
+            "hashDigest": contentHash.hexdigest(),
+            "filePath": response["filePath"],
+            "fileSize": len(data),
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": True,
+            "resumable": False,
+            "extractChunk": True,
+        }
+        url = os.path.join(self.__baseUrl, "upload")
+        for index, (compressionType, chunk) in enumerate(chunks):
+            # compression type marks each chunk
+            mD["chunkIndex"] = index
+            mD["compressionType"] = compressionType
+            response = client.post(
+                url,
+                data=deepcopy(mD),
+                files={"chunk": chunk},
+                headers=self.__headerD,
+                timeout=None,
+            )
+            self.assertTrue(
+                response.status_code == 200, "error in upload %r" % response
+            )
+        self.assertTrue(
+            IoUtility().checkHash(repositoryFile, contentHash.hexdigest(), hashType)
+        )
+        after = client.get(os.path.join(self.__baseUrl, "compressionStatus")).json()
+        self.assertEqual(after["chunks received"] - before["chunks received"], 3)
+        self.assertEqual(
+            after["chunks stored uncompressed"] - before["chunks stored uncompressed"], 2
+        )
+        self.assertEqual(
+            after["chunk bytes saved"] - before["chunk bytes saved"],
+            chunkSize - len(chunks[2][1]),
+        )
+
+    def testDictionaryUpload(self):
+        logging.info("test dictionary upload")
+        hashType = self.__hashType
+        # pdbx samples in the repository
+        text = b"".join(
+            b"_atom_site.Cartn_x %d\n_atom_site.Cartn_y %d\n_struct.title sample %d\n" % (i, i * 7, i)
+            for i in range(500)
+        )
+        sampleDir = os.path.join(self.__unitTestFolder, "D_1000000002")
+        os.makedirs(sampleDir, exist_ok=True)
+        for index in range(3):
+            with open(os.path.join(sampleDir, "D_1000000002_model_P%d.cif.V1" % index), "wb") as w:
+                w.write(text)
+        dP = DictionaryProvider(self.__cP)
+        self.assertEqual(len(dP.findSamples("pdbx")), 3)
+        dictionaryId = dP.buildDictionary("pdbx")
+        try:
+            client = TestClient(app)
+            url = os.path.join(self.__baseUrl, "getUploadParameters")
+            parameters = {
+                "repositoryType": self.__repositoryType,
+                "depId": self.__depId,
+                "contentType": self.__contentType,
+                "milestone": self.__milestone,
+                "partNumber": self.__partNumber,
+                "contentFormat": self.__contentFormat,
+                "version": self.__version,
+                "allowOverwrite": True,
+                "resumable": False,
+                "compressionTypes": "gzip,zlib",
+                "compressionDictionary": True,
+            }
+            response = client.get(
+                url, params=parameters, headers=self.__headerD, timeout=None
+            )
+            self.assertTrue(
+                response.status_code == 200, "error in get upload parameters %r" % response
+            )
+            response = response.json()
+            self.assertEqual(response["compressionType"], "zlib")
+            self.assertEqual(response["compressionDictionary"], dictionaryId)
+            zdict = client.get(
+                os.path.join(self.__baseUrl, "compressionDictionary"),
+                params={"dictionaryId": dictionaryId},
+                headers=self.__headerD,
+            ).content
+            self.assertEqual(zdict, dP.getDictionary(dictionaryId))
+            repositoryFile = os.path.join(self.__dataPath, response["filePath"])
+            chunkSize = 4096
+            chunks = [
+                UploadUtility(self.__cP).compressChunk(text[i: i + chunkSize], "zlib", dictionaryId)
+                for i in range(0, len(text), chunkSize)
+            ]
+            contentHash = IoUtility.getHashObject(hashType)
+            contentHash.update(text)
+            mD = {
+                "chunkSize": chunkSize,
+                "chunkIndex": 0,
+                "expectedChunks": len(chunks),
+                "uploadId": response["uploadId"],
+                "hashType": hashType,
+                "hashDigest": contentHash.hexdigest(),
+                "filePath": response["filePath"],
+                "fileSize": len(text),
+                "fileExtension": None,
+                "decompress": False,
+                "allowOverwrite": True,
+                "resumable": False,
+                "extractChunk": True,
+                "compressionType": "zlib",
+                "compressionDictionary": "pdbx-v0",
+            }
+            url = os.path.join(self.__baseUrl, "upload")
+            # unknown dictionary
+            response = client.post(
+                url, data=deepcopy(mD), files={"chunk": chunks[0]}, headers=self.__headerD
+            )
+            self.assertEqual(response.status_code, 400)
+            mD["compressionDictionary"] = dictionaryId
+            for index, chunk in enumerate(chunks):
+                mD["chunkIndex"] = index
+                response = client.post(
+                    url,
+                    data=deepcopy(mD),
+                    files={"chunk": chunk},
+                    headers=self.__headerD,
+                    timeout=None,
+                )
+                self.assertTrue(
+                    response.status_code == 200, "error in upload %r" % response
+                )
+            self.assertTrue(
+                IoUtility().checkHash(repositoryFile, contentHash.hexdigest(), hashType)
+            )
+        finally:
+            os.unlink(os.path.join(dP.dirPath, dictionaryId + ".zdict"))
+
+    def testIdenticalUpload(self):
+        logging.info("test identical upload")
+        # version 1 of the file is already stored
+        shutil.copyfile(self.__dataFile, self.__repositoryFile)
+        fullTestHash = IoUtility().getHashDigest(self.__dataFile, hashType=self.__hashType)
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": "next",
+            "allowOverwrite": False,
+            "resumable": False,
+            "fileSize": os.path.getsize(self.__dataFile),
+            "hashType": self.__hashType,
+            "hashDigest": fullTestHash,
+        }
+        # found by hashing the deposition directory, then by the digest index
+        for _ in range(2):
+            response = client.get(url, params=parameters, headers=self.__headerD)
+            self.assertEqual(response.status_code, 200, "error in get upload parameters %r" % response)
+            result = response.json()
+            self.assertTrue(result["satisfied"])
+            filePath = os.path.join(self.__dataPath, result["filePath"])
+            self.assertNotEqual(filePath, self.__repositoryFile)
+            self.assertTrue(IoUtility().checkHash(filePath, fullTestHash, self.__hashType))
+        # different content is uploaded
+        parameters["hashDigest"] = "0" * len(fullTestHash)
+        response = client.get(url, params=parameters, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in get upload parameters %r" % response)
+        self.assertFalse(response.json()["satisfied"])
+
+    def testSmallFileUpload(self):
+        logging.info("test small file upload")
+        data = os.urandom(int(self.__chunkSize) // 2)
+        hashObj = IoUtility.getHashObject(self.__hashType)
+        hashObj.update(data)
+        client = TestClient(app)
+        statusUrl = os.path.join(self.__baseUrl, "storageStatus")
+        before = client.get(statusUrl).json()
+        url = os.path.join(self.__baseUrl, "uploadFile")
+        mD = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "hashType": self.__hashType,
+            "hashDigest": hashObj.hexdigest(),
+            "fileSize": len(data),
+            "allowOverwrite": False,
+        }
+        response = client.post(url, data=deepcopy(mD), files={"file": data}, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in upload file %r" % response)
+        repositoryFile = os.path.join(self.__dataPath, response.json()["filePath"])
+        with open(repositoryFile, "rb") as r:
+            self.assertEqual(r.read(), data)
+        # no temp file is left
+        dirPath = os.path.dirname(repositoryFile)
+        self.assertFalse([name for name in os.listdir(dirPath) if name.startswith("._")])
+        # return 403 (file already exists)
+        response = client.post(url, data=deepcopy(mD), files={"file": data}, headers=self.__headerD)
+        self.assertEqual(response.status_code, 403)
+        # return 400 (hash comparison failed)
+        mD["allowOverwrite"] = True
+        mD["hashDigest"] = "0" * len(mD["hashDigest"])
+        response = client.post(url, data=deepcopy(mD), files={"file": data}, headers=self.__headerD)
+        self.assertEqual(response.status_code, 400)
+        with open(repositoryFile, "rb") as r:
+            self.assertEqual(r.read(), data)
+        # identical content is linked rather than stored again
+        mD["partNumber"] = self.__partNumber + 1
+        mD["hashDigest"] = hashObj.hexdigest()
+        response = client.post(url, data=deepcopy(mD), files={"file": data}, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in upload file %r" % response)
+        self.assertTrue(response.json()["satisfied"])
+        linkedFile = os.path.join(self.__dataPath, response.json()["filePath"])
+        self.assertEqual(os.stat(linkedFile).st_ino, os.stat(repositoryFile).st_ino)
+        # the reservation is released with the request
+        status = client.get(statusUrl).json()
+        self.assertEqual(status["uploads reserving disk"], before["uploads reserving disk"])
+
+    def testDeltaUpload(self):
+        logging.info("test delta upload")
+        # version 1 is stored (pdbx content as .cif), version 2 differs by an insertion
+        baseFilePath = os.path.join(
+            self.__unitTestFolder,
+            self.__depId,
+            f"{self.__depId}_{self.__contentType}{self.__convertedMilestone}_P{self.__partNumber}.{self.__convertedContentFormat}.V1",
+        )
+        shutil.copyfile(self.__dataFile, baseFilePath)
+        sourceFilePath = os.path.join(self.__dataPath, "testFile.delta.dat")
+        with open(self.__dataFile, "rb") as r, open(sourceFilePath, "wb") as w:
+            w.write(r.read(100000) + b"inserted" + r.read())
+        try:
+            fullTestHash = IoUtility().getHashDigest(sourceFilePath, hashType=self.__hashType)
+            fileSize = os.path.getsize(sourceFilePath)
+            client = TestClient(app)
+            parameters = {
+                "repositoryType": self.__repositoryType,
+                "depId": self.__depId,
+                "contentType": self.__contentType,
+                "milestone": self.__milestone,
+                "partNumber": self.__partNumber,
+                "contentFormat": self.__contentFormat,
+            }
+            response = client.get(
+                os.path.join(self.__baseUrl, "deltaSignatures"),
+                params=parameters,
+                headers=self.__headerD,
+            )
+            self.assertEqual(response.status_code, 200, "error in delta signatures %r" % response)
+            signatureD = response.json()
+            self.assertEqual(os.path.join(self.__dataPath, signatureD["filePath"]), baseFilePath)
+            deltaFilePath = sourceFilePath + ".delta"
+            deltaSize = DeltaProvider.makeDelta(sourceFilePath, signatureD, deltaFilePath)
+            self.assertLess(deltaSize, fileSize // 10)
+            parameters.update({"version": "next", "allowOverwrite": False, "resumable": False})
+            response = client.get(
+                os.path.join(self.__baseUrl, "getUploadParameters"),
+                params=parameters,
+                headers=self.__headerD,
+            )
+            self.assertEqual(response.status_code, 200, "error in get upload parameters %r" % response)
+            result = response.json()
+            mD = {
+                "chunkSize": self.__chunkSize,
+                "chunkIndex": 0,
+                "expectedChunks": 1,
+                "uploadId": result["uploadId"],
+                "hashType": self.__hashType,
+                "hashDigest": fullTestHash,
+                "filePath": result["filePath"],
+                "fileSize": fileSize,
+                "baseFilePath": signatureD["filePath"],
+                "blockSize": signatureD["blockSize"],
+                "allowOverwrite": False,
+                "resumable": False,
+            }
+            with open(deltaFilePath, "rb") as r:
+                response = client.post(
+                    os.path.join(self.__baseUrl, "uploadDelta"),
+                    data=deepcopy(mD),
+                    files={"chunk": r.read()},
+                    headers=self.__headerD,
+                )
+            self.assertEqual(response.status_code, 200, "error in delta upload %r" % response)
+            filePath = os.path.join(self.__dataPath, result["filePath"])
+            self.assertTrue(IoUtility().checkHash(filePath, fullTestHash, self.__hashType))
+        finally:
+            for path in [sourceFilePath, sourceFilePath + ".delta"]:
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def testBundleUpload(self):
+        logging.info("test bundle upload")
+        hashType = self.__hashType
+        fullTestHash = IoUtility().getHashDigest(self.__dataFile, hashType=hashType)
+        # part 1, as stored (pdbx content as .cif)
+        repositoryFile = os.path.join(
+            self.__unitTestFolder,
+            self.__depId,
+            f"{self.__depId}_{self.__contentType}{self.__convertedMilestone}_P1.{self.__convertedContentFormat}.V{self.__version}",
+        )
+        manifest = [
+            {
+                "contentType": self.__contentType,
+                "milestone": self.__milestone,
+                "partNumber": partNumber,
+                "contentFormat": self.__contentFormat,
+                "version": self.__version,
+                "fileSize": os.path.getsize(self.__dataFile),
+                "hashDigest": fullTestHash,
+            }
+            for partNumber in [1, 2]
+        ]
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "uploadBundle")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "hashType": hashType,
+            "allowOverwrite": False,
+        }
+        # a file that fails its hash comparison saves none
+        manifest[1]["hashDigest"] = "0" * len(fullTestHash)
+        body = io.BytesIO()
+        BundleProvider.writeBundle(body, [self.__dataFile] * 2, manifest)
+        response = client.post(url, params=parameters, content=body.getvalue(), headers=self.__headerD)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(repositoryFile))
+        manifest[1]["hashDigest"] = fullTestHash
+        body = io.BytesIO()
+        BundleProvider.writeBundle(body, [self.__dataFile] * 2, manifest)
+        response = client.post(url, params=parameters, content=body.getvalue(), headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in bundle upload %r" % response)
+        files = response.json()["files"]
+        self.assertEqual(len(files), 2)
+        self.assertEqual(os.path.join(self.__dataPath, files[0]["filePath"]), repositoryFile)
+        for result in files:
+            self.assertEqual(result["hashDigest"], fullTestHash)
+            filePath = os.path.join(self.__dataPath, result["filePath"])
+            self.assertTrue(IoUtility().checkHash(filePath, fullTestHash, hashType))
+        # no temp files are left
+        self.assertEqual(glob.glob(os.path.join(os.path.dirname(repositoryFile), "._*")), [])
+
+    def testStagedUpload(self):
+        logging.info("test staged upload")
+        fullTestHash = IoUtility().getHashDigest(self.__dataFile, hashType=self.__hashType)
+        stagingDir = tempfile.mkdtemp()
+        try:
+            cP = ConfigProvider()
+            cP._set("STAGING_DIR_PATH", stagingDir)
+            dirPath = os.path.dirname(self.__repositoryFile)
+            session = Sessions(uploadId=None, cP=cP, kV=False)
+            session.uploadId = session.getNewUploadId()
+            self.assertTrue(session.isStagedHere())
+            session.makeTempDir(dirPath)
+            tempPath = session.getTempFilePath(dirPath)
+            # same repository type and dep id directories, so the placeholder is the same
+            self.assertTrue(tempPath.startswith(stagingDir))
+            self.assertEqual(
+                os.path.basename(session.getPlaceholderFile(tempPath)),
+                "%s~%s~%s" % (self.__repositoryType, self.__depId, session.uploadId),
+            )
+            self.assertEqual(StagingProvider.copyFile(self.__dataFile, tempPath), os.path.getsize(self.__dataFile))
+            asyncio.run(UploadUtility(cP).saveFile(tempPath, self.__repositoryFile, False))
+            self.assertFalse(os.path.exists(tempPath))
+            self.assertEqual(glob.glob(os.path.join(glob.escape(dirPath), "._*")), [])
+            self.assertTrue(IoUtility().checkHash(self.__repositoryFile, fullTestHash, self.__hashType))
+            # sessions staged by another server are not written here, sessions begun in place still are
+            self.assertFalse(session.isStagedHere("00000000-" + session.uploadId.split("-")[1]))
+            self.assertTrue(session.isStagedHere(session.uploadId.split("-")[1]))
+        finally:
+            shutil.rmtree(stagingDir)
+
+    def testBackgroundFinalize(self):
+        logging.info("test background finalize")
+        cP = ConfigProvider()
+        cP._set("ASYNC_FINALIZE_BYTES", 1024)
+        finalizeProvider = FinalizeProvider(cP)
+        self.assertTrue(finalizeProvider.isBackground(1024))
+        self.assertFalse(finalizeProvider.isBackground(1023))
+        doneId = uuid.uuid4().hex
+        failedId = uuid.uuid4().hex
+
+        async def finalize(fail):
+            await asyncio.sleep(1)
+            if fail:
+                raise HTTPException(status_code=400, detail="MD5 hash comparison failed")
+            return {"hashType": "MD5", "hashDigest": "0" * 32}
+
+        async def finalizeJobs():
+            running = await finalizeProvider.start(doneId, finalize(False))
+            self.assertEqual(running["statusCode"], 202)
+            await finalizeProvider.start(failedId, finalize(True))
+            self.assertEqual((await finalizeProvider.getStatus(doneId))["status"], FinalizeProvider.RUNNING)
+            return await finalizeProvider.waitStatus(doneId, 10), await finalizeProvider.waitStatus(failedId, 10)
+
+        done, failed = asyncio.run(finalizeJobs())
+        self.assertEqual(done["status"], FinalizeProvider.DONE)
+        self.assertEqual(done["result"]["hashDigest"], "0" * 32)
+        self.assertEqual(failed["status"], FinalizeProvider.FAILED)
+        # a chunk resent after its upload went to background finalization gets the status, not a new temp file
+        with open(self.__dataFile, "rb") as r:
+            data = r.read(1024)
+        statusD = asyncio.run(
+            UploadUtility(cP).upload(
+                chunk=io.BytesIO(data),
+                chunkSize=len(data),
+                chunkIndex=0,
+                expectedChunks=2,
+                uploadId=doneId,
+                hashType=self.__hashType,
+                hashDigest=None,
+                filePath=os.path.relpath(self.__repositoryFile, self.__dataPath),
+                fileSize=len(data) * 2,
+                fileExtension=None,
+                decompress=False,
+                allowOverwrite=True,
+                resumable=False,
+                extractChunk=False,
+            )
+        )
+        self.assertEqual(statusD["status"], FinalizeProvider.DONE)
+        session = Sessions(uploadId=doneId, cP=cP, kV=False)
+        tempPath = session.getTempFilePath(os.path.dirname(self.__repositoryFile))
+        self.assertFalse(os.path.exists(tempPath))
+        self.assertFalse(os.path.exists(session.getPlaceholderFile(tempPath)))
+        # the status endpoint responds with the status code of the finalization, from any server process
+        client = TestClient(app)
+        url = os.path.join(self.__baseUrl, "uploadStatus")
+        response = client.get(os.path.join(url, doneId), params={"wait": 1}, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in upload status %r" % response)
+        self.assertEqual(response.json()["result"]["hashType"], "MD5")
+        response = client.get(os.path.join(url, failedId), headers=self.__headerD)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("hash comparison failed", response.json()["detail"])
+        response = client.get(os.path.join(url, uuid.uuid4().hex), headers=self.__headerD)
+        self.assertEqual(response.status_code, 404)
+
+    def testDiskReservation(self):
+        logging.info("test disk reservation")
+        client = TestClient(app)
+        statusUrl = os.path.join(self.__baseUrl, "storageStatus")
+        before = client.get(statusUrl).json()
+        # two uploads that each fit in the free space, but not together
+        fileSize = before["repository disk bytes available"] // 2 + 1
+        url = os.path.join(self.__baseUrl, "getUploadParameters")
+        parameters = {
+            "repositoryType": self.__repositoryType,
+            "depId": self.__depId,
+            "contentType": self.__contentType,
+            "milestone": self.__milestone,
+            "partNumber": self.__partNumber,
+            "contentFormat": self.__contentFormat,
+            "version": self.__version,
+            "allowOverwrite": True,
+            "resumable": False,
+            "fileSize": fileSize,
+        }
+        response = client.get(url, params=parameters, headers=self.__headerD)
+        self.assertEqual(response.status_code, 200, "error in get upload parameters %r" % response)
+        result = response.json()
+        status = client.get(statusUrl).json()
+        self.assertEqual(
+            status["repository disk bytes reserved"],
+            before["repository disk bytes reserved"] + fileSize,
+        )
+        parameters["partNumber"] = self.__partNumber + 1
+        response = client.get(url, params=parameters, headers=self.__headerD)
+        self.assertEqual(response.status_code, 507)
+        # the first upload closes and releases its reservation
+        with open(self.__dataFile, "rb") as r:
+            data = r.read(1024)
+        mD = {
+            "chunkSize": self.__chunkSize,
+            "chunkIndex": 0,
+            "expectedChunks": 1,
+            "uploadId": result["uploadId"],
+            "hashType": self.__hashType,
+            "filePath": result["filePath"],
+            "fileSize": len(data),
+            "fileExtension": None,
+            "decompress": False,
+            "allowOverwrite": True,
+            "resumable": False,
+            "extractChunk": False,
+        }
+        response = client.post(
+            os.path.join(self.__baseUrl, "upload"),
+            data=deepcopy(mD),
+            files={"chunk": data},
+            headers=self.__headerD,
+        )
+        self.assertEqual(response.status_code, 200, "error in upload %r" % response)
+        status = client.get(statusUrl).json()
+        self.assertEqual(
+            status["repository disk bytes reserved"],
+            before["repository disk bytes reserved"],
+        )
+
 
 def upload_tests():
     suite = unittest.TestSuite()
     suite.addTest(UploadTest("testSimpleUpload"))
     suite.addTest(UploadTest("testSimpleUpdate"))
     suite.addTest(UploadTest("testResumableUpload"))
+    suite.addTest(UploadTest("testOutOfOrderUpload"))
+    suite.addTest(UploadTest("testPreallocateUpload"))
+    suite.addTest(UploadTest("testShortUpload"))
+    suite.addTest(UploadTest("testEmptyChunk"))
+    suite.addTest(UploadTest("testRawChunkUpload"))
+    suite.addTest(UploadTest("testChunkHashUpload"))
+    suite.addTest(UploadTest("testStreamUpload"))
+    suite.addTest(UploadTest("testDecompressUpload"))
+    suite.addTest(UploadTest("testCodecUpload"))
+    suite.addTest(UploadTest("testAdaptiveUpload"))
+    suite.addTest(UploadTest("testDictionaryUpload"))
+    suite.addTest(UploadTest("testIdenticalUpload"))
+    suite.addTest(UploadTest("testSmallFileUpload"))
+    suite.addTest(UploadTest("testDeltaUpload"))
+    suite.addTest(UploadTest("testBundleUpload"))
+    suite.addTest(UploadTest("testStagedUpload"))
+    suite.addTest(UploadTest("testBackgroundFinalize"))
+    suite.addTest(UploadTest("testDiskReservation"))
     return suite
 
 
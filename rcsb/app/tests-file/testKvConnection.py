@@ -5,6 +5,9 @@
 # Version: 0.001
 #
 
+import os
+import sqlite3
+import tempfile
 import unittest
 from rcsb.app.file.ConfigProvider import ConfigProvider
 from rcsb.app.file.KvConnection import KvConnection
@@ -23,6 +26,58 @@ class KvConnectionTest(unittest.TestCase):
         self.assertTrue(connection is not None)
         connection.close()
 
+    def testSharedConnection(self):
+        cP = ConfigProvider()
+        filePath = cP.get("KV_FILE_PATH")
+        mapTable = cP.get("KV_MAP_TABLE_NAME")
+        kV = KvConnection(filePath, cP.get("KV_SESSION_TABLE_NAME"), mapTable, cP.get("KV_LOCK_TABLE_NAME"))
+        # reused by every call of this thread, in wal mode
+        connection = kV.getSharedConnection()
+        self.assertIs(connection, kV.getSharedConnection())
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        # a set replaces the row of its key
+        kV.set("testSharedConnection", "1", mapTable)
+        kV.set("testSharedConnection", "2", mapTable)
+        self.assertEqual(kV.get("testSharedConnection", mapTable), "2")
+        self.assertEqual(len([row for row in kV.getAll(mapTable) if row[0] == "testSharedConnection"]), 1)
+        kV.clear("testSharedConnection", mapTable)
+        self.assertIsNone(kV.get("testSharedConnection", mapTable))
+
+    def testSchema(self):
+        cP = ConfigProvider()
+        filePath = cP.get("KV_FILE_PATH")
+        sessionTable = cP.get("KV_SESSION_TABLE_NAME")
+        mapTable = cP.get("KV_MAP_TABLE_NAME")
+        kV = KvConnection(filePath, sessionTable, mapTable, cP.get("KV_LOCK_TABLE_NAME"))
+        connection = kV.getSharedConnection()
+        # lookups of a session, a map val, and expired rows are index searches
+        for query, params in (
+            (f"SELECT val FROM {sessionTable} WHERE key = ? AND field = ?", ("a", "b")),
+            (f"DELETE FROM {mapTable} WHERE val = ?", ("a",)),
+            (f"DELETE FROM {sessionTable} WHERE expires_at <= ?", (0,)),
+        ):
+            plan = " ".join(row[-1] for row in connection.execute("EXPLAIN QUERY PLAN " + query, params))
+            self.assertIn("USING", plan, query)
+
+    def testMigrateSchema(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            filePath = os.path.join(tempDir, "kv.sqlite")
+            # tables of the older schema
+            connection = sqlite3.connect(filePath)
+            connection.execute("CREATE TABLE sessions (key, val)")
+            connection.execute("CREATE TABLE map (key, val)")
+            connection.execute("CREATE TABLE lock (key, val)")
+            connection.execute("INSERT INTO sessions VALUES (?, ?)", ("upload", str({"chunkSize": 8, "bitmap": "3"})))
+            connection.execute("INSERT INTO map VALUES (?, ?)", ("file", "old"))
+            connection.execute("INSERT INTO map VALUES (?, ?)", ("file", "upload"))
+            connection.commit()
+            connection.close()
+            kV = KvConnection(filePath, "sessions", "map", "lock")
+            self.assertEqual(kV.getFields("upload"), {"chunkSize": 8, "bitmap": "3"})
+            self.assertEqual(kV.get("file", "map"), "upload")
+            self.assertEqual(len(kV.getAll("map")), 1)
+            kV.getSharedConnection().close()
+
 
 if __name__ == "__main__":
     unittest.main()
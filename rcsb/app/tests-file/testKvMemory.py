@@ -0,0 +1,95 @@
+##
+# File:    testKvMemory.py
+# Author:  James Smith
+# Date:    Jan-2023
+# Version: 0.001
+#
+
+import os
+import tempfile
+import time
+import unittest
+import logging
+from rcsb.app.file.ConfigProvider import ConfigProvider
+from rcsb.app.file.KvMemory import KvMemory
+
+logging.basicConfig(level=logging.INFO)
+
+
+class KvMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.cP = ConfigProvider()
+        kV = KvMemory(self.cP)
+        kV.clearTable(kV.sessionTable)
+        kV.clearTable(kV.mapTable)
+
+    def testKv(self):
+        kV = KvMemory(self.cP)
+        # test map table
+        kV.setMap("test", "pass")
+        self.assertTrue(kV.getMap("test") == "pass")
+        self.assertTrue(kV.clearMapVal("pass"))
+        self.assertIsNone(kV.getMap("test"))
+        # test sessions table, shared by every instance of the process
+        kV.setSession("test", "result", "pass")
+        self.assertTrue(KvMemory(self.cP).getSession("test", "result") == "pass")
+        self.assertEqual(kV.getSession("test", "missing"), 0)
+        self.assertEqual(kV.setSessionBit("test", "bitmap", 1), (True, 1))
+        self.assertEqual(kV.setSessionBit("test", "bitmap", 1), (False, 1))
+        self.assertEqual(kV.clearSessionBit("test", "bitmap", 1), (True, 0))
+        self.assertEqual(kV.clearSessionBit("test", "bitmap", 1), (False, 0))
+        self.assertTrue(kV.setSessionIf("test", "owner", "", "a"))
+        self.assertFalse(kV.setSessionIf("test", "owner", "", "b"))
+        self.assertTrue(kV.clearSessionVal("test", "result"))
+        self.assertTrue(kV.clearSessionKey("test"))
+        self.assertIsNone(kV.getKey("test", kV.sessionTable))
+
+    def testExpiry(self):
+        self.cP._set("KV_MAX_SECONDS", 1)
+        try:
+            kV = KvMemory(self.cP)
+            kV.setSession("testExpiry", "result", "pass")
+            self.assertEqual(kV.getSession("testExpiry", "result"), "pass")
+            time.sleep(1.1)
+            self.assertEqual(kV.getSession("testExpiry", "result"), 0)
+            kV.setSession("testPurge", "result", "pass")
+            time.sleep(1.1)
+            self.assertEqual(kV.purgeExpired(), 1)
+        finally:
+            self.cP._set("KV_MAX_SECONDS", 14400)
+
+    def testEviction(self):
+        self.cP._set("KV_MEMORY_MAX_KEYS", 2)
+        try:
+            kV = KvMemory(self.cP)
+            kV.setMap("a", "1")
+            kV.setMap("b", "2")
+            # a is used, so b is the least recently used
+            kV.getMap("a")
+            kV.setMap("c", "3")
+            self.assertEqual(kV.getMap("a"), "1")
+            self.assertIsNone(kV.getMap("b"))
+            self.assertEqual(kV.getMap("c"), "3")
+        finally:
+            self.cP._set("KV_MEMORY_MAX_KEYS", 100000)
+
+    def testSnapshot(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            self.cP._set("KV_SNAPSHOT_PATH", os.path.join(tempDir, "kv.json"))
+            try:
+                kV = KvMemory(self.cP)
+                kV.setMap("testSnapshot", "upload")
+                kV.setSession("upload", "chunkSize", 1024)
+                self.assertTrue(kV.snapshot())
+                # restart
+                kV.clearTable(kV.sessionTable)
+                kV.clearTable(kV.mapTable)
+                kV.load()
+                self.assertEqual(kV.getMap("testSnapshot"), "upload")
+                self.assertEqual(kV.getSession("upload", "chunkSize"), 1024)
+            finally:
+                self.cP._set("KV_SNAPSHOT_PATH", "")
+
+
+if __name__ == "__main__":
+    unittest.main()
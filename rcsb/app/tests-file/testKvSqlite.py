@@ -30,6 +30,56 @@ class KvSqliteTest(unittest.TestCase):
         kV.clearSessionKey("test")
         kV.clearTable(kV.sessionTable)
 
+    def testSessionFields(self):
+        cP = ConfigProvider()
+        kV = KvSqlite(cP)
+        # fields keep their types, and a missing field reads as 0
+        kV.setSession("testSessionFields", "chunkSize", 1024)
+        kV.setSession("testSessionFields", "hashType", "MD5")
+        self.assertEqual(kV.getSession("testSessionFields", "chunkSize"), 1024)
+        self.assertEqual(kV.getSession("testSessionFields", "missing"), 0)
+        self.assertEqual(
+            kV.getKey("testSessionFields", kV.sessionTable),
+            {"chunkSize": 1024, "hashType": "MD5"},
+        )
+        self.assertEqual(kV.setSessionBit("testSessionFields", "bitmap", 2), (True, 1))
+        self.assertEqual(kV.setSessionBit("testSessionFields", "bitmap", 2), (False, 1))
+        self.assertEqual(kV.clearSessionBit("testSessionFields", "bitmap", 2), (True, 0))
+        self.assertEqual(kV.clearSessionBit("testSessionFields", "bitmap", 2), (False, 0))
+        self.assertTrue(kV.setSessionIf("testSessionFields", "owner", "", "a"))
+        self.assertFalse(kV.setSessionIf("testSessionFields", "owner", "", "b"))
+        self.assertTrue(kV.clearSessionVal("testSessionFields", "owner"))
+        self.assertFalse(kV.clearSessionVal("testSessionFields", "owner"))
+        self.assertTrue(kV.clearSessionKey("testSessionFields"))
+        self.assertIsNone(kV.getKey("testSessionFields", kV.sessionTable))
+
+    def testPurgeExpired(self):
+        cP = ConfigProvider()
+        kV = KvSqlite(cP)
+        kV.setSession("testPurgeExpired", "result", "pass")
+        # expire the session
+        kV.kV.getSharedConnection().execute(
+            f"UPDATE {kV.sessionTable} SET expires_at = 0 WHERE key = ?", ("testPurgeExpired",)
+        )
+        self.assertEqual(kV.getSession("testPurgeExpired", "result"), 0)
+        self.assertIsNone(kV.getKey("testPurgeExpired", kV.sessionTable))
+        self.assertGreaterEqual(kV.purgeExpired(), 1)
+        self.assertEqual(kV.purgeExpired(), 0)
+
+    def testSessionAndMap(self):
+        cP = ConfigProvider()
+        kV = KvSqlite(cP)
+        # first chunk - session val and map entry together
+        kV.setSessionAndMap("testSessionAndMap", "chunkSize", 1024, "testSessionAndMapKey")
+        self.assertEqual(str(kV.getSession("testSessionAndMap", "chunkSize")), "1024")
+        self.assertEqual(kV.getMap("testSessionAndMapKey"), "testSessionAndMap")
+        kV.setSession("testReservations", "testSessionAndMap", "1~0")
+        # cleanup - session, map entry by val, and reservation together
+        self.assertTrue(kV.clearSession("testSessionAndMap", None, ["testReservations"]))
+        self.assertIsNone(kV.getKey("testSessionAndMap", kV.sessionTable))
+        self.assertIsNone(kV.getMap("testSessionAndMapKey"))
+        self.assertIsNone(kV.getKey("testReservations", kV.sessionTable))
+
 
 if __name__ == "__main__":
     unittest.main()
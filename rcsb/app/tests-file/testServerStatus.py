@@ -117,11 +117,25 @@ class ServerStatusTests(unittest.TestCase):
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testExecutorStatus(self):
+        """Get executor pool metrics ()."""
+        try:
+            url = self.__baseUrl + "/executorStatus"
+            response = requests.get(url, headers=self.__headerD, timeout=None)
+            logger.info("Status %r response %r", response.status_code, response.json())
+            self.assertTrue(response.status_code == 200)
+            self.assertIn("cpu", response.json())
+            self.assertIn("io", response.json())
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
 
 def apiSimpleTests():
     suiteSelect = unittest.TestSuite()
     suiteSelect.addTest(ServerStatusTests("testRootStatus"))
     suiteSelect.addTest(ServerStatusTests("testProcessStatus"))
+    suiteSelect.addTest(ServerStatusTests("testExecutorStatus"))
     return suiteSelect
 
 